@@ -0,0 +1,27 @@
+from flask import Blueprint, request, jsonify, Response
+from services.chart_utils import render_chart, FORMATS
+
+chart_bp = Blueprint("chart", __name__, url_prefix="/api")
+
+# =========================
+# Gambar chart (render lazy, di-cache per hash isi series)
+# =========================
+@chart_bp.get("/charts/<key>.<fmt>")
+def chart_image(key, fmt):
+    """
+    SVG / PNG dari spec chart (key dari field "chart" di respons elbow,
+    silhouette-curve & summary). Key = hash isi → aman di-cache selamanya.
+    """
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Format chart tidak dikenal: {fmt} (pilih {', '.join(FORMATS)})"}), 400
+    etag = f'"{key}"'
+    # perbandingan lemah: versi terkompresi dikirim dengan ETag W/"key"
+    if request.if_none_match.contains_weak(key):
+        return Response(status=304, headers={"ETag": etag})
+    data = render_chart(key, fmt)
+    if data is None:
+        return jsonify({"error": "Chart tidak ditemukan."}), 404
+    resp = Response(data, mimetype=FORMATS[fmt])
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
@@ -1,11 +1,54 @@
 import json
 from flask import Blueprint, request, jsonify
-from services.io_utils import read_csv_or_xlsx, save_upload
-from services.prep_utils import apply_missing, encode_df, scale_array
-from store.state import STATE
+from services.io_utils import save_upload_hashed
+from services.cache_utils import load_dataset, cache_stats, dataset_source
+from services.pipeline_utils import run_prep
+from store.state import STATE, bump_model_version
 
 data_bp = Blueprint("data", __name__, url_prefix="/api")
 
+
+def _mapped_columns(mapping):
+    """Kolom yang dimuat dari file: id + fitur + label (urut, tanpa duplikat)."""
+    feat_cols = (mapping.get("features") or [])
+    return [c for c in dict.fromkeys([mapping.get("id"), *feat_cols, mapping.get("label")]) if c]
+
+
+def _preprocess_into_state(df, mapping, prep, dataset=None):
+    """
+    Jalankan DAG preprocessing (memoized) dan simpan hasilnya ke STATE.
+    `dataset` = {"dataset_name", "dataset_hash"} untuk upload baru. STATE
+    (termasuk df_raw & hash dataset) baru ditulis setelah preprocessing
+    berhasil → request yang gagal tidak mencampur dataset baru dengan X /
+    model lama. ValueError → pesan untuk respons 400.
+    """
+    digest = (dataset or {}).get("dataset_hash", STATE.get("dataset_hash"))
+    feat_cols = (mapping.get("features") or [])
+    used_cols = [c for c in feat_cols if c in df.columns]
+    if not used_cols:
+        absent = [c for c in feat_cols if c not in df.columns]
+        raise ValueError(
+            f"Kolom fitur tidak ditemukan di dataset: {', '.join(map(str, absent))}" if absent
+            else "Belum ada kolom fitur yang dipilih (mapping.features kosong)."
+        )
+    res = run_prep(df, digest, used_cols, prep)
+
+    if dataset is not None:
+        STATE.update(dataset)
+    STATE["df_raw"] = df
+    STATE["mapping"] = mapping
+    STATE["prep"] = prep
+    STATE["df_used"] = res["df_used"]
+    STATE["row_pos"] = res["row_pos"]
+    STATE["X"] = res["X"]
+    STATE["feature_names"] = res["feature_names"]
+    STATE["scaler"] = res["scaler"]
+    STATE["prep_artifacts"] = res["artifacts"]
+    # X berganti → hasil model & summary lama tidak berlaku lagi
+    bump_model_version(reset_model=True)
+    return res
+
+
 @data_bp.post("/upload")
 def upload():
     """
@@ -16,27 +59,62 @@ def upload():
     prep = json.loads(request.form.get("preprocessing") or "{}")
     fname = request.form.get("filename") or (f.filename if f else None)
 
-    path = save_upload(f, fname)
-    df = read_csv_or_xlsx(path)
+    path, digest = save_upload_hashed(f, fname)
 
-    STATE["dataset_name"] = fname
-    STATE["df_raw"] = df.copy()
-    STATE["mapping"] = mapping
-    STATE["prep"] = prep
+    # hanya kolom yang di-mapping (fitur + id + label) yang dimuat; file yang
+    # sama (hash isi) diambil dari cache Parquet tanpa parse ulang
+    keep = _mapped_columns(mapping)
+    df = load_dataset(path, digest, usecols=keep if mapping.get("features") else None)
 
-    # fiturkan
-    feat_cols = (mapping.get("features") or [])
-    used_cols = [c for c in feat_cols if c in df.columns]
-    df_used = df[used_cols].copy()
+    try:
+        _preprocess_into_state(df, mapping, prep, {"dataset_name": fname, "dataset_hash": digest})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # preprocessing
-    df_used = apply_missing(df_used, prep.get("missing","none"))
-    df_enc, feat_names = encode_df(df_used, prep.get("encoding","onehot"))
-    X = df_enc.values.astype(float)
-    X = scale_array(X, prep.get("scaling","none"))
+    return jsonify({"message": "Dataset tersimpan & siap dimodelkan."})
 
-    STATE["df_used"] = df_used
-    STATE["X"] = X
-    STATE["feature_names"] = feat_names
 
-    return jsonify({"message": "Dataset tersimpan & siap dimodelkan."})
+@data_bp.post("/preprocess")
+def preprocess():
+    """
+    Konfigurasi ulang mapping/preprocessing tanpa kirim ulang file.
+    JSON: { mapping?: {...}, preprocessing?: {...} } → digabung dengan yang aktif.
+    preprocessing.dtype = "float32" → matriks fitur separuh ukuran.
+    Stage DAG yang opsinya tidak berubah diambil dari memo.
+    """
+    if STATE.get("df_raw") is None:
+        return jsonify({"error": "Belum ada dataset. Upload file dulu."}), 400
+
+    body = request.get_json(silent=True) or {}
+    mapping = {**(STATE.get("mapping") or {}), **(body.get("mapping") or {})}
+    prep = {**(STATE.get("prep") or {}), **(body.get("preprocessing") or {})}
+
+    df = STATE["df_raw"]
+    keep = _mapped_columns(mapping)
+    if any(c not in df.columns for c in keep):
+        # kolom baru → ambil dari cache dataset (parse kolom itu saja bila perlu)
+        digest = STATE.get("dataset_hash")
+        src = dataset_source(digest) if digest else None
+        if src is None:
+            return jsonify({"error": "File sumber dataset tidak tersedia. Upload ulang file."}), 400
+        df = load_dataset(src, digest, usecols=keep)
+
+    try:
+        res = _preprocess_into_state(df, mapping, prep)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    X = res["X"]
+    return jsonify({
+        "message": "Preprocessing diperbarui.",
+        "rows": int(X.shape[0]),
+        "cols": int(X.shape[1]),
+        "feature_names": res["feature_names"],
+        "dtype": str(X.dtype),
+        "reused_stages": res["reused"],
+    })
+
+
+@data_bp.get("/cache/stats")
+def cache_stats_route():
+    """Statistik dataset cache: hit/miss, jumlah entri, ukuran total vs batas."""
+    return jsonify(cache_stats())
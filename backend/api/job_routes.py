@@ -0,0 +1,63 @@
+from flask import Blueprint, Response, request, jsonify
+from services.job_utils import (
+    TaskError, list_jobs, submit_job, get_job, cancel_job, job_public, job_response, iter_events
+)
+
+job_bp = Blueprint("jobs", __name__, url_prefix="/api")
+
+# =========================
+# Job async: submit / status / result / cancel
+# =========================
+@job_bp.post("/jobs")
+def job_submit():
+    """
+    JSON: { kind: "elbow" | "silhouette-curve" | "train" | "stability", payload: {...} }
+    payload sama persis dengan body route sinkron /api/model/<kind>.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        job = submit_job(body.get("kind"), body.get("payload") or {})
+    except TaskError as e:
+        return jsonify({"error": e.message}), e.status
+    return jsonify(job_public(job)), 202
+
+
+@job_bp.get("/jobs")
+def job_list():
+    return jsonify({"jobs": [job_public(j) for j in list_jobs()]})
+
+
+@job_bp.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan."}), 404
+    return jsonify(job_public(job))
+
+
+@job_bp.get("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan."}), 404
+    if not job["_done"].is_set():
+        return jsonify(job_public(job)), 202
+    body, status = job_response(job)
+    return jsonify(body), status
+
+
+@job_bp.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    """NDJSON: hasil parsial selama job berjalan, lalu hasil akhir / error."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan."}), 404
+    return Response(iter_events(job), mimetype="application/x-ndjson")
+
+
+@job_bp.post("/jobs/<job_id>/cancel")
+def job_cancel(job_id):
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan."}), 404
+    return jsonify(job_public(job))
@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify, Response
+from services.profile_utils import metrics_snapshot, reset_metrics, load_profile, flamegraph_svg
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/api")
+
+# =========================
+# Latency per route & flamegraph request yang diprofil
+# =========================
+@metrics_bp.get("/metrics")
+def metrics():
+    """p50/p95/p99 per route + per span (histogram per proses worker)."""
+    return jsonify(metrics_snapshot())
+
+
+@metrics_bp.post("/metrics/reset")
+def metrics_reset():
+    reset_metrics()
+    return jsonify({"ok": True})
+
+
+@metrics_bp.get("/metrics/profiles/<profile_id>")
+def metrics_profile(profile_id):
+    """
+    Hasil sampling request ber-header X-Profile: 1 (id dari header X-Profile-Id).
+    ?format=svg (default) → flamegraph; ?format=folded → folded stacks.
+    """
+    stacks = load_profile(profile_id)
+    if stacks is None:
+        return jsonify({"error": "Profil tidak ditemukan."}), 404
+    if (request.args.get("format") or "svg") == "folded":
+        body = "".join(f"{s} {n}\n" for s, n in stacks.most_common())
+        return Response(body, mimetype="text/plain")
+    return Response(flamegraph_svg(stacks), mimetype="image/svg+xml")
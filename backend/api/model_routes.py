@@ -1,53 +1,149 @@
-from flask import Blueprint, request, jsonify
+import functools
+from flask import Blueprint, Response, request, jsonify
 import numpy as np
 
 # Ambil STATE & utils dari package sesuai struktur kamu
-from store.state import STATE
+from store.state import STATE, bump_model_version, current_session
 from services.model_utils import (
-    compute_elbow, train_kmeans, cluster_counts, centroid_table,
-    compute_dbi, compute_silhouette, compute_silhouette_curve
+    compute_elbow, compute_elbow_adaptive, train_kmeans, cluster_counts, centroid_table,
+    compute_silhouette, compute_silhouette_curve, inertia_gap_vs_full_batch
+)
+from services.silhouette_utils import silhouette_estimate
+from services.sweep_utils import ENGINES
+from services.chart_utils import chart_fields
+from services.cluster_utils import profile_clusters, profile_records
+from services.eval_utils import model_metrics, metrics_records
+from services.predict_utils import json_frames, csv_frames, predict_frames
+from services.registry_utils import register_model, update_metrics, load_model, load_row_keys, list_models
+from services.warm_utils import row_keys, match_rows, seed_centroids, warm_kmeans, segment_changes
+from services.stability_utils import stability_scan
+from services.encode_utils import pack_labels
+from services.job_utils import (
+    TaskError, register_task, submit_job, run_job_inline, job_public, job_response,
+    report_progress, report_partial, sweep_progress, iter_events
 )
 
 model_bp = Blueprint("model", __name__, url_prefix="/api")
 
+
+def _run_task(kind, payload):
+    """
+    Route sinkron = wrapper tipis di atas job subsystem.
+    Payload {"async": true} → langsung 202 + job_id (pantau via /api/jobs/<id>).
+    """
+    if payload.get("async"):
+        job = submit_job(kind, payload)
+        return jsonify(job_public(job)), 202
+    body, status = job_response(run_job_inline(kind, payload))
+    return jsonify(body), status
+
+
+def _engine_opts(p):
+    """engine (kmeans | minibatch | online) + batch_size dari payload/params."""
+    engine = p.get("engine") or "kmeans"
+    if engine not in ENGINES:
+        raise TaskError(f"Engine tidak dikenal: {engine} (pilih {', '.join(ENGINES)})", 400)
+    batch_size = int(p["batch_size"]) if p.get("batch_size") else None
+    return {"engine": engine, "batch_size": batch_size}
+
+
+def _warm_base(p):
+    """
+    Model dasar untuk retrain warm-start: params.base_model → model aktif
+    session → versi terbaru session (model aktif ikut di-reset saat upload
+    dataset baru). Return id, k, centroid seed (ruang fitur sekarang),
+    label & kunci baris model dasar.
+    """
+    base_id = p.get("base_model") or STATE.get("model_id")
+    if not base_id:
+        latest = list_models(session=current_session())
+        base_id = latest[0]["id"] if latest else None
+    if not base_id:
+        raise TaskError("Belum ada model sebelumnya untuk warm-start.", 400)
+    try:
+        base = load_model(base_id)
+    except (KeyError, ValueError, OSError):
+        raise TaskError(f"Model tidak ditemukan: {base_id}", 404)
+    try:
+        seed = seed_centroids(base["last_centroids"], base["prep_artifacts"], STATE.get("prep_artifacts"))
+    except Exception as e:
+        raise TaskError(f"Centroid model {base_id} tidak cocok dengan preprocessing sekarang: {e}", 400)
+    return {
+        "id": base_id,
+        "k": int(base["last_k"]),
+        "seed": seed,
+        "labels": base["last_labels"],
+        "keys": load_row_keys(base_id),
+        "inertia": base.get("last_inertia"),
+    }
+
 # =========================
 # 1) Elbow → tentukan K
 # =========================
 @model_bp.post("/model/elbow")
 def model_elbow():
+    return _run_task("elbow", request.get_json(silent=True) or {})
+
+
+@register_task("elbow")
+def _elbow_task(payload, job=None):
     if STATE.get("X") is None:
-        return jsonify({"error": "Belum ada dataset ter-preprocessing."}), 400
+        raise TaskError("Belum ada dataset ter-preprocessing.", 400)
 
-    payload = request.get_json(silent=True) or {}
     k_min = int(payload.get("k_min", 2))
     k_max = int(payload.get("k_max", 10))
+    n_jobs = payload.get("n_jobs")  # None → config.SWEEP_WORKERS
+    engine_opts = _engine_opts(payload)
+
+    # adaptive=true → hanya k yang dibutuhkan untuk memastikan knee yang di-fit
+    adaptive = bool(payload.get("adaptive", False))
+    elbow_fn = compute_elbow
+    if adaptive:
+        elbow_fn = functools.partial(compute_elbow_adaptive, tol=payload.get("adaptive_tol"))
 
     try:
-        res = compute_elbow(
+        res = elbow_fn(
             STATE["X"], k_min=k_min, k_max=k_max,
-            init="k-means++", n_init=10, max_iter=300, random_state=42
+            init="k-means++", n_init=10, max_iter=300, random_state=42,
+            n_jobs=n_jobs, split_restarts=bool(payload.get("split_restarts", False)),
+            on_progress=sweep_progress(job), **engine_opts
         )
         # simpan k_suggest ke state agar dipakai train
         STATE["k_suggest"] = int(res["k_suggest"])
-        return jsonify({
-            "image_base64": res["image_base64"],
+        # series mentah untuk dirender di browser; gambar server hanya bila diminta
+        series = {
+            "x": res["ks"], "y": res["wcss"], "marker": res["k_suggest"],
+            "title": "Elbow Method (WCSS)",
+            "xlabel": "Number of clusters (k)", "ylabel": "WCSS",
+        }
+        return {
+            "ks": res["ks"],
+            "wcss": res["wcss"],
             "k_suggest": res["k_suggest"],
             "wcss_at_k": res["wcss_at_k"],
-        })
+            **({"adaptive": res["adaptive"]} if adaptive else {}),
+            **chart_fields("line", series, payload.get("image")),
+        }
+    except TaskError:
+        raise
     except Exception as e:
-        return jsonify({"error": f"Gagal menghitung Elbow: {e}"}), 500
+        raise TaskError(f"Gagal menghitung Elbow: {e}", 500)
 
 # =========================
 # 2) Train KMeans pakai K dari Elbow (default)
 # =========================
 @model_bp.post("/model/train")
 def model_train():
+    return _run_task("train", request.get_json(silent=True) or {})
+
+
+@register_task("train")
+def _train_task(payload, job=None):
     # Pastikan X sudah siap (hasil preprocessing yang sama dipakai Elbow & Silhouette)
     X = STATE.get("X")
     if X is None:
-        return jsonify({"error": "Belum ada dataset ter-preprocessing."}), 400
+        raise TaskError("Belum ada dataset ter-preprocessing.", 400)
 
-    payload = request.get_json(silent=True) or {}
     p = payload.get("params") or {}
 
     # Param & fallback
@@ -56,120 +152,220 @@ def model_train():
     n_init = int(p.get("n_init", 10))
     max_iter = int(p.get("max_iter", 300))
     random_state = int(p.get("random_state", 42))
+    n_jobs = p.get("n_jobs")
+    split_restarts = bool(p.get("split_restarts", False))
+    engine_opts = _engine_opts(p)
+
+    # Warm-start: seed dari centroid model sebelumnya (satu init, full-batch), k ikut model dasar
+    warm = _warm_base(p) if p.get("warm_start") else None
+    if warm is not None:
+        if p.get("k") and int(p["k"]) != warm["k"]:
+            raise TaskError(f"Warm-start memakai k model dasar ({warm['k']}), bukan k={p['k']}.", 400)
+        k, init, n_init = warm["k"], "warm_start", 1
+        engine_opts = {"engine": "kmeans", "batch_size": None}
 
     # Guard ukuran k vs jumlah sampel
-    n_samples = len(X)
+    n_samples = X.shape[0]
     if k < 2:
         k = 2
     if k >= n_samples:
-        return jsonify({"error": f"k={k} terlalu besar untuk n={n_samples}"}), 400
+        raise TaskError(f"k={k} terlalu besar untuk n={n_samples}", 400)
 
     try:
-        trained = train_kmeans(
-            X, k=k, init=init, n_init=n_init,
-            max_iter=max_iter, random_state=random_state
-        )
+        report_progress(job, 0, 3, f"fit k={k}")
+        if warm is not None:
+            trained = warm_kmeans(X, warm["seed"], max_iter=max_iter)
+        else:
+            trained = train_kmeans(
+                X, k=k, init=init, n_init=n_init,
+                max_iter=max_iter, random_state=random_state,
+                n_jobs=n_jobs, split_restarts=split_restarts, **engine_opts
+            )
 
         # Simpan state lengkap utk evaluasi & halaman lain
         STATE.update({
             "last_model":     trained.get("model"),
-            "last_labels":    trained["labels"].tolist(),
+            "last_labels":    pack_labels(trained["labels"], trained["k"]),
             "last_k":         int(trained["k"]),
             "last_inertia":   float(trained["inertia"]),
-            "last_centroids": trained["centroids"].tolist(),
+            "last_centroids": np.asarray(trained["centroids"], dtype=float),
             "train_params":   {
                 "k": int(k), "init": init, "n_init": n_init,
-                "max_iter": max_iter, "random_state": random_state
+                "max_iter": max_iter, "random_state": random_state,
+                **engine_opts,
+                **({"base_model": warm["id"]} if warm is not None else {}),
             }
         })
+        bump_model_version()   # metrik & summary model sebelumnya kedaluwarsa
+
+        report_progress(job, 1, 3, "profil cluster")
 
-        # === (BARU) Siapkan centroid skala asli (Likert) & profil cluster ===
+        # === Centroid skala asli (Likert) & profil cluster ===
         feature_names = STATE.get("feature_names")
         scaler = STATE.get("scaler")  # simpan saat preprocessing
-        dfLik = STATE.get("df_likert")  # DataFrame kolom asli skala 1–5 (disiapkan saat preprocessing)
+        df_used = STATE.get("df_used")  # fitur asli (setelah imputasi, sebelum encoding/scaling)
 
         # 1) Centroid pada skala asli (bila ada scaler)
+        centroids_original = trained["centroids"]  # fallback (mungkin sudah 1–5)
         try:
             if scaler is not None and hasattr(scaler, "inverse_transform"):
                 centroids_original = scaler.inverse_transform(trained["centroids"])
-            else:
-                centroids_original = trained["centroids"]  # fallback (mungkin sudah 1–5)
-            STATE["last_centroids_original"] = centroids_original.tolist()
         except Exception:
-            STATE["last_centroids_original"] = trained["centroids"].tolist()
-
-        # 2) Profil cluster per fitur: avg (dari centroid original) & mode (dari data asli)
-        cluster_profile = {}  # {cid: {feat: {"avg": float, "mode": int|None}}}
-        labels_arr = trained["labels"]
-        k_now = int(trained["k"])
+            pass
+        STATE["last_centroids_original"] = np.asarray(centroids_original, dtype=float)
 
         # Siapkan nama fitur
         if not feature_names:
             feature_names = [f"f{i+1}" for i in range(trained["centroids"].shape[1])]
 
-        # Rata-rata dari centroid_original
-        for cid in range(k_now):
-            per_feat = {}
-            for j, feat in enumerate(feature_names):
-                avg_val = float(centroids_original[cid, j]) if j < centroids_original.shape[1] else None
-                per_feat[feat] = {"avg": None if avg_val is None else avg_val, "mode": None}
-            cluster_profile[cid] = per_feat
-
-        # Mode dari data asli (jika tersedia)
-        try:
-            if dfLik is not None:
-                tmp = dfLik.copy()
-                tmp["_c"] = labels_arr
-                for cid in range(k_now):
-                    sub = tmp[tmp["_c"] == cid]
-                    for feat in feature_names:
-                        if feat in sub.columns:
-                            m = sub[feat].mode()
-                            if not m.empty:
-                                cluster_profile[cid][feat]["mode"] = int(round(m.iloc[0]))
-        except Exception:
-            pass
-
+        # 2) Profil cluster per fitur asli (mean/std/kuantil/mode), kolumnar
+        cluster_profile = None
+        if df_used is not None and len(df_used) == n_samples:
+            cluster_profile = profile_clusters(df_used, trained["labels"], int(trained["k"]))
         STATE["cluster_profile"] = cluster_profile
 
-        # Hitung silhouette score (bonus)
-        try:
-            silhouette_score_val = compute_silhouette(X, trained["labels"])
-            if np.isnan(silhouette_score_val):
+        report_progress(job, 2, 3, "silhouette")
+
+        # Hitung silhouette score (bonus). Warm-start: ditunda (summary menghitungnya
+        # saat dibutuhkan) kecuali diminta params.silhouette → retrain tetap hitungan detik
+        silhouette_score_val = None
+        if warm is None or p.get("silhouette"):
+            try:
+                silhouette_score_val = compute_silhouette(X, trained["labels"])
+                if np.isnan(silhouette_score_val):
+                    silhouette_score_val = None
+                STATE["last_silhouette"] = silhouette_score_val   # dipakai ulang summary
+            except Exception:
                 silhouette_score_val = None
-        except Exception:
-            silhouette_score_val = None
 
         # Hitung jumlah anggota cluster dan tabel centroid
         counts = cluster_counts(trained["labels"])
         centroids_tbl = centroid_table(trained["centroids"], feature_names)
 
-        return jsonify({
+        # Engine minibatch/online: seberapa jauh inertia-nya dari full-batch (pada sampel)
+        inertia_check = None
+        if engine_opts["engine"] != "kmeans":
+            inertia_check = inertia_gap_vs_full_batch(
+                X, trained["centroids"], random_state=random_state
+            )
+
+        # Identitas baris (id / hash fitur mentah) → dasar hitung perpindahan segmen saat retrain
+        keys = row_keys(STATE.get("df_raw"), STATE.get("df_used"), STATE.get("mapping"), STATE.get("row_pos"))
+        if keys is not None and len(keys) != n_samples:
+            keys = None
+
+        warm_info = None
+        if warm is not None:
+            base_pos = match_rows(warm["keys"], keys) if keys is not None else np.full(n_samples, -1)
+            warm_info = {
+                "base_model": warm["id"],
+                "n_iter": trained["n_iter"],
+                "rows_moved": trained["rows_moved"],
+                "inertia_base": warm["inertia"],
+                "inertia_seed": trained["inertia_seed"],
+                "inertia_delta": float(trained["inertia"]) - trained["inertia_seed"],
+                **segment_changes(warm["labels"] if warm["keys"] is not None else None,
+                                  base_pos, trained["labels"], trained["k"]),
+            }
+
+        # Simpan versi ke registry (centroid + preprocessing beku) → bertahan lintas restart
+        meta = register_model(
+            centroids=trained["centroids"], labels=trained["labels"],
+            artifacts=STATE.get("prep_artifacts"), params=STATE["train_params"],
+            metrics={"inertia": float(trained["inertia"]), "silhouette": silhouette_score_val},
+            X=X, dataset_name=STATE.get("dataset_name"), dataset_hash=STATE.get("dataset_hash"),
+            mapping=STATE.get("mapping"), cluster_profile=cluster_profile, row_keys=keys,
+            session=current_session(),
+        )
+        STATE["model_id"] = meta["id"]
+
+        report_progress(job, 3, 3, "selesai")
+        return {
             "ok": True,
+            "model_id": meta["id"],
             "k": int(trained["k"]),
+            "engine": engine_opts["engine"],
             "inertia": float(trained["inertia"]),
+            "inertia_check": inertia_check,
+            "warm_start": warm_info,
             "silhouette": silhouette_score_val,  # bonus (boleh dipakai atau diabaikan di UI)
             "counts": counts,
             "centroids": centroids_tbl
-        })
+        }
 
+    except TaskError:
+        raise
     except Exception as e:
         # kirim pesan jelas biar kebaca di frontend (pastikan postJSON menampilkan body error)
-        return jsonify({"error": f"Gagal melatih KMeans: {e}"}), 500
+        raise TaskError(f"Gagal melatih KMeans: {e}", 500)
+
+@model_bp.get("/model/profile")
+def model_profile():
+    """
+    Profil cluster model aktif per fitur asli: kolumnar (list k × p per statistik);
+    ?orient=records → satu baris per (cluster, fitur).
+    """
+    profile = STATE.get("cluster_profile")
+    if profile is None:
+        return jsonify({"error": "Belum ada hasil clustering."}), 400
+    if request.args.get("orient") == "records":
+        return jsonify(profile_records(profile))
+    return jsonify(profile)
+
+@model_bp.post("/model/predict")
+def model_predict():
+    """
+    Tentukan segmen baris baru dengan model aktif & preprocessing beku dari upload.
+    Input: JSON {"rows": [...]} / {"columns": [...], "data": [[...]]}, CSV
+    (multipart "file" atau body text/csv). ?distances=all → jarak ke semua centroid.
+    Output kolumnar: cluster, distance (ke centroid terpilih), id (kolom id mapping).
+    """
+    centroids = STATE.get("last_centroids")
+    artifacts = STATE.get("prep_artifacts")
+    if centroids is None or artifacts is None:
+        return jsonify({"error": "Belum ada model terlatih."}), 400
+    id_col = (STATE.get("mapping") or {}).get("id")
+    usecols = [*artifacts["columns"], *([id_col] if id_col else [])]
+    all_distances = request.args.get("distances") == "all"
+    try:
+        upload = request.files.get("file")
+        if upload is not None:
+            frames = csv_frames(upload.stream, usecols)
+        elif request.mimetype == "text/csv":
+            frames = csv_frames(request.stream, usecols)
+        else:
+            body = request.get_json(silent=True)
+            if body is None:
+                return jsonify({"error": "Kirim JSON (rows / columns+data) atau CSV."}), 400
+            frames = json_frames(body)
+        res = predict_frames(frames, artifacts, centroids, id_col=id_col, all_distances=all_distances)
+    except ValueError as e:
+        return jsonify({"error": f"Data tidak valid: {e}"}), 400
+    return jsonify(res)
 
 # =========================
 # 3) Evaluasi DBI
 # =========================
 @model_bp.post("/model/dbi")
 def model_dbi():
+    """
+    DBI + rincian per cluster (ukuran, SSE, scatter, suku DBI & cluster
+    pembandingnya) dan Calinski–Harabasz — satu pass atas X, ter-memo per model.
+    """
     if STATE.get("X") is None:
         return jsonify({"error": "Belum ada dataset."}), 400
-    if not STATE.get("last_labels"):
+    if STATE.get("last_labels") is None:
         return jsonify({"error": "Belum ada hasil clustering."}), 400
     try:
-        dbi = compute_dbi(STATE["X"], labels=STATE["last_labels"])
-        STATE["last_dbi"] = float(dbi) 
-        return jsonify({"dbi": float(dbi)})
+        metrics = model_metrics(STATE)
+        update_metrics(STATE.get("model_id"), dbi=metrics["dbi"],
+                       calinski_harabasz=metrics["calinski_harabasz"])
+        return jsonify({
+            "dbi": metrics["dbi"],
+            "calinski_harabasz": metrics["calinski_harabasz"],
+            "inertia": metrics["inertia"],
+            "clusters": metrics_records(metrics),
+        })
     except Exception as e:
         return jsonify({"error": f"Gagal menghitung DBI: {e}"}), 500
 
@@ -182,23 +378,105 @@ def model_silhouette():
     labels = STATE.get("last_labels")
     if X is None or labels is None:
         return jsonify({"score": None, "error": "Belum ada model/labels."}), 400
-    score = compute_silhouette(X, labels)
-    return jsonify({"score": None if np.isnan(score) else float(score)})
+    payload = request.get_json(silent=True) or {}
+    # mode: auto (default, pilih dari n) | exact | sampled
+    mode = payload.get("mode", "auto")
+    if mode not in ("auto", "exact", "sampled"):
+        return jsonify({"score": None, "error": f"Mode silhouette tidak dikenal: {mode}"}), 400
+    opts = {}
+    if payload.get("sample_size"):
+        opts["sample_size"] = int(payload["sample_size"])
+    est = silhouette_estimate(X, labels, mode, **opts)
+    score = est["score"]
+    if np.isnan(score):
+        return jsonify({"score": None})
+    return jsonify({
+        "score": float(score),
+        "ci": [est["ci_low"], est["ci_high"]],
+        "method": est["method"],
+        "sample_size": est["sample_size"],
+    })
 
 @model_bp.post("/model/silhouette-curve")
 def model_silhouette_curve():
+    return _run_task("silhouette-curve", request.get_json(silent=True) or {})
+
+
+@register_task("silhouette-curve")
+def _silhouette_curve_task(payload, job=None):
     X = STATE.get("X")
     if X is None:
-        return jsonify({"error": "Belum ada dataset."}), 400
-    payload = request.get_json(silent=True) or {}
+        raise TaskError("Belum ada dataset.", 400)
     k_min = int(payload.get("k_min", 2))
     k_max = int(payload.get("k_max", 10))
     init = payload.get("init", "k-means++")
     n_init = int(payload.get("n_init", 10))
     max_iter = int(payload.get("max_iter", 300))
     random_state = int(payload.get("random_state", 42))
+    n_jobs = payload.get("n_jobs")
+    engine_opts = _engine_opts(payload)
     out = compute_silhouette_curve(
         X, k_min=k_min, k_max=k_max,
-        init=init, n_init=n_init, max_iter=max_iter, random_state=random_state
+        init=init, n_init=n_init, max_iter=max_iter, random_state=random_state,
+        mode=payload.get("mode", "auto"),
+        n_jobs=n_jobs, split_restarts=bool(payload.get("split_restarts", False)),
+        on_progress=sweep_progress(job), **engine_opts
     )
-    return jsonify(out)
+    series = {
+        "x": out["ks"], "y": out["scores"],
+        "title": "Silhouette Score vs k",
+        "xlabel": "Number of clusters (k)", "ylabel": "Silhouette score",
+    }
+    return {**out, **chart_fields("line", series, payload.get("image"))}
+
+
+# =========================
+# Stabilitas segmen per k (bootstrap / subsample)
+# =========================
+@model_bp.post("/model/stability")
+def model_stability():
+    """
+    JSON: { k_min, k_max | ks: [...], B, frac, resample: "subsample" | "bootstrap",
+            n_init (per fit resample), stream, async }
+    stream=true → NDJSON: skor parsial per k tiap fit resample selesai, lalu hasil akhir.
+    """
+    payload = request.get_json(silent=True) or {}
+    if payload.get("stream"):
+        job = submit_job("stability", payload)
+        return Response(iter_events(job), mimetype="application/x-ndjson")
+    return _run_task("stability", payload)
+
+
+@register_task("stability")
+def _stability_task(payload, job=None):
+    X = STATE.get("X")
+    if X is None:
+        raise TaskError("Belum ada dataset ter-preprocessing.", 400)
+    ks = payload.get("ks") or list(range(int(payload.get("k_min", 2)), int(payload.get("k_max", 10)) + 1))
+    n_jobs = payload.get("n_jobs")
+    engine_opts = _engine_opts(payload)
+
+    # model penuh per k = fit yang sama dengan Elbow/Train (n_init=10, random_state=42)
+    def _train(X, k):
+        return train_kmeans(X, k, n_init=10, random_state=42, n_jobs=n_jobs, **engine_opts)
+
+    opts = {key: payload[key] for key in ("B", "frac") if payload.get(key) is not None}
+    try:
+        out = stability_scan(
+            X, [int(k) for k in ks], mode=payload.get("resample", "subsample"),
+            n_init=int(payload.get("n_init", 3)), random_state=int(payload.get("random_state", 42)),
+            n_jobs=n_jobs, silhouette_mode=payload.get("mode", "auto"), train_fn=_train,
+            on_progress=sweep_progress(job),
+            on_partial=lambda row: report_partial(job, row["k"], row),
+            **opts, **engine_opts
+        )
+    except ValueError as e:
+        raise TaskError(str(e), 400)
+    series = {
+        "x": out["ks"], "y": [r["stability"] for r in out["rows"]],
+        "marker": STATE.get("k_suggest"),
+        "title": "Stabilitas segmen vs k (1 − PAC)",
+        "xlabel": "Number of clusters (k)", "ylabel": "Stability",
+    }
+    return {**out, "k_suggest": STATE.get("k_suggest"),
+            **chart_fields("line", series, payload.get("image"))}
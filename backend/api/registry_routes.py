@@ -0,0 +1,52 @@
+from flask import Blueprint, request, jsonify
+from store.state import STATE, bump_model_version, current_session
+from services.registry_utils import list_models, get_meta, load_model, model_dataset
+
+registry_bp = Blueprint("registry", __name__, url_prefix="/api")
+
+# =========================
+# Registry model: daftar versi & aktivasi tanpa fit ulang
+# =========================
+@registry_bp.get("/models")
+def models_list():
+    """Versi hasil training session ini (?all=1 → semua versi di registry)."""
+    session = None if request.args.get("all") else current_session()
+    current = STATE.get("model_id")
+    return jsonify({"models": list_models(session, current), "current": current})
+
+
+@registry_bp.get("/models/<model_id>")
+def models_detail(model_id):
+    try:
+        meta = get_meta(model_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if meta is None:
+        return jsonify({"error": "Model tidak ditemukan."}), 404
+    return jsonify(meta)
+
+
+@registry_bp.post("/models/<model_id>/activate")
+def models_activate(model_id):
+    """
+    Muat versi ke session aktif saja (centroid, label, preprocessing beku, dan
+    baris dataset versi itu bila masih ada di dataset cache); session lain tidak berubah.
+    """
+    try:
+        values = load_model(model_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except KeyError:
+        return jsonify({"error": "Model tidak ditemukan."}), 404
+    except OSError as e:
+        return jsonify({"error": f"File model tidak lengkap: {e}"}), 404
+    values = {**values, **model_dataset(values)}
+    bump_model_version(reset_model=True)
+    STATE.update(values)
+    return jsonify({
+        "ok": True,
+        "model_id": model_id,
+        "k": values["last_k"],
+        "has_data": values["X"] is not None,   # False → X versi ini sudah tidak ada (predict tetap bisa)
+        "has_rows": values["df_raw"] is not None,   # False → export tanpa id / fitur asli
+    })
@@ -1,18 +1,21 @@
 # report_routes.py
 from __future__ import annotations
 
-import os
+import json, hashlib
 from datetime import datetime
 
 import numpy as np
 import pandas as pd
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, Response, jsonify, request, send_file
 
-from store.state import STATE
-from services.viz_utils import pie_distribution_b64
-from services.report_utils import _feature_display_name, _smart_actions_for_cluster, build_simple_pdf
-
-OUT_DIR = os.path.join(os.getcwd(), "outputs")
+from store.state import STATE, current_session
+from services.viz_utils import distribution_series
+from services.chart_utils import chart_spec, chart_base64
+from services.report_utils import _feature_display_name, _smart_actions_for_cluster, build_report_pdf
+from services.silhouette_utils import silhouette_estimate
+from services.registry_utils import update_metrics
+from services.eval_utils import model_metrics
+from services.export_utils import EXPORT_FORMATS, export_snapshot, iter_csv, iter_parquet, report_key, cached_report
 
 report_bp = Blueprint("report", __name__, url_prefix="/api")
 
@@ -27,29 +30,65 @@ def report_summary():
     - metrics (wcss, dbi, silhouette)
     - clusters (size, share, traits=full questions, actions=smart)
     - top_features (varians antar-mean cluster)
-    - images.distribution_b64 (pie chart)
-    """
-    X = STATE.get("X")
-    labels = STATE.get("last_labels")
-    km = STATE.get("last_model")
-    feat = STATE.get("feature_names") or []
+    - images.distribution (spec chart pie: counts per cluster, render di browser;
+      ?image=1 → ikut distribution_b64 PNG untuk client lama)
 
+    Dihitung sekali per model_version (naik saat upload/preprocess/train) lalu
+    di-memo di STATE; ETag = hash isi → poll dengan If-None-Match dapat 304
+    tanpa komputasi apa pun.
+    """
+    memo = _summary_memo()
     # Jika belum ada hasil model, kembalikan objek kosong agar frontend tetap aman
-    if X is None or labels is None:
+    if memo is None:
         return jsonify({
             "overview": None, "metrics": None,
             "clusters": [], "top_features": [],
             "images": {}, "generated": ""
         })
 
+    want_image = bool(request.args.get("image"))
+    etag = memo["etag"] + ("-png" if want_image else "")
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        body = memo["body"]
+        if want_image:
+            spec = body["images"]["distribution"]
+            body = {**body, "images": {**body["images"], "distribution_b64": chart_base64(spec, "png")}}
+        resp = jsonify(body)
+    resp.set_etag(etag)
+    # browser selalu revalidasi; isi beda per session
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Vary"] = "X-Session-Id, Cookie"
+    return resp
+
+
+def _summary_memo():
+    """Memo summary {version, etag, body} untuk model_version sekarang; None kalau belum ada model."""
+    version = STATE.get("model_version")
+    memo = STATE.get("summary_memo")
+    if memo and memo.get("version") == version:
+        return memo
+    X = STATE.get("X")
+    labels = STATE.get("last_labels")
+    if X is None or labels is None:
+        return None
+    body = _build_summary(X, labels)
+    raw = json.dumps(body, sort_keys=True, default=str).encode()
+    memo = {"version": version, "etag": hashlib.blake2b(raw, digest_size=12).hexdigest(), "body": body}
+    STATE["summary_memo"] = memo
+    return memo
+
+
+def _build_summary(X, labels):
+    km = STATE.get("last_model")   # None untuk model yang dimuat dari registry
+    feat = STATE.get("feature_names") or []
     labels = np.asarray(labels, dtype=int)
-    k = int(getattr(km, "n_clusters", int(labels.max() + 1)))
+    k = int(getattr(km, "n_clusters", STATE.get("last_k") or int(labels.max() + 1)))
     counts = np.bincount(labels, minlength=k).astype(int)
     total = int(labels.size)
 
     # Overview & metrics
-    from sklearn.metrics import silhouette_score, davies_bouldin_score
-
     overview = {
         "dataset": STATE.get("dataset_name"),
         "rows": int(X.shape[0]),
@@ -58,30 +97,31 @@ def report_summary():
         "generated_at": STATE.get("generated_at")
                     or datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
-    wcss = float(getattr(km, "inertia_", STATE.get("last_inertia", 0.0)))
-    # pakai metrik yang sudah dihitung kalau ada; kalau tidak & k>1, hitung cepat di sini
-    dbi = STATE.get("last_dbi")
+    # DBI, CH & mean fitur per cluster: satu pass atas X (ter-memo per model)
+    ev = model_metrics(STATE)
+    update_metrics(STATE.get("model_id"), dbi=ev["dbi"], calinski_harabasz=ev["calinski_harabasz"])
+    wcss = float(getattr(km, "inertia_", STATE.get("last_inertia") or ev["inertia"]))
+    dbi = ev["dbi"]
     sil = STATE.get("last_silhouette")
-    if dbi is None and k > 1:
-        try:
-            dbi = float(davies_bouldin_score(X, labels))
-            STATE["last_dbi"] = dbi
-        except Exception:
-            dbi = None
     if sil is None and k > 1:
         try:
-            sil = float(silhouette_score(X, labels))
+            # auto: exact untuk n kecil, estimasi sampel untuk n besar (hindari O(n²))
+            sil = float(silhouette_estimate(X, labels, "auto")["score"])
+            if np.isnan(sil):
+                sil = None
             STATE["last_silhouette"] = sil
         except Exception:
             sil = None
 
-    metrics = {"wcss": wcss, "dbi": dbi, "silhouette": sil}
+    metrics = {"wcss": wcss, "dbi": dbi, "silhouette": sil,
+               "calinski_harabasz": ev["calinski_harabasz"]}
 
-    # Profil cluster
-    dfX = pd.DataFrame(X, columns=feat)
-    dfX["_c"] = labels
-    means_by_c = dfX.groupby("_c").mean(numeric_only=True)
-    global_mean = dfX.drop(columns=["_c"]).mean(numeric_only=True)
+    # Profil cluster: mean per cluster dari pass metrik di atas (tanpa menyalin X ke DataFrame)
+    means = ev["means"]
+    present = np.flatnonzero(counts)
+    cols = feat if len(feat) == X.shape[1] else list(range(X.shape[1]))
+    means_by_c = pd.DataFrame(means[present], index=present, columns=cols)
+    global_mean = pd.Series(counts @ means / (total or 1), index=cols)
 
     # Urutkan fitur yang paling membedakan (varians antar cluster)
     var_across = means_by_c.var(axis=0).sort_values(ascending=False)
@@ -115,8 +155,8 @@ def report_summary():
         for f, v in var_across.head(10).items()
     ]
 
-    # Pie distribusi
-    dist_b64 = pie_distribution_b64(labels)
+    # Pie distribusi (series counts; PNG hanya bila diminta)
+    dist = chart_spec("pie", distribution_series(labels))
 
     # Generated narrative singkat
     if clusters:
@@ -133,14 +173,14 @@ def report_summary():
     else:
         generated_text = ""
 
-    return jsonify({
+    return {
         "overview": overview,
         "metrics": metrics,
         "clusters": clusters,
         "top_features": topf,
-        "images": {"distribution_b64": dist_b64},
+        "images": {"distribution": dist, "distribution_b64": None},
         "generated": generated_text
-    })
+    }
 
 
 # ======================
@@ -150,49 +190,60 @@ def report_summary():
 def report_download():
     """
     Unduh report:
-    - ?format=pdf → report.pdf (ringkas; gunakan build_simple_pdf)
-    - ?format=csv → report.csv (ringkasan cluster: id, size, share)
+    - ?format=pdf     → report.pdf: ringkasan + halaman detail per cluster; file
+                        ber-key per model di REPORT_DIR, dipakai ulang selama model sama
+    - ?format=csv     → semua responden: id, cluster, distance (di-stream per chunk)
+    - ?format=parquet → isi sama dengan csv, satu row group per chunk
+    ?features=1 → csv/parquet ikut kolom fitur asli (setelah imputasi).
     """
     fmt = (request.args.get("format") or "pdf").lower()
 
-    km = STATE.get("last_model")
     labels = STATE.get("last_labels")
-    if km is None or labels is None:
+    if labels is None:
         return jsonify({"error": "Belum ada hasil clustering untuk diunduh."}), 400
 
-    labels = np.asarray(labels, dtype=int)
-    k = int(getattr(km, "n_clusters", int(labels.max() + 1)))
-    counts = np.bincount(labels, minlength=k).astype(int)
-    total = int(labels.size)
+    if fmt in EXPORT_FORMATS:
+        # snapshot diambil sekarang; generator jalan setelah request (di luar session)
+        snap = export_snapshot(STATE, with_features=bool(request.args.get("features")))
+        body = iter_csv(snap) if fmt == "csv" else iter_parquet(snap)
+        resp = Response(body, mimetype=EXPORT_FORMATS[fmt])
+        resp.headers["Content-Disposition"] = f'attachment; filename="clusters.{fmt}"'
+        return resp
 
-    os.makedirs(OUT_DIR, exist_ok=True)
-
-    if fmt == "pdf":
-        params = {
-            "k": k,
-            "n_init": getattr(km, "n_init", None),
-            "max_iter": getattr(km, "max_iter", None),
-        }
-        metrics = {"wcss": float(getattr(km, "inertia_", 0.0))}
-        path_out = os.path.join(OUT_DIR, "report.pdf")
-        build_simple_pdf(
-            out_path=path_out,
-            dataset_name=STATE.get("dataset_name") or "dataset.csv",
-            params=params,
-            metrics=metrics,
-            labels=labels,
-        )
-        return send_file(path_out, as_attachment=True, download_name="report.pdf")
+    if fmt != "pdf":
+        return jsonify({"error": "Format tidak didukung. Gunakan 'pdf', 'csv' atau 'parquet'."}), 400
 
-    elif fmt == "csv":
-        df = pd.DataFrame({
-            "cluster": list(range(k)),
-            "size": counts.tolist(),
-            "share": (counts / (total or 1)).round(6).tolist(),
-        })
-        path_out = os.path.join(OUT_DIR, "report.csv")
-        df.to_csv(path_out, index=False)
-        return send_file(path_out, as_attachment=True, download_name="report.csv")
+    km = STATE.get("last_model")   # None untuk model yang dimuat dari registry
+    labels = np.asarray(labels, dtype=int)
+    k = int(getattr(km, "n_clusters", STATE.get("last_k") or int(labels.max() + 1)))
+    train_params = STATE.get("train_params") or {}
+    params = {
+        "k": k,
+        "init": train_params.get("init"),
+        "n_init": getattr(km, "n_init", train_params.get("n_init")),
+        "max_iter": getattr(km, "max_iter", train_params.get("max_iter")),
+    }
 
+    memo = _summary_memo()
+    if memo is not None:
+        summary = memo["body"]
+        metrics, clusters = summary["metrics"], summary["clusters"]
+        cluster_eval = model_metrics(STATE)
+        key = report_key("pdf", memo["etag"])
     else:
-        return jsonify({"error": "Format tidak didukung. Gunakan 'pdf' atau 'csv'."}), 400
+        # model dari registry tanpa matriks X: distribusi cluster saja
+        counts = np.bincount(labels, minlength=k)
+        total = int(labels.size) or 1
+        metrics = {"wcss": STATE.get("last_inertia"), "silhouette": STATE.get("last_silhouette"),
+                   "dbi": STATE.get("last_dbi")}
+        clusters = [{"id": c, "size": int(counts[c]), "share": counts[c] / total} for c in range(k) if counts[c]]
+        cluster_eval = None
+        key = report_key("pdf", STATE.get("model_id") or current_session(), STATE.get("model_version"))
+
+    dataset_name = STATE.get("dataset_name") or "dataset.csv"
+    profile = STATE.get("cluster_profile")
+    path_out = cached_report(key, lambda path: build_report_pdf(
+        path, dataset_name=dataset_name, params=params, metrics=metrics,
+        clusters=clusters, cluster_eval=cluster_eval, profile=profile,
+    ))
+    return send_file(path_out, as_attachment=True, download_name="report.pdf", mimetype="application/pdf")
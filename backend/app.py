@@ -1,18 +1,53 @@
-from flask import Flask
+from flask import Flask, request, g
 from flask_cors import CORS
+from store.state import use_session, reset_session, sync_session, flush_session
 
 # import blueprint dari tiap file
 from api.data_routes import data_bp
 from api.model_routes import model_bp
 from api.report_routes import report_bp
+from api.job_routes import job_bp
+from api.metrics_routes import metrics_bp
+from api.chart_routes import chart_bp
+from api.registry_routes import registry_bp
+from services.profile_utils import init_profiling
+from services.encode_utils import init_encoding
 
 def create_app():
     app = Flask(__name__)
     CORS(app)
+    # span per service call → Server-Timing + histogram latency di /api/metrics
+    init_profiling(app)
+    # ?encode=columnar|typed|arrow + kompresi gzip/brotli (setelah profiling → ikut terukur)
+    init_encoding(app)
     # daftar semua blueprint
     app.register_blueprint(data_bp)
     app.register_blueprint(model_bp)
     app.register_blueprint(report_bp)
+    app.register_blueprint(job_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(chart_bp)
+    app.register_blueprint(registry_bp)
+
+    # state per session: id dari header X-Session-Id / cookie / ?session=
+    @app.before_request
+    def _bind_session():
+        sid = (request.headers.get("X-Session-Id")
+               or request.cookies.get("cw_session")
+               or request.args.get("session"))
+        g.session_token = use_session(sid)
+        sync_session()
+
+    @app.teardown_request
+    def _flush_session(exc=None):
+        token = g.pop("session_token", None)
+        if token is None:
+            return
+        try:
+            flush_session()
+        finally:
+            reset_session(token)
+
     return app
 
 app = create_app()
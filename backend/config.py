@@ -1,8 +1,119 @@
 import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# DATA_DIR bisa dialihkan lewat env (mis. benchmark / deployment dengan volume terpisah)
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(BASE_DIR, "data")
 UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
 OUT_DIR = os.path.join(DATA_DIR, "outputs")
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(OUT_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(OUT_DIR, exist_ok=True)
+# jumlah maksimum hasil fit KMeans (per k) yang disimpan sweep engine
+FIT_CACHE_MAX = int(os.environ.get("FIT_CACHE_MAX", 64))
+
+# sweep paralel: jumlah proses worker (1 = serial, -1 = semua core),
+# thread BLAS per worker (0 = otomatis cpu_count // workers), dan start method
+SWEEP_WORKERS = int(os.environ.get("SWEEP_WORKERS", 1))
+SWEEP_BLAS_THREADS = int(os.environ.get("SWEEP_BLAS_THREADS", 0))
+SWEEP_START_METHOD = os.environ.get("SWEEP_START_METHOD", "spawn")
+
+# job async untuk endpoint modeling: jumlah thread executor & riwayat job yang disimpan
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_HISTORY_MAX = int(os.environ.get("JOB_HISTORY_MAX", 100))
+
+# silhouette: n maksimum untuk mode exact di "auto", ukuran sampel mode sampled,
+# ukuran blok baris (memori ≈ blok² float64) dan tingkat kepercayaan interval
+SILHOUETTE_EXACT_MAX_N = int(os.environ.get("SILHOUETTE_EXACT_MAX_N", 10000))
+SILHOUETTE_SAMPLE_SIZE = int(os.environ.get("SILHOUETTE_SAMPLE_SIZE", 4000))
+SILHOUETTE_BLOCK_ROWS = int(os.environ.get("SILHOUETTE_BLOCK_ROWS", 2048))
+SILHOUETTE_CONFIDENCE = float(os.environ.get("SILHOUETTE_CONFIDENCE", 0.95))
+
+# engine minibatch/online: ukuran batch (= ukuran chunk partial_fit) & epoch maksimum online
+MINIBATCH_SIZE = int(os.environ.get("MINIBATCH_SIZE", 1024))
+ONLINE_MAX_EPOCHS = int(os.environ.get("ONLINE_MAX_EPOCHS", 3))
+# ukuran sampel untuk membandingkan inertia engine minibatch/online vs full-batch
+INERTIA_CHECK_SAMPLE = int(os.environ.get("INERTIA_CHECK_SAMPLE", 5000))
+
+# ingestion: jumlah baris per chunk CSV & ukuran sampel byte untuk sniffing delimiter/encoding
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", 100_000))
+SNIFF_BYTES = int(os.environ.get("SNIFF_BYTES", 64 * 1024))
+
+# cache dataset hasil parse (Parquet, key = hash isi file) + batas ukuran total (LRU)
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 2 * 1024 ** 3))
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# jumlah output stage preprocessing (select/missing/encode/scale) yang di-memo
+# & batas total byte di RAM (frame + array non-memmap) milik memo itu
+PREP_CACHE_MAX = int(os.environ.get("PREP_CACHE_MAX", 12))
+PREP_CACHE_MAX_BYTES = int(os.environ.get("PREP_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+
+# state per session: folder spill, jumlah session yang ditahan di memori (LRU)
+# dan detik idle sebelum session di-spill ke disk
+SESSION_DIR = os.path.join(DATA_DIR, "sessions")
+SESSION_HOT_MAX = int(os.environ.get("SESSION_HOT_MAX", 8))
+SESSION_IDLE_SECONDS = int(os.environ.get("SESSION_IDLE_SECONDS", 900))
+os.makedirs(SESSION_DIR, exist_ok=True)
+
+# matriks fitur hasil preprocessing (file memory-mapped, dibagi antar worker):
+# folder, dtype default (float64 | float32 → separuh memori) & batas total ukuran
+MATRIX_DIR = os.path.join(DATA_DIR, "matrices")
+MATRIX_DTYPE = os.environ.get("MATRIX_DTYPE", "float64")
+MATRIX_MAX_BYTES = int(os.environ.get("MATRIX_MAX_BYTES", 4 * 1024 ** 3))
+os.makedirs(MATRIX_DIR, exist_ok=True)
+
+# profiling: flamegraph sampling opt-in per request (X-Profile: 1) boleh dipakai?,
+# interval sampling stack (ms), folder hasil folded stacks & jumlah maks file profile
+PROFILE_ENABLED = int(os.environ.get("PROFILE_ENABLED", 1))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.path.join(OUT_DIR, "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 64))
+
+# chart: spec series & gambar hasil render (SVG / PNG) di-cache per hash isi,
+# dpi PNG (rendah; client modern render sendiri dari series) & jumlah maks chart
+CHART_DIR = os.path.join(OUT_DIR, "charts")
+CHART_PNG_DPI = int(os.environ.get("CHART_PNG_DPI", 72))
+CHART_CACHE_MAX = int(os.environ.get("CHART_CACHE_MAX", 256))
+os.makedirs(CHART_DIR, exist_ok=True)
+
+# scoring data baru (/api/model/predict): baris per chunk input (CSV/JSON)
+# & baris per blok perhitungan jarak ke centroid
+PREDICT_CHUNK_ROWS = int(os.environ.get("PREDICT_CHUNK_ROWS", 50_000))
+PREDICT_BLOCK_ROWS = int(os.environ.get("PREDICT_BLOCK_ROWS", 8192))
+
+# registry model terlatih (centroid + artefak preprocessing per versi) & jumlah versi yang disimpan
+MODEL_DIR = os.path.join(OUT_DIR, "models")
+MODEL_KEEP = int(os.environ.get("MODEL_KEEP", 50))
+os.makedirs(MODEL_DIR, exist_ok=True)
+
+# retrain warm-start: toleransi konvergensi (relatif thd rata-rata varians fitur, seperti tol sklearn)
+WARM_TOL = float(os.environ.get("WARM_TOL", 1e-4))
+
+# export hasil clustering (CSV / Parquet di-stream per chunk) & file report PDF
+# ber-key per model (dipakai ulang selama model sama) + jumlah file yang disimpan
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 50_000))
+REPORT_DIR = os.path.join(OUT_DIR, "reports")
+REPORT_KEEP = int(os.environ.get("REPORT_KEEP", 64))
+os.makedirs(REPORT_DIR, exist_ok=True)
+
+# kernel jarak titik → centroid: ukuran tile (byte, tile X + tile jarak ≈ muat cache L2)
+# & jumlah thread per panggilan (GEMM per tile melepas GIL)
+DIST_TILE_BYTES = int(os.environ.get("DIST_TILE_BYTES", 1024 * 1024))
+DIST_WORKERS = int(os.environ.get("DIST_WORKERS", min(4, os.cpu_count() or 1)))
+
+# elbow adaptif: berhenti bila penurunan WCSS setelah k_suggest ≤ fraksi ini
+# dari total penurunan WCSS di rentang k (dan kandidat knee sudah sepakat)
+ELBOW_ADAPTIVE_TOL = float(os.environ.get("ELBOW_ADAPTIVE_TOL", 0.05))
+
+# analisis stabilitas segmen: jumlah fit resample per k, porsi baris per resample,
+# ukuran sampel referensi (ARI) & jumlah maks pasangan baris co-assignment (memori tetap)
+STABILITY_B = int(os.environ.get("STABILITY_B", 20))
+STABILITY_FRAC = float(os.environ.get("STABILITY_FRAC", 0.8))
+STABILITY_REF_ROWS = int(os.environ.get("STABILITY_REF_ROWS", 2000))
+STABILITY_PAIRS = int(os.environ.get("STABILITY_PAIRS", 200_000))
+
+# encoding respons: kompresi gzip/brotli untuk body ≥ COMPRESS_MIN_BYTES (level gzip,
+# quality brotli) & panjang minimal list angka yang di-pack jadi typed array (?encode=typed)
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+TYPED_MIN_LEN = int(os.environ.get("TYPED_MIN_LEN", 16))
@@ -0,0 +1,203 @@
+import os, json, time, shutil, threading
+import pandas as pd
+from config import CACHE_DIR, CACHE_MAX_BYTES
+from services.io_utils import read_csv_or_xlsx
+from services.profile_utils import traced
+
+# ==============================
+#  Dataset cache (Parquet, key = hash isi file)
+# ==============================
+# Upload ulang file yang sama (mapping/preprocessing beda) tidak perlu parse
+# CSV/XLSX lagi: frame hasil parse disimpan kolumnar di CACHE_DIR/<hash>/.
+# Kolom yang belum pernah diminta di-parse dari file sumber lalu digabung.
+# Eviksi LRU berdasarkan total ukuran (mtime meta.json = waktu akses).
+# Lock per hash: parse & tulis Parquet satu dataset tidak memblok dataset lain;
+# _LOCK global hanya untuk tabel lock, statistik & eviksi.
+
+_STATS = {"hits": 0, "misses": 0, "partial": 0, "evictions": 0}
+_LOCK = threading.Lock()
+_ENTRY_LOCKS = {}
+
+
+def _entry_lock(digest):
+    with _LOCK:
+        return _ENTRY_LOCKS.setdefault(digest, threading.Lock())
+
+
+def _count(name):
+    with _LOCK:
+        _STATS[name] += 1
+
+
+def _entry_dir(digest):
+    return os.path.join(CACHE_DIR, digest)
+
+
+def _read_meta(digest):
+    try:
+        with open(os.path.join(_entry_dir(digest), "meta.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(digest, meta):
+    path = os.path.join(_entry_dir(digest), "meta.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, path)
+
+
+def _to_parquet(df, path):
+    tmp = path + ".tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+    except Exception:
+        # kolom object campuran (angka + teks) → simpan sebagai string nullable
+        fixed = df.copy()
+        for c in fixed.columns:
+            if fixed[c].dtype == object:
+                fixed[c] = fixed[c].astype("string")
+        fixed.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _from_parquet(path, columns=None):
+    df = pd.read_parquet(path, columns=columns)
+    # samakan dengan hasil parse CSV: kolom teks → object
+    for c in df.columns:
+        if pd.api.types.is_string_dtype(df[c]) and df[c].dtype != object:
+            df[c] = df[c].astype(object)
+    return df
+
+
+def _entry_bytes(digest):
+    total = 0
+    for root, _dirs, files in os.walk(_entry_dir(digest)):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:      # file .tmp entri lain yang sedang ditulis sudah di-rename
+                pass
+    return total
+
+
+def _entries():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    out = []
+    for digest in os.listdir(CACHE_DIR):
+        meta_path = os.path.join(_entry_dir(digest), "meta.json")
+        if os.path.exists(meta_path):
+            out.append((os.path.getmtime(meta_path), digest))
+    return sorted(out)   # paling lama diakses di depan
+
+
+def _evict(keep):
+    """
+    Hapus entri LRU sampai total ukuran <= CACHE_MAX_BYTES (kecuali `keep` dan
+    entri yang sedang dibaca/ditulis thread lain).
+    """
+    with _LOCK:
+        entries = _entries()
+        sizes = {d: _entry_bytes(d) for _t, d in entries}
+        total = sum(sizes.values())
+        for _t, digest in entries:
+            if total <= CACHE_MAX_BYTES:
+                break
+            lock = _ENTRY_LOCKS.get(digest)
+            if digest == keep or (lock is not None and lock.locked()):
+                continue
+            shutil.rmtree(_entry_dir(digest), ignore_errors=True)
+            total -= sizes[digest]
+            _STATS["evictions"] += 1
+
+
+@traced("load_dataset")
+def load_dataset(path, digest, usecols=None):
+    """
+    Frame untuk file `path` (hash isi `digest`), hanya kolom `usecols` (None = semua).
+    Cache hit → baca Parquet; kolom yang belum ada di cache di-parse dari file
+    sumber lalu disimpan. File upload duplikat (isi sama dengan sumber cache)
+    dihapus supaya folder uploads tidak menumpuk salinan export yang sama.
+    """
+    with _entry_lock(digest):
+        meta = _read_meta(digest)
+        frame_path = os.path.join(_entry_dir(digest), "frame.parquet")
+        if meta is not None:
+            src = meta.get("source") or ""
+            if not os.path.exists(src):
+                meta["source"] = path    # file sumber lama sudah hilang → pakai upload baru
+            elif os.path.abspath(src) != os.path.abspath(path) and os.path.exists(path):
+                os.remove(path)
+
+        if meta is None:
+            wanted = None if usecols is None else list(dict.fromkeys(usecols))
+            df = read_csv_or_xlsx(path, usecols=wanted)
+            os.makedirs(_entry_dir(digest), exist_ok=True)
+            _to_parquet(df, frame_path)
+            meta = {
+                "source": path,
+                "columns": df.columns.tolist(),
+                "complete": usecols is None,
+                "absent": [c for c in (wanted or []) if c not in df.columns],
+                "rows": int(len(df)),
+                "created_at": time.time(),
+            }
+            _write_meta(digest, meta)
+            _count("misses")
+            _evict(keep=digest)
+            return df
+
+        known = set(meta["columns"]) | set(meta.get("absent", []))
+        if usecols is None:
+            missing = None if not meta.get("complete") else []
+        else:
+            missing = [c for c in dict.fromkeys(usecols) if c not in known]
+
+        if missing == []:
+            _count("hits")
+            cols = None if usecols is None else [c for c in meta["columns"] if c in set(usecols)]
+            df = _from_parquet(frame_path, columns=cols)
+        else:
+            # sebagian kolom belum di-cache → parse kolom itu saja lalu gabungkan
+            _count("partial")
+            cached = _from_parquet(frame_path)
+            extra = read_csv_or_xlsx(meta["source"], usecols=missing)
+            extra = extra[[c for c in extra.columns if c not in cached.columns]]
+            merged = pd.concat([cached, extra], axis=1)
+            _to_parquet(merged, frame_path)
+            meta["columns"] = merged.columns.tolist()
+            if missing is None:
+                meta["complete"] = True
+            else:
+                meta["absent"] = sorted(set(meta.get("absent", [])) | (set(missing) - set(extra.columns)))
+            df = merged if usecols is None else merged[[c for c in merged.columns if c in set(usecols)]]
+            _evict(keep=digest)
+
+        _write_meta(digest, meta)   # sekaligus update waktu akses (LRU)
+        return df
+
+
+def dataset_source(digest):
+    """Path file sumber entri cache (None kalau entri/file sudah tidak ada)."""
+    meta = _read_meta(digest)
+    src = (meta or {}).get("source")
+    return src if src and os.path.exists(src) else None
+
+
+def cache_stats():
+    entries = _entries()
+    sizes = [_entry_bytes(d) for _t, d in entries]
+    return {
+        **_STATS,
+        "entries": len(entries),
+        "bytes": int(sum(sizes)),
+        "max_bytes": int(CACHE_MAX_BYTES),
+        "datasets": [
+            {"hash": d, "bytes": int(b), "rows": (_read_meta(d) or {}).get("rows"),
+             "last_access": t}
+            for (t, d), b in zip(reversed(entries), reversed(sizes))
+        ],
+    }
@@ -0,0 +1,105 @@
+import os, json, base64, hashlib, threading
+from config import CHART_DIR, CHART_PNG_DPI, CHART_CACHE_MAX
+
+# ==============================
+#  Chart service
+# ==============================
+# Endpoint mengembalikan series mentah (ks, wcss, scores, counts) untuk
+# dirender di browser. Gambar server (SVG / PNG dpi rendah) hanya dibuat bila
+# diminta lewat /api/charts/<key>.<fmt>; key = hash isi series sehingga
+# gambar yang sama dirender sekali lalu dipakai ulang lintas request/worker.
+
+KINDS = ("line", "pie")
+FORMATS = {"svg": "image/svg+xml", "png": "image/png"}
+_LOCK = threading.Lock()
+
+
+def _key(kind, series):
+    raw = json.dumps([kind, series], sort_keys=True, separators=(",", ":"), default=float)
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def _spec_path(key):
+    return os.path.join(CHART_DIR, f"{key}.json")
+
+
+def chart_spec(kind, series):
+    """
+    Daftarkan series chart → {key, kind, series, urls}. Spec disimpan ke disk
+    (kecil) supaya worker mana pun bisa merender /api/charts/<key> belakangan.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Jenis chart tidak dikenal: {kind}")
+    key = _key(kind, series)
+    path = _spec_path(key)
+    if not os.path.exists(path):
+        os.makedirs(CHART_DIR, exist_ok=True)    # folder cache bisa dihapus saat server jalan
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"kind": kind, "series": series}, fh, default=float)
+        os.replace(tmp, path)
+        _prune()
+    return {
+        "key": key,
+        "kind": kind,
+        "series": series,
+        "urls": {fmt: f"/api/charts/{key}.{fmt}" for fmt in FORMATS},
+    }
+
+
+def render_chart(key, fmt="svg"):
+    """Bytes gambar chart `key` (dirender sekali, lalu dari cache file). None kalau key tidak dikenal."""
+    if fmt not in FORMATS or not key.isalnum():
+        return None
+    out = os.path.join(CHART_DIR, f"{key}.{fmt}")
+    if os.path.exists(out):
+        with open(out, "rb") as fh:
+            return fh.read()
+    try:
+        with open(_spec_path(key), encoding="utf-8") as fh:
+            spec = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    from services.viz_utils import draw_line, draw_pie
+    draw = draw_line if spec["kind"] == "line" else draw_pie
+    data = draw(spec["series"], fmt, CHART_PNG_DPI)
+    tmp = f"{out}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, out)
+    return data
+
+
+def chart_base64(spec, fmt="png"):
+    """Gambar chart sebagai base64 (kompatibilitas client lama yang minta image_base64)."""
+    data = render_chart(spec["key"], fmt)
+    return base64.b64encode(data).decode("ascii") if data is not None else None
+
+
+def chart_fields(kind, series, image=None):
+    """
+    Field respons untuk sebuah chart: {"chart": spec}. `image` truthy (opt-in
+    client lama) → ikut "image_base64" PNG hasil render yang di-cache.
+    """
+    spec = chart_spec(kind, series)
+    out = {"chart": spec}
+    if image:
+        out["image_base64"] = chart_base64(spec, "png")
+    return out
+
+
+def _prune():
+    """Simpan maksimal CHART_CACHE_MAX chart (spec + gambar), buang yang paling lama."""
+    with _LOCK:
+        specs = [f for f in os.listdir(CHART_DIR) if f.endswith(".json")]
+        if len(specs) <= CHART_CACHE_MAX:
+            return
+        specs.sort(key=lambda f: os.path.getmtime(os.path.join(CHART_DIR, f)))
+        for name in specs[:len(specs) - CHART_CACHE_MAX]:
+            key = name[:-5]
+            for ext in ("json", *FORMATS):
+                try:
+                    os.remove(os.path.join(CHART_DIR, f"{key}.{ext}"))
+                except OSError:
+                    pass
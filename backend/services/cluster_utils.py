@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+from services.profile_utils import traced
+
+# ==============================
+#  Profil cluster (kolumnar)
+# ==============================
+# Statistik per cluster × fitur dihitung sekaligus di atas array yang diurutkan
+# menurut label (satu argsort, layout fitur × baris): mean/std/kuantil per
+# blok cluster (vektor atas semua fitur), mode lewat np.bincount
+# (cluster × level) per fitur diskrit (kode Likert integer / kategori hasil
+# factorize). Hasil berupa list k × p per
+# statistik; ekspansi ke row-dict hanya di tepi JSON (profile_records).
+
+QUANTILES = {"q25": 0.25, "median": 0.5, "q75": 0.75}
+MODE_MAX_LEVELS = 256      # kolom dengan level lebih banyak dianggap kontinu (mode = None)
+MODE_MIN_INTEGRAL = 0.9    # porsi minimal nilai integer agar kolom numerik dianggap berkode (Likert)
+
+
+def _mode_table(labels, codes, levels, k):
+    """Mode per cluster untuk satu fitur diskrit: list k (None = cluster tanpa nilai)."""
+    R = len(levels)
+    ok = codes >= 0
+    counts = np.bincount(labels[ok] * R + codes[ok], minlength=k * R).reshape(k, R)
+    best = counts.argmax(axis=1).tolist()
+    has = (counts.max(axis=1) > 0).tolist()
+    return [levels[best[c]] if has[c] else None for c in range(k)]
+
+
+def _nan_to_none(arr):
+    return [[None if v != v else v for v in row] for row in np.asarray(arr, dtype=float).tolist()]
+
+
+def _block_stats(seg, has_nan):
+    """Blok satu cluster (fitur × baris, sudah di-sort per baris) → mean, std, kuantil per fitur."""
+    m, n = seg.shape
+    if not has_nan:
+        mean = seg.sum(axis=1) / n
+        d = seg - mean[:, None]
+        dev = np.einsum("ij,ij->i", d, d)
+        std = np.sqrt(dev / (n - 1)) if n > 1 else np.full(m, np.nan)
+        qs = {}
+        for name, q in QUANTILES.items():
+            pos = q * (n - 1)
+            lo = int(np.floor(pos))
+            hi = min(lo + 1, n - 1)
+            qs[name] = seg[:, lo] + (seg[:, hi] - seg[:, lo]) * (pos - lo)
+        return mean, std, qs
+    # ada NaN: hitung per fitur jumlah nilai valid (NaN ada di ujung hasil sort)
+    rows = np.arange(m)
+    cnt = np.count_nonzero(~np.isnan(seg), axis=1)
+    mean = np.nansum(seg, axis=1) / cnt
+    dev = np.nansum((seg - mean[:, None]) ** 2, axis=1)
+    std = np.where(cnt > 1, np.sqrt(dev / (cnt - 1)), np.nan)
+    qs = {}
+    for name, q in QUANTILES.items():
+        pos = q * np.maximum(cnt - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(cnt - 1, 0))
+        v_lo, v_hi = seg[rows, lo], seg[rows, hi]
+        qs[name] = np.where(cnt > 0, v_lo + (v_hi - v_lo) * (pos - lo), np.nan)
+    return mean, std, qs
+
+
+@traced("cluster_profile")
+def profile_clusters(df, labels, k=None):
+    """
+    Profil cluster dari DataFrame fitur asli (sebelum encoding/scaling).
+    Return dict kolumnar:
+      clusters, sizes, features, numeric (bool per fitur),
+      mean / std / q25 / median / q75 / mode → list k × p (None = tidak berlaku).
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    k = int(k if k is not None else labels.max() + 1)
+    feats = list(df.columns)
+    p = len(feats)
+    sizes = np.bincount(labels, minlength=k)
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    order = np.argsort(labels, kind="stable")
+    labels_sorted = labels[order]
+
+    numeric = [pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c]) for c in feats]
+    num_idx = [j for j, is_num in enumerate(numeric) if is_num]
+    stats = {name: np.full((k, p), np.nan) for name in ("mean", "std", *QUANTILES)}
+    mode_cols = {}
+
+    if num_idx:
+        # layout fitur × baris (baris kontigu) diurutkan menurut cluster
+        VT = np.take(df.iloc[:, num_idx].to_numpy(dtype=float, na_value=np.nan).T, order, axis=1)
+        nan_mask = np.isnan(VT)
+        has_nan = bool(nan_mask.any())
+
+        # --- mean / std / kuantil: satu blok per cluster, vektor atas semua fitur ---
+        with np.errstate(invalid="ignore", divide="ignore"):   # blok kosong / semua NaN → NaN
+            for c in range(k):
+                if not sizes[c]:
+                    continue
+                seg = np.sort(VT[:, bounds[c]:bounds[c + 1]], axis=1)
+                mean, std, qs = _block_stats(seg, has_nan)
+                stats["mean"][c, num_idx] = mean
+                stats["std"][c, num_idx] = std
+                for name, row in qs.items():
+                    stats[name][c, num_idx] = row
+
+        # --- mode fitur numerik berkode integer (Likert) ---
+        # sel non-integer (mis. hasil imputasi mean) diabaikan selama mayoritas
+        # nilai fitur memang kode integer
+        whole = ~nan_mask & (VT == np.floor(VT))
+        lo = np.min(np.where(whole, VT, np.inf), axis=1)
+        hi = np.max(np.where(whole, VT, -np.inf), axis=1)
+        share = whole.sum(axis=1) / np.maximum((~nan_mask).sum(axis=1), 1)
+        for r, j in enumerate(num_idx):
+            if not (share[r] >= MODE_MIN_INTEGRAL and hi[r] - lo[r] + 1 <= MODE_MAX_LEVELS):
+                continue
+            codes = np.where(whole[r], VT[r] - lo[r], -1).astype(np.int64)
+            levels = list(range(int(lo[r]), int(hi[r]) + 1))
+            mode_cols[j] = _mode_table(labels_sorted, codes, levels, k)
+
+    # --- mode fitur kategorikal (factorize → kode) ---
+    for j, c in enumerate(feats):
+        if numeric[j]:
+            continue
+        codes, uniques = pd.factorize(df[c])
+        if len(uniques) <= MODE_MAX_LEVELS:
+            levels = [u.item() if hasattr(u, "item") else u for u in uniques]
+            mode_cols[j] = _mode_table(labels, codes.astype(np.int64), levels, k)
+
+    mode = [[None] * p for _ in range(k)]
+    for j, col in mode_cols.items():
+        for c in range(k):
+            mode[c][j] = col[c]
+
+    return {
+        "clusters": list(range(k)),
+        "sizes": sizes.tolist(),
+        "features": [str(f) for f in feats],
+        "numeric": numeric,
+        **{name: _nan_to_none(arr) for name, arr in stats.items()},
+        "mode": mode,
+    }
+
+
+def profile_records(profile):
+    """Ekspansi profil kolumnar → [{cluster, feature, size, mean, std, q25, median, q75, mode}]."""
+    names = ("mean", "std", *QUANTILES, "mode")
+    rows = []
+    for c, size in zip(profile["clusters"], profile["sizes"]):
+        cols = [profile[name][c] for name in names]
+        for j, feat in enumerate(profile["features"]):
+            rows.append({"cluster": c, "feature": feat, "size": size,
+                         **{name: col[j] for name, col in zip(names, cols)}})
+    return rows
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+from config import DIST_TILE_BYTES, DIST_WORKERS
+from services.profile_utils import traced
+
+# ==============================
+#  Kernel jarak titik → centroid (blocked, CPU)
+# ==============================
+# ‖x − c‖² = ‖x‖² + ‖c‖² − 2x·c: x·c per tile baris lewat BLAS (GEMM), ‖x‖²
+# dihitung sekali per X lalu bisa dipakai ulang lintas panggilan (iterasi
+# Lloyd warm-start, metrik, export). Tinggi tile dipilih supaya tile X + tile
+# jarak muat di cache (DIST_TILE_BYTES); tile dibagi ke DIST_WORKERS thread
+# (GEMM & ufunc numpy melepas GIL, tiap thread menulis slice output sendiri).
+# dtype kerja mengikuti X (memmap float32 → GEMM float32); akumulasi hasil
+# (jarak minimum, norma) tetap float64.
+
+
+def work_dtype(X, dtype=None):
+    """float32 kalau diminta / X memang float32, selain itu float64."""
+    if dtype is not None:
+        return np.dtype(dtype)
+    return np.dtype(np.float32) if getattr(X, "dtype", None) == np.float32 else np.dtype(np.float64)
+
+
+def tile_rows(p, k, itemsize=8):
+    """Baris per tile: tile X (rows × p) + tile jarak (rows × k) ≈ DIST_TILE_BYTES."""
+    return max(256, int(DIST_TILE_BYTES // (itemsize * (p + k))))
+
+
+def _tiles(n, rows):
+    return [(s, min(n, s + rows)) for s in range(0, n, rows)]
+
+
+def _run(fn, tiles, n_jobs):
+    n_jobs = int(n_jobs or DIST_WORKERS)
+    if n_jobs <= 1 or len(tiles) < 2:
+        for t in tiles:
+            fn(*t)
+        return
+    with ThreadPoolExecutor(max_workers=min(n_jobs, len(tiles))) as ex:
+        list(ex.map(lambda t: fn(*t), tiles))
+
+
+def _block(X, s, e, wd):
+    Xb = X[s:e]
+    if sp.issparse(Xb):
+        return Xb if Xb.dtype == wd else Xb.astype(wd)
+    return np.asarray(Xb, dtype=wd)
+
+
+def _row_sq(Xb):
+    if sp.issparse(Xb):
+        return np.asarray(Xb.multiply(Xb).sum(axis=1), dtype=np.float64).ravel()
+    return np.einsum("ij,ij->i", Xb, Xb, dtype=np.float64)
+
+
+def row_norms(X, dtype=None, n_jobs=None):
+    """‖x‖² per baris X (dense / memmap / CSR), float64."""
+    n = X.shape[0]
+    wd = work_dtype(X, dtype)
+    out = np.empty(n, dtype=np.float64)
+
+    def work(s, e):
+        out[s:e] = _row_sq(_block(X, s, e, wd))
+
+    _run(work, _tiles(n, tile_rows(X.shape[1], 0, wd.itemsize)), n_jobs)
+    return out
+
+
+@traced("distance_argmin")
+def nearest_centroid(X, centroids, *, x_sq=None, dtype=None, n_jobs=None, return_all=False, rows=None):
+    """
+    Centroid terdekat tiap baris X. Return (labels int32, d² minimum float64,
+    matriks d² n × k atau None). x_sq = row_norms(X) yang sudah ada (opsional).
+    """
+    wd = work_dtype(X, dtype)
+    C = np.asarray(centroids, dtype=np.float64)
+    n, k = X.shape[0], C.shape[0]
+    Ct = np.ascontiguousarray(C.T, dtype=wd)
+    c_sq = np.einsum("ij,ij->i", C, C).astype(wd)
+    labels = np.empty(n, dtype=np.int32)
+    best = np.empty(n, dtype=np.float64)
+    full = np.empty((n, k), dtype=np.float64) if return_all else None
+
+    def work(s, e):
+        Xb = _block(X, s, e, wd)
+        xs = x_sq[s:e] if x_sq is not None else _row_sq(Xb)
+        d2 = np.asarray(Xb @ Ct)
+        d2 *= -2.0
+        d2 += xs.astype(wd, copy=False)[:, None]
+        d2 += c_sq[None, :]
+        np.maximum(d2, 0.0, out=d2)
+        lab = d2.argmin(axis=1)
+        labels[s:e] = lab
+        best[s:e] = d2[np.arange(e - s), lab]
+        if full is not None:
+            full[s:e] = d2
+
+    _run(work, _tiles(n, int(rows or tile_rows(X.shape[1], k, wd.itemsize))), n_jobs)
+    return labels, best, full
+
+
+def assigned_sq_dist(Xb, C, codes, c_sq=None, x_sq=None):
+    """‖x − C[code]‖² per baris blok Xb (dense / CSR) untuk label yang sudah ada → (d², ‖x‖²)."""
+    C = np.asarray(C, dtype=np.float64)
+    if c_sq is None:
+        c_sq = np.einsum("ij,ij->i", C, C)
+    if sp.issparse(Xb):
+        cross = np.asarray(Xb.multiply(C[codes]).sum(axis=1)).ravel()
+    else:
+        Xb = np.asarray(Xb, dtype=np.float64)
+        cross = np.einsum("ij,ij->i", Xb, C[codes])
+    if x_sq is None:
+        x_sq = _row_sq(Xb)
+    return np.maximum(x_sq - 2.0 * cross + c_sq[codes], 0.0), x_sq
+
+
+def pairwise_dist(A, B, a_sq=None, b_sq=None, squared=False, dtype=np.float64):
+    """Jarak euclid semua pasangan baris A × B (satu tile) dengan norma yang sudah ada."""
+    wd = np.dtype(dtype)
+    A = A.astype(wd) if sp.issparse(A) else np.asarray(A, dtype=wd)
+    B = B.astype(wd) if sp.issparse(B) else np.asarray(B, dtype=wd)
+    a_sq = _row_sq(A) if a_sq is None else a_sq
+    b_sq = _row_sq(B) if b_sq is None else b_sq
+    D = A @ B.T
+    D = D.toarray() if sp.issparse(D) else np.asarray(D, dtype=np.float64)
+    D *= -2.0
+    D += a_sq[:, None]
+    D += b_sq[None, :]
+    np.maximum(D, 0.0, out=D)
+    return D if squared else np.sqrt(D, out=D)
@@ -0,0 +1,203 @@
+import gzip, base64
+import numpy as np
+from config import COMPRESS_MIN_BYTES, COMPRESS_LEVEL, BROTLI_QUALITY, TYPED_MIN_LEN
+from services.profile_utils import span
+
+# ==============================
+#  Encoding respons (kolumnar / typed array / Arrow) & kompresi
+# ==============================
+# Default respons tetap JSON biasa (frontend lama tidak berubah). Client yang
+# mau payload ringkas memilih lewat ?encode= atau header Accept:
+#   ?encode=columnar → list record seragam ([{a, b}, ...], mis. tabel centroid,
+#                      clusters DBI) jadi {"columns": [a, b], "arrays": [[...], [...]]}
+#   ?encode=typed    → kolumnar + array numerik (≥ TYPED_MIN_LEN elemen, 1-D / 2-D)
+#                      jadi {"dtype", "shape", "b64"} little-endian; int di-pack ke
+#                      dtype terkecil (label cluster → uint8)
+#   ?encode=arrow / Accept: application/vnd.apache.arrow.stream
+#                    → Arrow IPC stream satu baris (list record → list<struct>);
+#                      body yang tidak bisa dipetakan Arrow tetap JSON
+# Dipasang sebagai JSON provider app → berlaku untuk semua jsonify(), tanpa
+# dump-parse ulang. Kompresi gzip / brotli (bila paket brotli terpasang) sesuai
+# Accept-Encoding untuk respons non-stream ≥ COMPRESS_MIN_BYTES.
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+ENCODINGS = ("json", "columnar", "typed", "arrow")
+_COMPRESSIBLE = ("application/json", ARROW_MIME, "image/svg+xml", "text/plain")
+_INT_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32)
+
+try:
+    import brotli
+except ImportError:          # opsional: tanpa paket brotli → gzip saja
+    brotli = None
+
+
+def pack_labels(labels, k=None):
+    """Label cluster → ndarray integer tak bertanda terkecil yang muat (uint8 utk k ≤ 256)."""
+    labels = np.asarray(labels)
+    k = int(k if k is not None else (labels.max() + 1 if labels.size else 1))
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if k - 1 <= np.iinfo(dtype).max:
+            return labels.astype(dtype, copy=False)
+    return labels.astype(np.int64, copy=False)
+
+
+# ------------------------------
+#  Kolumnar & typed array
+# ------------------------------
+def _scalar(v):
+    return v is None or isinstance(v, (str, int, float, bool))
+
+
+def _is_records(obj):
+    if not obj or not isinstance(obj[0], dict):
+        return False
+    keys = tuple(obj[0])
+    return all(isinstance(r, dict) and tuple(r) == keys and all(_scalar(v) for v in r.values())
+               for r in obj)
+
+
+def typed_array(values):
+    """List angka (1-D / 2-D rata) → {"dtype", "shape", "b64"}; None kalau tidak bisa."""
+    if len(values) < TYPED_MIN_LEN:
+        return None
+    first = values[0]
+    if isinstance(first, bool) or not isinstance(first, (int, float, list, np.number)):
+        return None
+    try:
+        arr = np.asarray(values)
+    except ValueError:        # list bersarang tidak rata
+        return None
+    if arr.dtype.kind == "i" or arr.dtype.kind == "u":
+        lo, hi = int(arr.min()), int(arr.max())
+        dtype = next((d for d in _INT_DTYPES if np.iinfo(d).min <= lo and hi <= np.iinfo(d).max), None)
+        if dtype is None:     # di luar int32 → JS tidak bisa membaca presisi penuh
+            return None
+    elif arr.dtype.kind == "f":
+        dtype = np.float64
+    else:
+        return None
+    if arr.ndim > 2:
+        return None
+    data = np.ascontiguousarray(arr, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": np.dtype(dtype).name, "shape": list(arr.shape),
+            "b64": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def encode_columnar(obj, typed=False):
+    """Telusuri body respons: list record → kolumnar; opsional array numerik → typed."""
+    if isinstance(obj, dict):
+        return {k: encode_columnar(v, typed) for k, v in obj.items()}
+    if isinstance(obj, np.ndarray):
+        obj = obj.tolist()
+    if isinstance(obj, (list, tuple)):
+        obj = list(obj)
+        if _is_records(obj):
+            cols = list(obj[0])
+            arrays = [[r[c] for r in obj] for c in cols]
+            return {"columns": cols,
+                    "arrays": [(typed and typed_array(a)) or a for a in arrays]}
+        if typed:
+            packed = typed_array(obj)
+            if packed is not None:
+                return packed
+        return [encode_columnar(v, typed) for v in obj]
+    return obj
+
+
+def arrow_ipc(obj):
+    """Body respons → bytes Arrow IPC stream (satu baris); None kalau tipe tidak bisa dipetakan."""
+    try:
+        import pyarrow as pa
+        table = pa.Table.from_pylist([obj])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    except Exception:
+        return None
+
+
+def negotiated(request):
+    """Encoding yang diminta request: ?encode=... atau Accept Arrow; default json."""
+    enc = (request.args.get("encode") or "").lower()
+    if enc in ENCODINGS:
+        return enc
+    if ARROW_MIME in (request.headers.get("Accept") or ""):
+        return "arrow"
+    return "json"
+
+
+# ------------------------------
+#  Kompresi
+# ------------------------------
+def pick_encoding(accept_encoding):
+    """br (kalau tersedia) > gzip, mengikuti Accept-Encoding (q=0 = ditolak)."""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.lower()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def init_encoding(app):
+    """Pasang encoding layer di app: JSON provider ter-negosiasi + kompresi respons."""
+    from flask import request, has_request_context
+
+    base = type(app.json)
+
+    class _EncodedJSON(base):
+        def response(self, *args, **kwargs):
+            enc = negotiated(request) if has_request_context() else "json"
+            if enc == "json":
+                return super().response(*args, **kwargs)
+            obj = self._prepare_response_obj(args, kwargs)
+            with span("encode"):
+                if enc == "arrow" and not (isinstance(obj, dict) and "error" in obj):
+                    data = arrow_ipc(obj)
+                    if data is not None:
+                        resp = self._app.response_class(data, mimetype=ARROW_MIME)
+                        resp.headers["X-Encoding"] = "arrow"
+                        return resp
+                    enc = "typed"     # tidak terpetakan ke Arrow → JSON typed
+                obj = encode_columnar(obj, typed=(enc == "typed"))
+            resp = super().response(obj)
+            resp.headers["X-Encoding"] = enc
+            return resp
+
+    app.json = _EncodedJSON(app)
+
+    @app.after_request
+    def _compress(resp):
+        if (resp.direct_passthrough or resp.is_streamed or resp.status_code != 200
+                or "Content-Encoding" in resp.headers
+                or resp.mimetype not in _COMPRESSIBLE):
+            return resp
+        resp.vary.add("Accept-Encoding")
+        encoding = pick_encoding(request.headers.get("Accept-Encoding"))
+        data = resp.get_data()
+        if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+            return resp
+        with span("compress"):
+            resp.set_data(compress(data, encoding))
+        resp.headers["Content-Encoding"] = encoding
+        etag, weak = resp.get_etag()
+        if etag and not weak:           # isi byte berbeda per encoding → ETag lemah
+            resp.set_etag(etag, weak=True)
+        return resp
@@ -0,0 +1,181 @@
+import numpy as np
+import scipy.sparse as sp
+from config import PREDICT_BLOCK_ROWS
+from services.profile_utils import traced
+from services.distance_utils import assigned_sq_dist
+
+# ==============================
+#  Metrik evaluasi cluster (satu pass)
+# ==============================
+# DBI, Calinski–Harabasz, SSE & ukuran per cluster dari satu pass blok baris
+# atas X (dense / memmap / CSR) memakai centroid & label yang sudah ada.
+# Statistik cukup per cluster yang dikumpulkan:
+#   n_c, Σx (k × p), Σ‖x‖², Σ‖x − c‖² (SSE ke centroid), Σ‖x − c‖ (scatter DBI)
+# CH dihitung exact dari Σx & Σ‖x‖² (dispersi di sekitar mean cluster, sama
+# dengan sklearn); SSE memakai centroid tersimpan. DBI (sama dengan sklearn)
+# memakai mean cluster hasil pass yang sama: kalau centroid tersimpan = mean
+# (KMeans konvergen) jarak baris cukup dihitung sekali; kalau tidak (minibatch /
+# online / belum konvergen) Σ‖x − mean‖ butuh satu pass tambahan.
+
+
+def _dense(A):
+    return A.toarray() if sp.issparse(A) else np.asarray(A, dtype=float)
+
+
+def _cluster_sums(X, codes, k, block_rows):
+    sums = np.zeros((k, X.shape[1]))
+    for start in range(0, X.shape[0], block_rows):
+        cb = codes[start:start + block_rows]
+        ind = sp.csr_matrix((np.ones(len(cb)), (cb, np.arange(len(cb)))), shape=(k, len(cb)))
+        sums += _dense(ind @ X[start:start + block_rows])
+    return sums
+
+
+def _dist_sums(X, codes, M, k, block_rows):
+    """Σ‖x − M[label]‖ per cluster (pass blok baris)."""
+    m_sq = np.einsum("ij,ij->i", M, M)
+    dist = np.zeros(k)
+    for start in range(0, X.shape[0], block_rows):
+        Xb = X[start:start + block_rows]
+        cb = codes[start:start + block_rows]
+        if not sp.issparse(Xb):
+            Xb = np.asarray(Xb, dtype=float)
+        d2, _ = assigned_sq_dist(Xb, M, cb, m_sq)
+        dist += np.bincount(cb, weights=np.sqrt(d2), minlength=k)
+    return dist
+
+
+def _dbi_terms(intra, centers):
+    """R_i = max_j (s_i + s_j) / d(c_i, c_j) dan j terdekat (rumus sklearn)."""
+    diff = centers[:, None, :] - centers[None, :, :]
+    cdist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+    if np.allclose(intra, 0) or np.allclose(cdist, 0):
+        return np.zeros(len(intra)), np.full(len(intra), -1)
+    cdist[cdist == 0] = np.inf
+    combined = (intra[:, None] + intra[None, :]) / cdist
+    np.fill_diagonal(combined, -np.inf)
+    return combined.max(axis=1), combined.argmax(axis=1)
+
+
+@traced("cluster_metrics")
+def cluster_metrics(X, labels, centroids=None, k=None, block_rows=None):
+    """
+    Return dict:
+      k, n, sizes, sse (per cluster, ke centroid), inertia (Σ sse), scatter
+      (rata-rata jarak ke mean cluster), dbi_terms & closest (pasangan penentu DBI),
+      dbi, calinski_harabasz, means (ndarray k × p, mean fitur per cluster).
+    centroids=None → mean cluster (butuh satu pass tambahan untuk Σx).
+    """
+    codes = np.asarray(labels, dtype=np.int64)
+    n = X.shape[0]
+    if len(codes) != n:
+        raise ValueError("Panjang label tidak sama dengan jumlah baris X.")
+    k = int(k if k is not None else codes.max() + 1)
+    block_rows = int(block_rows or PREDICT_BLOCK_ROWS)
+
+    sums_first = None
+    if centroids is None:
+        sums_first = _cluster_sums(X, codes, k, block_rows)
+        sizes0 = np.bincount(codes, minlength=k)
+        C = np.divide(sums_first, np.maximum(sizes0, 1)[:, None])
+    else:
+        C = np.asarray(centroids, dtype=float)
+        if C.shape != (k, X.shape[1]):
+            raise ValueError(f"Centroid {C.shape} tidak cocok dengan k={k} × p={X.shape[1]}.")
+    c_sq = np.einsum("ij,ij->i", C, C)
+
+    sums = np.zeros((k, X.shape[1])) if sums_first is None else sums_first
+    sq = np.zeros(k)
+    sse = np.zeros(k)
+    dist = np.zeros(k)
+    for start in range(0, n, block_rows):
+        Xb = X[start:start + block_rows]
+        cb = codes[start:start + block_rows]
+        if not sp.issparse(Xb):
+            Xb = np.asarray(Xb, dtype=float)
+        d2, x_sq = assigned_sq_dist(Xb, C, cb, c_sq)
+        sq += np.bincount(cb, weights=x_sq, minlength=k)
+        sse += np.bincount(cb, weights=d2, minlength=k)
+        dist += np.bincount(cb, weights=np.sqrt(d2), minlength=k)
+        if sums_first is None:
+            ind = sp.csr_matrix((np.ones(len(cb)), (cb, np.arange(len(cb)))), shape=(k, len(cb)))
+            sums += _dense(ind @ Xb)
+
+    sizes = np.bincount(codes, minlength=k)
+    live = np.flatnonzero(sizes)
+    means = np.zeros_like(sums)
+    means[live] = sums[live] / sizes[live, None]
+    if sums_first is None and not np.allclose(means[live], C[live], rtol=1e-9, atol=1e-12):
+        dist = _dist_sums(X, codes, means, k, block_rows)   # centroid ≠ mean → scatter ke mean
+    scatter = np.zeros(k)
+    scatter[live] = dist[live] / sizes[live]
+
+    # --- Calinski–Harabasz: dispersi antar / dalam cluster (exact, di sekitar mean) ---
+    m = len(live)
+    ch = None
+    if 1 < m < n:
+        within = float(np.sum(sq[live] - sizes[live] * np.einsum("ij,ij->i", means[live], means[live])))
+        center = sums.sum(axis=0) / n
+        gap = means[live] - center
+        between = float(np.sum(sizes[live] * np.einsum("ij,ij->i", gap, gap)))
+        ch = 1.0 if within <= 0 else between * (n - m) / (within * (m - 1))
+
+    # --- Davies–Bouldin: scatter & jarak antar mean cluster (cluster kosong diabaikan) ---
+    dbi, terms, closest = None, [None] * k, [None] * k
+    if 1 < m < n:
+        r, j = _dbi_terms(scatter[live], means[live])
+        dbi = float(r.mean())
+        for i, c in enumerate(live.tolist()):
+            terms[c] = float(r[i])
+            closest[c] = int(live[j[i]]) if j[i] >= 0 else None
+
+    return {
+        "k": k,
+        "n": int(n),
+        "sizes": sizes.tolist(),
+        "sse": sse.tolist(),
+        "inertia": float(sse.sum()),
+        "scatter": scatter.tolist(),
+        "dbi_terms": terms,
+        "closest": closest,
+        "dbi": dbi,
+        "calinski_harabasz": ch,
+        "means": means,
+    }
+
+
+def metrics_records(metrics):
+    """Rincian per cluster → [{cluster, size, share, sse, scatter, dbi_term, closest}]."""
+    n = metrics["n"] or 1
+    return [
+        {
+            "cluster": c,
+            "size": metrics["sizes"][c],
+            "share": metrics["sizes"][c] / n,
+            "sse": metrics["sse"][c],
+            "scatter": metrics["scatter"][c],
+            "dbi_term": metrics["dbi_terms"][c],
+            "closest": metrics["closest"][c],
+        }
+        for c in range(metrics["k"])
+    ]
+
+
+def model_metrics(state):
+    """
+    Metrik model aktif di `state` (X, last_labels, last_centroids), dihitung
+    sekali lalu di-memo di last_metrics sampai model / X berganti.
+    """
+    memo = state.get("last_metrics")
+    if memo is not None:
+        return memo
+    X, labels = state.get("X"), state.get("last_labels")
+    labels = np.asarray(labels, dtype=np.int64)
+    k = state.get("last_k") or int(labels.max() + 1)
+    C = state.get("last_centroids")
+    if C is not None and np.shape(C) != (k, X.shape[1]):
+        C = None                                  # centroid tidak sejalan dengan X → mean cluster
+    metrics = cluster_metrics(X, labels, C, k)
+    state["last_metrics"] = metrics
+    state["last_dbi"] = metrics["dbi"]
+    return metrics
@@ -0,0 +1,171 @@
+import io, os, hashlib, threading
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from config import EXPORT_CHUNK_ROWS, REPORT_DIR, REPORT_KEEP
+from services.distance_utils import assigned_sq_dist
+from services.pipeline_utils import used_rows
+
+# ==============================
+#  Export hasil clustering & file report
+# ==============================
+# CSV / Parquet per responden (id, cluster, jarak ke centroid, opsional fitur
+# asli) di-stream per chunk EXPORT_CHUNK_ROWS langsung ke response — tabel utuh
+# tidak pernah dibangun di memori. PDF dibangun ke file ber-key (hash isi
+# model) di REPORT_DIR: request lain dengan model yang sama memakai file itu
+# lagi, request bersamaan tidak saling menimpa (tulis ke tmp → os.replace).
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+_LOCK = threading.Lock()
+
+
+def export_snapshot(state, with_features=False):
+    """
+    Ambil semua yang dibutuhkan stream dari `state` sekarang (generator
+    response berjalan setelah konteks request / session selesai).
+    """
+    labels = np.asarray(state.get("last_labels"), dtype=np.int64)
+    n = len(labels)
+    X = state.get("X")
+    C = state.get("last_centroids")
+    if X is None or X.shape[0] != n or C is None or np.shape(C)[1] != X.shape[1]:
+        X = C = None                               # model dari registry tanpa matriks → jarak kosong
+    df_used = state.get("df_used")
+    if df_used is not None and len(df_used) != n:
+        df_used = None
+    mapping = state.get("mapping") or {}
+    id_col, df_raw = mapping.get("id"), state.get("df_raw")
+    ids = None
+    if id_col and df_raw is not None and df_used is not None and id_col in df_raw.columns:
+        # posisi baris yang dipertahankan preprocessing (missing="drop"), bukan index df_used
+        ids = used_rows(df_raw[id_col], state.get("row_pos")).reset_index(drop=True)
+        if len(ids) != n:
+            ids = None
+    return {
+        "n": n,
+        "labels": labels,
+        "X": X,
+        "centroids": np.asarray(C, dtype=float) if C is not None else None,
+        "id_name": id_col if ids is not None else "row",
+        "ids": ids,
+        "features": df_used if with_features else None,
+    }
+
+
+def _frames(snap, chunk_rows):
+    n, labels, X, C = snap["n"], snap["labels"], snap["X"], snap["centroids"]
+    c_sq = np.einsum("ij,ij->i", C, C) if C is not None else None
+    for start in range(0, n, chunk_rows):
+        stop = min(n, start + chunk_rows)
+        cb = labels[start:stop]
+        ids = snap["ids"]
+        cols = {
+            snap["id_name"]: ids.iloc[start:stop].to_numpy() if ids is not None else np.arange(start, stop),
+            "cluster": cb,
+        }
+        if X is not None:
+            Xb = X[start:stop]
+            d2, _ = assigned_sq_dist(Xb if sp.issparse(Xb) else np.asarray(Xb, dtype=float), C, cb, c_sq)
+            cols["distance"] = np.sqrt(d2)
+        else:
+            cols["distance"] = np.full(stop - start, np.nan)
+        df = pd.DataFrame(cols)
+        if snap["features"] is not None:
+            feats = snap["features"].iloc[start:stop].reset_index(drop=True)
+            df = pd.concat([df, feats.drop(columns=[c for c in feats.columns if c in cols])], axis=1)
+        yield df
+
+
+def iter_csv(snap, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Generator bytes CSV (header sekali, lalu satu potong per chunk)."""
+    first = True
+    for df in _frames(snap, chunk_rows):
+        yield df.to_csv(index=False, header=first, float_format="%.6g").encode("utf-8")
+        first = False
+    if first:                                       # tanpa baris → header saja
+        yield f"{snap['id_name']},cluster,distance\n".encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Sink tulis untuk ParquetWriter; byte yang sudah ditulis diambil lewat drain()."""
+
+    def __init__(self):
+        self._parts, self._pos = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def iter_parquet(snap, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Generator bytes Parquet: satu row group per chunk, footer di akhir."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink, writer = _Drain(), None
+    for df in _frames(snap, chunk_rows):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="snappy")
+        elif table.schema != writer.schema:
+            table = table.cast(writer.schema)      # mis. kolom kosong semua di chunk ini (tipe null)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is None:
+        empty = pd.DataFrame({snap["id_name"]: [], "cluster": np.empty(0, np.int64), "distance": []})
+        writer = pq.ParquetWriter(sink, pa.Table.from_pandas(empty, preserve_index=False).schema)
+    writer.close()
+    yield sink.drain()
+
+
+# ------------------------------
+#  File report (PDF) ber-key
+# ------------------------------
+def report_key(*parts):
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+
+def cached_report(key, build, ext="pdf"):
+    """
+    Path report untuk `key`; dibangun sekali lewat build(path_tmp) kalau belum
+    ada. File yang sudah ada dipakai ulang (mtime disentuh untuk urutan prune).
+    """
+    path = os.path.join(REPORT_DIR, f"{key}.{ext}")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        build(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _prune()
+    return path
+
+
+def _prune():
+    """Simpan maksimal REPORT_KEEP file report, buang yang paling lama dipakai."""
+    with _LOCK:
+        files = [f for f in os.listdir(REPORT_DIR) if not f.endswith(".tmp")]
+        if len(files) <= REPORT_KEEP:
+            return
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(REPORT_DIR, f)))
+        for name in files[:len(files) - REPORT_KEEP]:
+            try:
+                os.remove(os.path.join(REPORT_DIR, name))
+            except OSError:
+                pass
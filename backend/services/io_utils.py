@@ -1,20 +1,185 @@
-import os, time, pandas as pd
-from config import UPLOAD_DIR
+import os, csv, codecs, hashlib, time, numpy as np, pandas as pd
+from config import UPLOAD_DIR, INGEST_CHUNK_ROWS, SNIFF_BYTES
+from services.profile_utils import traced
 
-def read_csv_or_xlsx(path: str) -> pd.DataFrame:
-    if path.lower().endswith(".csv"):
-        try:
-            return pd.read_csv(path)
-        except:
-            return pd.read_csv(path, sep=";")
-    return pd.read_excel(path)
+# ==============================
+#  Ingestion CSV/XLSX
+# ==============================
+# - delimiter & encoding ditebak dari beberapa KB pertama (tanpa parse ulang)
+# - CSV dibaca per chunk dalam satu pass, hanya kolom yang dipakai (kolom teks
+#   dengan dtype object eksplisit); chunk dipecah per kolom lalu digabung kolom
+#   demi kolom (puncak memori ≈ frame akhir + satu kolom, bukan dua kali frame)
+# - XLSX dibaca streaming lewat openpyxl read-only
+
+_DELIMS = ",;\t|"
+
+
+def sniff_csv(path: str, nbytes: int = SNIFF_BYTES) -> dict:
+    """Tebak encoding & delimiter dari `nbytes` pertama file."""
+    with open(path, "rb") as fh:
+        head = fh.read(nbytes)
+    return sniff_bytes(head, nbytes)
+
+
+def sniff_bytes(head: bytes, nbytes: int = SNIFF_BYTES) -> dict:
+    """Sama dengan sniff_csv, dari potongan awal yang sudah dibaca (mis. body request)."""
+    if head.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        encoding = "cp1252"
+        for enc in ("utf-8", "cp1252"):
+            try:
+                # final=False → karakter multi-byte yang terpotong di ujung sampel tidak dianggap error
+                codecs.getincrementaldecoder(enc)().decode(head, final=len(head) < nbytes)
+                encoding = enc
+                break
+            except UnicodeDecodeError:
+                continue
+    text = head.decode(encoding, errors="ignore")
+
+    lines = text.splitlines()
+    sample = "\n".join(lines[:-1] if len(lines) > 1 and len(head) == nbytes else lines)
+    try:
+        sep = csv.Sniffer().sniff(sample, delimiters=_DELIMS).delimiter
+    except csv.Error:
+        first = lines[0] if lines else ""
+        sep = max(_DELIMS, key=first.count) if first else ","
+    return {"encoding": encoding, "sep": sep}
+
+
+def _csv_columns(path, opts, usecols, n_rows=1000):
+    """
+    Sampel awal → (nama kolom urut file, kolom teks). Kolom teks dibaca dengan
+    dtype object eksplisit; kolom angka dibiarkan di-infer pandas per chunk
+    (int / float, missing value → float) lalu disatukan di _concat_columns.
+    """
+    wanted = set(usecols) if usecols is not None else None
+    sample = pd.read_csv(path, nrows=n_rows, usecols=(lambda c: c in wanted) if wanted is not None else None,
+                         **opts)
+    columns = sample.columns.tolist()
+    text = [c for c in columns
+            if not (pd.api.types.is_integer_dtype(sample[c]) or pd.api.types.is_float_dtype(sample[c]))]
+    return columns, text
+
+
+def _as_text(arr):
+    """Potongan kolom angka → object berisi teks (kolom yang ternyata campur teks)."""
+    out = np.empty(len(arr), dtype=object)
+    if arr.dtype.kind == "f":
+        nan = np.isnan(arr)
+        whole = ~nan & (arr == np.trunc(arr))
+        out[whole] = arr[whole].astype(np.int64).astype(str)
+        rest = ~nan & ~whole
+        out[rest] = arr[rest].astype(str)
+        out[nan] = np.nan
+    else:
+        out[:] = arr.astype(str)
+    return out
+
+
+def _concat_columns(chunks, text):
+    """
+    Gabungkan chunk per kolom dalam satu pass: tiap chunk langsung dipecah jadi
+    array per kolom (chunk-nya sendiri dilepas), lalu kolom disambung satu per
+    satu. Kolom angka yang di chunk belakang berisi teks dialihkan ke object
+    (potongan sebelumnya dijadikan teks) tanpa membaca ulang file; int + float
+    (missing value di chunk lain) → float, sama dengan inferensi pandas.
+    """
+    pieces, columns, text = {}, None, set(text)
+    for chunk in chunks:
+        if columns is None:
+            columns = chunk.columns.tolist()
+        for c in columns:
+            arr = chunk[c].to_numpy(copy=True)
+            if c not in text and arr.dtype.kind not in "iuf":
+                text.add(c)
+                pieces[c] = [_as_text(p) for p in pieces.get(c, [])]
+            if c in text and arr.dtype.kind != "O":
+                arr = _as_text(arr)
+            pieces.setdefault(c, []).append(arr)
+    if columns is None:
+        return None
+    out = {}
+    for c in columns:
+        parts = pieces.pop(c)
+        arr = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        del parts
+        out[c] = pd.Series(arr, dtype=arr.dtype, copy=False)   # object tetap object (tanpa infer str)
+    return pd.DataFrame(out, copy=False)
+
+
+def _read_csv_chunked(path, usecols=None, chunksize=INGEST_CHUNK_ROWS):
+    opts = sniff_csv(path)
+    columns, text = _csv_columns(path, opts, usecols)
+    reader = pd.read_csv(path, usecols=columns, dtype={c: "object" for c in text},
+                         chunksize=chunksize, **opts)
+    df = _concat_columns(reader, text)
+    if df is None:
+        return pd.DataFrame(columns=columns)
+    return df
+
+
+def _as_numeric_if_possible(values):
+    s = pd.Series(values, dtype=object)
+    try:
+        return pd.to_numeric(s)
+    except (ValueError, TypeError):
+        return s
+
+
+def _read_xlsx_stream(path, usecols=None):
+    """Baca sheet pertama XLSX baris demi baris (openpyxl read-only)."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        wanted = set(usecols) if usecols is not None else None
+        idx = [i for i, h in enumerate(header) if wanted is None or h in wanted]
+        cols = {header[i]: [] for i in idx}
+        names = [header[i] for i in idx]
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            for i, name in zip(idx, names):
+                cols[name].append(row[i] if i < len(row) else None)
+    finally:
+        wb.close()
+    return pd.DataFrame({name: _as_numeric_if_possible(vals) for name, vals in cols.items()})
+
+
+@traced("parse")
+def read_csv_or_xlsx(path: str, usecols=None) -> pd.DataFrame:
+    """
+    Baca CSV/XLSX. `usecols` (list nama kolom) membatasi kolom yang dimuat;
+    None → semua kolom.
+    """
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return _read_csv_chunked(path, usecols)
+    if lower.endswith(".xlsx") or lower.endswith(".xlsm"):
+        return _read_xlsx_stream(path, usecols)
+    return pd.read_excel(path, usecols=(lambda c: c in set(usecols)) if usecols else None)
 
 def save_upload(file, filename: str | None = None) -> str:
     """Simpan file upload dan return pathnya."""
+    return save_upload_hashed(file, filename)[0]
+
+@traced("save_upload")
+def save_upload_hashed(file, filename: str | None = None):
+    """Simpan file upload sambil menghitung sha256 isinya → (path, hexdigest)."""
     safe = filename or (file.filename if file else None)
     if not file or not safe:
         raise ValueError("File tidak ditemukan.")
     safe = os.path.basename(safe)
     path = os.path.join(UPLOAD_DIR, f"{int(time.time())}_{safe}")
-    file.save(path)
-    return path
\ No newline at end of file
+    h = hashlib.sha256()
+    with open(path, "wb") as out:
+        for block in iter(lambda: file.stream.read(1024 * 1024), b""):
+            h.update(block)
+            out.write(block)
+    return path, h.hexdigest()
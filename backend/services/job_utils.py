@@ -0,0 +1,215 @@
+import threading, time, uuid, json, contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import JOB_WORKERS, JOB_HISTORY_MAX
+from store.state import current_session, flush_session
+
+# ==============================
+#  Job subsystem (in-process)
+# ==============================
+# Endpoint modeling yang lama (Elbow, Silhouette curve, Train) dijalankan
+# sebagai job: bisa di-submit async, dipantau progresnya, dan dibatalkan di
+# antara iterasi k. Route sinkron memakai mesin yang sama secara inline.
+
+TASKS = {}                 # kind → fn(payload, job) -> dict
+JOBS = OrderedDict()       # job_id → job dict
+_LOCK = threading.Lock()
+_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+
+
+class TaskError(Exception):
+    """Error yang dikembalikan ke client apa adanya (message + status HTTP)."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def register_task(kind, fn=None):
+    """Daftarkan fungsi task; bisa dipakai sebagai decorator @register_task("elbow")."""
+    if fn is None:
+        return lambda f: register_task(kind, f)
+    TASKS[kind] = fn
+    return fn
+
+
+# ------------------------------
+#  Progress & cancel (dipanggil dari task)
+# ------------------------------
+def report_progress(job, done, total, message=None):
+    """Update progres job; sekaligus titik cek pembatalan."""
+    if job is None:
+        return
+    job["progress"] = {"done": int(done), "total": int(total), "message": message}
+    raise_if_cancelled(job)
+
+
+def raise_if_cancelled(job):
+    if job is not None and job["_cancel"].is_set():
+        raise JobCancelled()
+
+
+def report_partial(job, key, item):
+    """
+    Hasil parsial (mis. skor satu k sejauh ini) sebelum job selesai: versi
+    terbaru per key di job["partial"], tiap update juga masuk antrean event
+    untuk stream. Sekaligus titik cek pembatalan.
+    """
+    if job is None:
+        return
+    with job["_tick"]:
+        job["partial"] = {**(job["partial"] or {}), str(key): item}
+        job["_events"].append({"event": "partial", **item})
+        job["_tick"].notify_all()
+    raise_if_cancelled(job)
+
+
+def sweep_progress(job):
+    """Callback untuk sweep_kmeans: 'k=7 selesai (3/6)'."""
+    if job is None:
+        return None
+    def _cb(done, total, k=None):
+        msg = f"k={k} selesai ({done}/{total})" if k is not None else f"{done}/{total}"
+        report_progress(job, done, total, msg)
+    return _cb
+
+
+# ------------------------------
+#  Lifecycle
+# ------------------------------
+def _new_job(kind, payload):
+    if kind not in TASKS:
+        raise TaskError(f"Jenis job tidak dikenal: {kind}", 400)
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "session": current_session(),
+        "status": "queued",
+        "progress": {"done": 0, "total": 0, "message": None},
+        "result": None,
+        "partial": None,
+        "error": None,
+        "status_code": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "_payload": payload or {},
+        "_cancel": threading.Event(),
+        "_done": threading.Event(),
+        "_tick": threading.Condition(),
+        "_events": [],
+    }
+    with _LOCK:
+        JOBS[job["id"]] = job
+        # buang job lama yang sudah selesai
+        for jid in [j for j, v in JOBS.items() if v["_done"].is_set()]:
+            if len(JOBS) <= JOB_HISTORY_MAX:
+                break
+            JOBS.pop(jid, None)
+    return job
+
+
+def _run(job):
+    if job["_cancel"].is_set():
+        job.update(status="cancelled", status_code=409, finished_at=time.time())
+        job["_done"].set()
+        return job
+    job.update(status="running", started_at=time.time())
+    try:
+        job["result"] = TASKS[job["kind"]](job["_payload"], job)
+        job.update(status="done", status_code=200)
+    except JobCancelled:
+        job.update(status="cancelled", status_code=409, error="Job dibatalkan.")
+    except TaskError as e:
+        job.update(status="error", status_code=e.status, error=e.message)
+    except Exception as e:
+        job.update(status="error", status_code=500, error=str(e))
+    finally:
+        # job background selesai setelah request-nya → tulis state session-nya sendiri
+        flush_session(job["session"])
+        job["finished_at"] = time.time()
+        with job["_tick"]:
+            job["_done"].set()
+            job["_tick"].notify_all()
+    return job
+
+
+def submit_job(kind, payload=None):
+    """Jalankan job di executor background; return job dict (status 'queued')."""
+    job = _new_job(kind, payload)
+    # bawa session aktif (contextvar) ke thread executor
+    _EXECUTOR.submit(contextvars.copy_context().run, _run, job)
+    return job
+
+
+def run_job_inline(kind, payload=None):
+    """Jalankan job di thread pemanggil (dipakai route sinkron)."""
+    return _run(_new_job(kind, payload))
+
+
+def get_job(job_id):
+    """Job milik session aktif (job session lain dianggap tidak ada)."""
+    job = JOBS.get(job_id)
+    return job if job is not None and job["session"] == current_session() else None
+
+
+def list_jobs():
+    return [j for j in list(JOBS.values()) if j["session"] == current_session()]
+
+
+def cancel_job(job_id):
+    job = get_job(job_id)
+    if job is not None and not job["_done"].is_set():
+        job["_cancel"].set()
+    return job
+
+
+def job_public(job):
+    """Representasi job untuk JSON (tanpa field internal & result)."""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "partial": list(job["partial"].values()) if job["partial"] else None,
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+def iter_events(job):
+    """
+    Generator NDJSON (bytes) untuk job yang sedang berjalan: satu baris per
+    hasil parsial, lalu baris terakhir {"event": "result" | "error", ...}.
+    Client yang memutus koneksi di tengah jalan membatalkan job-nya.
+    """
+    sent = 0
+    try:
+        while True:
+            with job["_tick"]:
+                job["_tick"].wait_for(lambda: len(job["_events"]) > sent or job["_done"].is_set())
+                new, done = job["_events"][sent:], job["_done"].is_set()
+            sent += len(new)
+            for item in new:
+                yield (json.dumps(item) + "\n").encode("utf-8")
+            if done:
+                break
+        body, status = job_response(job)
+        event = {"event": "result", **body} if status == 200 else {"event": "error", "status": status, **body}
+        yield (json.dumps(event) + "\n").encode("utf-8")
+    finally:
+        if not job["_done"].is_set():
+            job["_cancel"].set()
+
+
+def job_response(job):
+    """(body, status) hasil akhir job, format sama dengan route sinkron."""
+    if job["status"] == "done":
+        return job["result"], 200
+    return {"error": job["error"] or "Job dibatalkan."}, job["status_code"] or 500
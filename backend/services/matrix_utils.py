@@ -0,0 +1,196 @@
+import os, json, threading
+import numpy as np
+import scipy.sparse as sp
+from config import MATRIX_DIR, MATRIX_DTYPE, MATRIX_MAX_BYTES
+from services.profile_utils import traced
+
+# ==============================
+#  Matriks fitur memory-mapped
+# ==============================
+# X hasil preprocessing ditulis sekali ke MATRIX_DIR/<key>.cwm lalu dibuka
+# sebagai np.memmap read-only. Route, session store dan worker sweep
+# membuka file yang sama (zero-copy, berbagi page cache OS) alih-alih
+# masing-masing memegang / mem-pickle salinan float64 sendiri.
+#
+# Format file:
+#   b"CWMX" | uint32 panjang header | header JSON (shape, dtype, feature_names)
+#   padding sampai kelipatan 64 byte | data C-order
+# Matriks CSR (encoding "sparse"): header.format = "csr" dan data berisi tiga
+# section (data, indices, indptr) masing-masing rata 64 byte.
+
+MAGIC = b"CWMX"
+_ALIGN = 64
+DTYPES = ("float64", "float32")
+_LOCK = threading.Lock()
+
+
+def resolve_dtype(dtype=None) -> str:
+    """dtype None → config.MATRIX_DTYPE; hanya float64 / float32."""
+    dtype = str(np.dtype(dtype or MATRIX_DTYPE))
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype matriks tidak didukung: {dtype} (pilih {', '.join(DTYPES)})")
+    return dtype
+
+
+def matrix_path(key, dtype=None):
+    return os.path.join(MATRIX_DIR, f"{key}.{resolve_dtype(dtype)}.cwm")
+
+
+def _align(n):
+    return -(-n // _ALIGN) * _ALIGN
+
+
+def _read_header(fh):
+    if fh.read(4) != MAGIC:
+        raise ValueError("Bukan file matriks fitur.")
+    n = int(np.frombuffer(fh.read(4), dtype="<u4")[0])
+    header = json.loads(fh.read(n).decode("utf-8"))
+    header["offset"] = _align(8 + n)
+    return header
+
+
+def _write_csr(fh, X, dtype, feature_names):
+    X = X.tocsr()
+    X.sum_duplicates()
+    X.sort_indices()
+    arrays = {
+        "data": np.ascontiguousarray(X.data, dtype=dtype),
+        "indices": np.ascontiguousarray(X.indices),
+        "indptr": np.ascontiguousarray(X.indptr),
+    }
+    meta = {"format": "csr", "shape": [int(s) for s in X.shape], "dtype": dtype,
+            "feature_names": list(feature_names or []), "nnz": int(X.nnz), "sections": {}}
+    # offset section relatif terhadap awal data; dihitung dulu supaya header bisa ditulis sekali
+    pos = 0
+    for name, arr in arrays.items():
+        meta["sections"][name] = {"offset": pos, "dtype": arr.dtype.str, "length": int(arr.size)}
+        pos = _align(pos + arr.nbytes)
+    header = json.dumps(meta).encode("utf-8")
+    offset = _align(8 + len(header))
+    fh.write(MAGIC)
+    fh.write(np.uint32(len(header)).astype("<u4").tobytes())
+    fh.write(header)
+    fh.write(b"\0" * (offset - 8 - len(header)))
+    written = 0
+    for name, arr in arrays.items():
+        fh.write(b"\0" * (meta["sections"][name]["offset"] - written))
+        fh.write(arr.tobytes())
+        written = meta["sections"][name]["offset"] + arr.nbytes
+
+
+def _open_csr(path, header):
+    parts = {}
+    for name, sec in header["sections"].items():
+        if sec["length"] == 0:
+            parts[name] = np.empty(0, dtype=sec["dtype"])
+        else:
+            parts[name] = np.memmap(path, dtype=np.dtype(sec["dtype"]), mode="r",
+                                    offset=header["offset"] + sec["offset"],
+                                    shape=(sec["length"],))
+    X = sp.csr_matrix((parts["data"], parts["indices"], parts["indptr"]),
+                      shape=tuple(header["shape"]), copy=False)
+    # sudah kanonik saat ditulis → cegah scipy mengurutkan ulang in-place (file read-only)
+    X.has_sorted_indices = True
+    X.has_canonical_format = True
+    X._cw_path = path
+    return X
+
+
+@traced("write_matrix")
+def write_matrix(X, feature_names, key, dtype=None):
+    """
+    Tulis X ke file matriks (kalau file untuk `key` + dtype belum ada) dan
+    return memmap read-only-nya (X sparse → CSR di atas memmap). `key` harus
+    unik untuk isi X (mis. key DAG preprocessing) sehingga file yang sama
+    dipakai ulang lintas request/session.
+    """
+    dtype = resolve_dtype(dtype)
+    path = matrix_path(key, dtype)
+    with _LOCK:
+        if not os.path.exists(path) and sp.issparse(X):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as fh:
+                _write_csr(fh, X, dtype, feature_names)
+            os.replace(tmp, path)
+            _prune(keep=path)
+        elif not os.path.exists(path):
+            X = np.asarray(X)
+            header = json.dumps({
+                "shape": [int(s) for s in X.shape],
+                "dtype": dtype,
+                "feature_names": list(feature_names or []),
+            }).encode("utf-8")
+            offset = _align(8 + len(header))
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(MAGIC)
+                fh.write(np.uint32(len(header)).astype("<u4").tobytes())
+                fh.write(header)
+                fh.write(b"\0" * (offset - 8 - len(header)))
+                # tulis per blok baris → tanpa salinan penuh saat konversi dtype
+                step = max(1, (64 * 1024 ** 2) // max(1, X.shape[1] * 8))
+                for r0 in range(0, X.shape[0], step):
+                    fh.write(np.ascontiguousarray(X[r0:r0 + step], dtype=dtype).tobytes())
+            os.replace(tmp, path)
+            _prune(keep=path)
+    return open_matrix(path)[0]
+
+
+def open_matrix(path):
+    """Buka file matriks → (memmap read-only, header dict)."""
+    with open(path, "rb") as fh:
+        header = _read_header(fh)
+    shape = tuple(header["shape"])
+    os.utime(path)   # waktu akses untuk eviksi LRU
+    if header.get("format") == "csr":
+        return _open_csr(path, header), header
+    if 0 in shape:
+        X = np.empty(shape, dtype=header["dtype"])
+    else:
+        X = np.memmap(path, dtype=header["dtype"], mode="r", offset=header["offset"], shape=shape)
+    return X, header
+
+
+def matrix_ref(X):
+    """
+    Referensi ringan (path, offset, shape, dtype) bila X adalah memmap utuh
+    dari sebuah file; selain itu None. Dipakai untuk mengirim X ke proses lain
+    tanpa pickling isi array. CSR hasil open_matrix → referensi ke file-nya.
+    """
+    if sp.issparse(X):
+        path = getattr(X, "_cw_path", None)
+        return {"path": path, "format": "csr"} if path else None
+    if not isinstance(X, np.memmap) or not getattr(X, "filename", None):
+        return None
+    if not X.flags.c_contiguous or X.base is None or isinstance(X.base, np.ndarray):
+        return None   # slice/view dari memmap → offset tidak lagi sesuai atribut
+    return {"path": X.filename, "offset": int(X.offset), "shape": list(X.shape),
+            "dtype": X.dtype.str}
+
+
+def open_ref(ref):
+    if ref.get("format") == "csr":
+        return open_matrix(ref["path"])[0]
+    return np.memmap(ref["path"], dtype=np.dtype(ref["dtype"]), mode="r",
+                     offset=ref["offset"], shape=tuple(ref["shape"]))
+
+
+def _prune(keep):
+    """Hapus file matriks LRU sampai total ukuran <= MATRIX_MAX_BYTES."""
+    files = []
+    for name in os.listdir(MATRIX_DIR):
+        if name.endswith(".cwm"):
+            p = os.path.join(MATRIX_DIR, name)
+            st = os.stat(p)
+            files.append((st.st_mtime, st.st_size, p))
+    total = sum(f[1] for f in files)
+    for _t, size, p in sorted(files):
+        if total <= MATRIX_MAX_BYTES:
+            break
+        if p == keep:
+            continue
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            pass   # masih di-mmap (Windows) → coba lagi lain kali
@@ -1,26 +1,21 @@
-import io, base64
 import numpy as np
-from sklearn.cluster import KMeans
-try:
-    from kneed import KneeLocator
-except Exception:
-    KneeLocator = None
 
-from sklearn.metrics import davies_bouldin_score, silhouette_score
-import matplotlib.pyplot as plt
+from sklearn.cluster import KMeans
+from config import INERTIA_CHECK_SAMPLE, ELBOW_ADAPTIVE_TOL
+from services.sweep_utils import sweep_kmeans, fit_kmeans_cached, resolve_workers
+from services.silhouette_utils import silhouette_estimate
+from services.profile_utils import traced
+from services.eval_utils import cluster_metrics
+from services.distance_utils import nearest_centroid
 
 # ==============================
 #  Core utilities
 # ==============================
 
-def elbow_wcss(X, k_values):
+def elbow_wcss(X, k_values, n_jobs=None):
     """Hitung WCSS untuk setiap k pada k_values."""
-    wcss = []
-    for k in k_values:
-        km = KMeans(n_clusters=k, n_init=10, random_state=42)
-        km.fit(X)
-        wcss.append(float(km.inertia_))
-    return wcss
+    fits = sweep_kmeans(X, k_values, n_init=10, random_state=42, n_jobs=n_jobs)
+    return [fits[int(k)]["inertia"] for k in k_values]
 
 def _knee_point_by_distance(k_values, wcss):
     """
@@ -44,24 +39,22 @@ def _knee_point_by_distance(k_values, wcss):
     idx = int(np.argmax(dists))
     return int(x[idx])
 
-def compute_elbow(
-    X, k_min=2, k_max=10, *,
-    init="k-means++", n_init=10, max_iter=300, random_state=42,
-    prefer_smaller_when_close=True
-):
-    # 1) Hitung WCSS
-    ks = list(range(int(k_min), int(k_max) + 1))
-    wcss = []
-    for k in ks:
-        km = KMeans(n_clusters=k, init=init, n_init=n_init,
-                    max_iter=max_iter, random_state=random_state)
-        km.fit(X)
-        wcss.append(float(km.inertia_))
+def _knee_candidates(ks, wcss, prefer_smaller_when_close=True):
+    """
+    Kandidat titik siku dari kurva (ks, wcss) → (k_suggest, {kandidat}).
+    ks boleh berjarak tidak seragam (grid kasar pencarian adaptif).
+    """
+    ks = [int(k) for k in ks]
     wcss = np.asarray(wcss, dtype=float)
 
     # ---------- kandidat 1: KneeLocator ----------
+    # kneed di-import lazy: modul ini ikut menarik matplotlib.pyplot (±0.7 dtk start-up)
     k_kneedle = None
-    if KneeLocator is not None:
+    try:
+        from kneed import KneeLocator
+    except Exception:
+        KneeLocator = None
+    if KneeLocator is not None and len(ks) >= 3:
         try:
             kl = KneeLocator(ks, wcss, curve="convex", direction="decreasing")
             if isinstance(kl.knee, (int, np.integer)):
@@ -87,9 +80,12 @@ def compute_elbow(
         k_line = ks[int(np.argmax(dists))]
 
     # ---------- kandidat 3: kelengkungan (second derivative) ----------
-    # ambil argmax(|Δ² wcss|) pada titik tengah
+    # ambil argmax(|Δ² wcss|) pada titik tengah; grid tidak seragam → selisih
+    # kemiringan dibagi setengah lebar jendela (grid langkah 1 = Δ² biasa)
     if len(ks) >= 3:
-        d2 = np.diff(np.diff(wcss))
+        x = np.asarray(ks, dtype=float)
+        slope = np.diff(wcss) / np.diff(x)
+        d2 = np.diff(slope) / ((x[2:] - x[:-2]) / 2.0)
         ks_mid = ks[1:-1]
         k_curv = int(ks_mid[int(np.argmax(np.abs(d2)))])
     else:
@@ -113,62 +109,203 @@ def compute_elbow(
         # jika belum ada keputusan: utamakan kelengkungan → line → kneedle
         k_suggest = picked or (k_curv or k_line or k_kneedle)
 
-    # ---------- siapkan plot ----------
-    fig, ax = plt.subplots(figsize=(6,4), dpi=140)
-    ax.plot(ks, wcss, marker="o")
-    ax.set_title("Elbow Method (WCSS)")
-    ax.set_xlabel("Number of clusters (k)")
-    ax.set_ylabel("WCSS")
+    found = {"kneedle": k_kneedle, "line": int(k_line), "curvature": k_curv}
+    return (int(k_suggest) if k_suggest is not None else None), found
 
-    # hasil final (merah)
-    if isinstance(k_suggest, int):
-        ax.axvline(k_suggest, ls="--", color="r", label=f"k={k_suggest}")
-    ax.legend()
-
-    buf = io.BytesIO(); fig.tight_layout(); fig.savefig(buf, format="png"); plt.close(fig)
-    img_b64 = base64.b64encode(buf.getvalue()).decode("ascii")
 
+def _elbow_result(ks, wcss, k_suggest):
     # WCSS pada k terpilih
     try:
-        k_idx = ks.index(int(k_suggest))
-        wcss_at_k = float(wcss[k_idx])
+        wcss_at_k = float(wcss[ks.index(int(k_suggest))])
     except Exception:
         wcss_at_k = None
-
     return {
         "ks": ks,
-        "wcss": wcss.tolist(),
+        "wcss": [float(w) for w in wcss],
         "k_suggest": int(k_suggest) if isinstance(k_suggest, int) else None,
         "wcss_at_k": wcss_at_k,
-        "image_base64": img_b64,
     }
 
 
-def train_kmeans(X, k=3, init="k-means++", n_init=10, max_iter=300, random_state=42):
+def compute_elbow(
+    X, k_min=2, k_max=10, *,
+    init="k-means++", n_init=10, max_iter=300, random_state=42,
+    prefer_smaller_when_close=True, n_jobs=None, split_restarts=False,
+    on_progress=None, engine="kmeans", batch_size=None
+):
+    # 1) Hitung WCSS (paralel bila n_jobs > 1)
+    ks = list(range(int(k_min), int(k_max) + 1))
+    fits = sweep_kmeans(X, ks, init=init, n_init=n_init,
+                        max_iter=max_iter, random_state=random_state,
+                        n_jobs=n_jobs, split_restarts=split_restarts,
+                        on_progress=on_progress, engine=engine, batch_size=batch_size)
+    wcss = [fits[k]["inertia"] for k in ks]
+
+    # 2) Kandidat knee → k_suggest
+    k_suggest, _ = _knee_candidates(ks, wcss, prefer_smaller_when_close)
+    return _elbow_result(ks, wcss, k_suggest)
+
+
+# ==============================
+#  Elbow adaptif (berhenti lebih awal)
+# ==============================
+# Tidak semua k di [k_min, k_max] di-fit: mulai dari grid kasar (ujung + ±4
+# titik), lalu k yang paling menambah informasi di-fit per ronde:
+#   1) tetangga ±1 kandidat knee yang belum di-fit (resolusi di sekitar siku),
+#   2) kalau sudah, titik tengah celah grid dengan penurunan WCSS terbesar
+#      (bagian kurva yang bentuknya paling belum pasti).
+# Berhenti bila ketiga kandidat (kneedle, jarak-ke-garis, kelengkungan) ada
+# & sepakat (selisih ≤1, tetangga k_suggest sudah di-fit) DAN penurunan WCSS
+# setelah k_suggest ≤ ELBOW_ADAPTIVE_TOL × total penurunan di rentang k.
+# Kalau tidak pernah terpenuhi, hasil akhirnya sama dengan sweep penuh.
+
+def _coarse_grid(k_min, k_max, points=5):
+    step = max(1, int(np.ceil((k_max - k_min) / (points - 1))))
+    return sorted(set(range(k_min, k_max + 1, step)) | {k_max})
+
+
+def _next_ks(ks_all, fitted, found, k_suggest, batch):
+    """k berikutnya yang di-fit (urut perkiraan informasi terbesar)."""
+    lo, hi = ks_all[0], ks_all[-1]
+    near = []
+    for c in [k_suggest, *found.values()]:
+        if c is None:
+            continue
+        for k in (c - 1, c + 1):
+            if lo <= k <= hi and k not in fitted and k not in near:
+                near.append(k)
+    if near:
+        return near
+
+    ks = sorted(fitted)
+    gaps = [(fitted[a] - fitted[b], (a + b) // 2) for a, b in zip(ks, ks[1:]) if b - a > 1]
+    gaps.sort(key=lambda g: -g[0])
+    return [mid for _, mid in gaps[:max(1, batch)]]
+
+
+@traced("elbow_adaptive")
+def compute_elbow_adaptive(
+    X, k_min=2, k_max=10, *, tol=None,
+    init="k-means++", n_init=10, max_iter=300, random_state=42,
+    prefer_smaller_when_close=True, n_jobs=None, split_restarts=False,
+    on_progress=None, engine="kmeans", batch_size=None
+):
+    """
+    Seperti compute_elbow, tapi hanya k yang dibutuhkan untuk memastikan knee
+    yang di-fit. Return dict compute_elbow (ks/wcss = k yang di-fit saja) +
+    adaptive: {fits, fits_saved, k_range, rounds, candidates, converged}.
+    """
+    tol = ELBOW_ADAPTIVE_TOL if tol is None else float(tol)
+    k_min, k_max = int(k_min), int(k_max)
+    ks_all = list(range(k_min, k_max + 1))
+    opts = dict(init=init, n_init=n_init, max_iter=max_iter, random_state=random_state,
+                n_jobs=n_jobs, split_restarts=split_restarts, engine=engine,
+                batch_size=batch_size)
+    batch = resolve_workers(n_jobs)
+    fitted = {}
+
+    def _fit(ks):
+        base = len(fitted)
+
+        def _cb(done, total, k=None):
+            if on_progress is not None:
+                on_progress(base + done, len(ks_all), k)
+
+        fits = sweep_kmeans(X, ks, on_progress=_cb, **opts)
+        fitted.update({k: float(fits[k]["inertia"]) for k in ks})
+
+    todo, rounds, converged = _coarse_grid(k_min, k_max), 0, False
+    while todo:
+        _fit(todo)
+        rounds += 1
+        ks = sorted(fitted)
+        wcss = [fitted[k] for k in ks]
+        k_suggest, found = _knee_candidates(ks, wcss, prefer_smaller_when_close)
+
+        if k_suggest is not None:
+            # kandidat yang tidak menemukan knee (kneedle None) = belum sepakat
+            picks = list(found.values())
+            agree = (None not in picks and max(picks) - min(picks) <= 1
+                     and all(k in fitted for k in (k_suggest - 1, k_suggest + 1) if k_min <= k <= k_max))
+            drop = (wcss[0] - wcss[-1]) or 1.0
+            flat = (k_suggest + 1 in fitted
+                    and (fitted[k_suggest] - fitted[k_suggest + 1]) / drop <= tol)
+            if agree and flat:
+                converged = True
+                break
+        todo = _next_ks(ks_all, fitted, found, k_suggest, batch)
+
+    out = _elbow_result(ks, wcss, k_suggest)
+    out["adaptive"] = {
+        "fits": len(fitted),
+        "fits_saved": len(ks_all) - len(fitted),
+        "k_range": [k_min, k_max],
+        "rounds": rounds,
+        "candidates": found,
+        "converged": converged,
+        "tol": tol,
+    }
+    return out
+
+
+def train_kmeans(X, k=3, init="k-means++", n_init=10, max_iter=300, random_state=42,
+                 n_jobs=None, split_restarts=False, engine="kmeans", batch_size=None):
     """
     Latih KMeans dengan k tertentu. Return labels, centroids, inertia, dan model.
+    Kalau k yang sama sudah di-fit oleh Elbow/Silhouette, hasilnya dipakai ulang.
+    engine: "kmeans" (full-batch) | "minibatch" | "online" (partial_fit per chunk).
     """
     k = int(k)
-    km = KMeans(
-        n_clusters=k, init=init, n_init=n_init, max_iter=max_iter, random_state=random_state
+    fit = fit_kmeans_cached(
+        X, k, init=init, n_init=n_init, max_iter=max_iter, random_state=random_state,
+        n_jobs=n_jobs, split_restarts=split_restarts, engine=engine, batch_size=batch_size
     )
-    km.fit(X)
-    labels = km.labels_.astype(int)
-    centroids = km.cluster_centers_.astype(float)
-    inertia = float(km.inertia_)
     return {
-        "labels": labels,
-        "centroids": centroids,
-        "inertia": inertia,
+        "labels": fit["labels"],
+        "centroids": fit["centroids"],
+        "inertia": fit["inertia"],
         "k": k,
-        "model": km,   # <— penting untuk Insights/Report
+        "model": fit["model"],   # <— penting untuk Insights/Report
     }
 
+def inertia_gap_vs_full_batch(X, centroids, *, sample_size=INERTIA_CHECK_SAMPLE,
+                              n_init=3, random_state=42):
+    """
+    Bandingkan centroid hasil engine minibatch/online dengan KMeans full-batch
+    pada sampel baris X. relative_diff = (inertia_engine - inertia_full) / inertia_full;
+    nilai positif berarti engine sedikit lebih buruk dari full-batch.
+    """
+    centroids = np.asarray(centroids, dtype=float)
+    k = centroids.shape[0]
+    n = X.shape[0]
+    rng = np.random.default_rng(random_state)
+    idx = np.sort(rng.choice(n, size=min(n, int(sample_size)), replace=False))
+    S = X[idx]
+    inertia_engine = float(nearest_centroid(S, centroids)[1].sum())
+    full = KMeans(n_clusters=k, n_init=n_init, random_state=random_state).fit(S)
+    inertia_full = float(full.inertia_)
+    return {
+        "sample_size": int(len(idx)),
+        "inertia_engine": inertia_engine,
+        "inertia_full_batch": inertia_full,
+        "relative_diff": (inertia_engine - inertia_full) / inertia_full if inertia_full else None,
+    }
+
+@traced("assign")
+def assign_clusters(X, centroids, block_rows=None, all_distances=True):
+    """
+    Cluster terdekat tiap baris X (dense / CSR) terhadap centroid (k × p) lewat
+    kernel distance_utils (tile ‖x‖² − 2x·c + ‖c‖² → argmin). Return (labels
+    int32, jarak ke centroid terpilih, matriks jarak n × k atau None).
+    """
+    labels, best, full = nearest_centroid(X, centroids, return_all=all_distances, rows=block_rows)
+    return labels, np.sqrt(best), (np.sqrt(full, out=full) if full is not None else None)
+
 def cluster_counts(labels):
     """Hitung jumlah member per cluster → list of dict[{cluster, count}]."""
-    labels = np.asarray(labels)
-    uniques, counts = np.unique(labels, return_counts=True)
-    return [{"cluster": int(c), "count": int(n)} for c, n in zip(uniques, counts)]
+    counts = np.bincount(np.asarray(labels, dtype=np.int64))
+    present = np.flatnonzero(counts)
+    return [{"cluster": c, "count": n} for c, n in zip(present.tolist(), counts[present].tolist())]
 
 def centroid_table(centroids, feature_names=None):
     """
@@ -179,60 +316,61 @@ def centroid_table(centroids, feature_names=None):
     k, p = centroids.shape
     if feature_names is None:
         feature_names = [f"f{i+1}" for i in range(p)]
-    rows = []
-    for j, fname in enumerate(feature_names):
-        row = {"feature": fname}
-        for ci in range(k):
-            row[f"c{ci}"] = float(centroids[ci, j])
-        rows.append(row)
-    return rows
-
-def compute_dbi(X, labels):
-    labels = np.asarray(labels)
-    return float(davies_bouldin_score(X, labels))
+    # kolumnar (transpose + tolist sekali) → row-dict hanya di tepi JSON
+    keys = ["feature"] + [f"c{ci}" for ci in range(k)]
+    return [dict(zip(keys, (fname, *vals)))
+            for fname, vals in zip(feature_names, centroids.astype(float).T.tolist())]
 
-import numpy as np
+def compute_dbi(X, labels, centroids=None):
+    """DBI saja; rincian per cluster + CH/SSE sekaligus → eval_utils.cluster_metrics."""
+    return cluster_metrics(X, labels, centroids)["dbi"]
 
-def compute_silhouette(X, labels):
-    labels = np.asarray(labels)
+def compute_silhouette(X, labels, mode="auto"):
+    """
+    Skor silhouette (float, NaN kalau tidak terdefinisi).
+    mode "auto" → exact untuk n kecil, estimasi sampel bertingkat untuk n besar;
+    pakai silhouette_estimate() kalau butuh interval kepercayaannya juga.
+    """
     if X is None or labels is None:      # guard
         return float("nan")
-    if len(X) != len(labels):            # guard
-        return float("nan")
-    # minimal 2 cluster dan tidak semua label sama
-    if len(np.unique(labels)) < 2:
-        return float("nan")
-    return float(silhouette_score(X, labels))
+    return float(silhouette_estimate(X, labels, mode)["score"])
 
 def compute_silhouette_curve(
     X, k_min=2, k_max=10, *,
-    init="k-means++", n_init=10, max_iter=300, random_state=42
+    init="k-means++", n_init=10, max_iter=300, random_state=42,
+    n_jobs=None, split_restarts=False, on_progress=None, mode="auto",
+    engine="kmeans", batch_size=None
 ):
     ks = list(range(int(k_min), int(k_max)+1))
-    scores = []
+    valid = [k for k in ks if 2 <= k < X.shape[0]]
+    # progres 2 fase: fit tiap k, lalu skor silhouette tiap k
+    total = 2 * len(valid)
+    fit_cb = None
+    if on_progress is not None:
+        fit_cb = lambda done, _t, k=None: on_progress(done, total, k)
+    fits = sweep_kmeans(X, valid, init=init, n_init=n_init,
+                        max_iter=max_iter, random_state=random_state,
+                        n_jobs=n_jobs, split_restarts=split_restarts,
+                        on_progress=fit_cb, engine=engine, batch_size=batch_size)
+    scores, cis = [], []
     for k in ks:
-        if k < 2 or k >= len(X):
-            scores.append(float("nan")); continue
-        km = KMeans(n_clusters=k, init=init, n_init=n_init,
-                    max_iter=max_iter, random_state=random_state)
-        labels = km.fit_predict(X)
+        if k not in fits:
+            scores.append(float("nan")); cis.append(None); continue
+        labels = fits[k]["labels"]
         try:
-            s = silhouette_score(X, labels)
+            est = silhouette_estimate(X, labels, mode)
+            s = est["score"]
+            ci = [est["ci_low"], est["ci_high"]] if np.isfinite(s) else None
         except Exception:
-            s = float("nan")
-        scores.append(float(s))
+            s, ci = float("nan"), None
+        scores.append(float(s)); cis.append(ci)
+        if on_progress is not None:
+            on_progress(len(valid) + valid.index(k) + 1, total, k)
 
     arr = np.array(scores, dtype=float)
 
-    # plot — TANPA garis/legend
-    fig, ax = plt.subplots(figsize=(6,4), dpi=140)
-    ax.plot(ks, arr, marker="o")
-    ax.set_title("Silhouette Score vs k")
-    ax.set_xlabel("Number of clusters (k)")
-    ax.set_ylabel("Silhouette score")
-    buf = io.BytesIO(); fig.tight_layout(); fig.savefig(buf, format="png"); plt.close(fig)
     return {
         "ks": ks,
         "scores": [None if not np.isfinite(v) else float(v) for v in arr],
-        "image_base64": base64.b64encode(buf.getvalue()).decode("ascii"),
+        "ci": cis,   # [low, high] per k (sama dengan skor bila exact)
     }
\ No newline at end of file
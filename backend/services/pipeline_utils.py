@@ -0,0 +1,272 @@
+import hashlib, json, threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from config import PREP_CACHE_MAX, PREP_CACHE_MAX_BYTES
+from services.prep_utils import apply_missing, encode_df, encode_sparse, make_scaler, _is_categorical
+from services.matrix_utils import write_matrix, resolve_dtype
+from services.profile_utils import span
+
+# ==============================
+#  Preprocessing DAG (memoized)
+# ==============================
+# select(kolom) → missing(strategi) → encode(mode) → scale(mode)
+# Output tiap stage disimpan dengan key = key stage sebelumnya + opsinya,
+# jadi mengganti opsi hilir (mis. scaling standard → minmax) memakai ulang
+# hasil stage hulu tanpa menghitung ulang imputasi/encoding.
+# Output akhir (X) ditulis ke file matriks memory-mapped (services/matrix_utils)
+# dengan key stage scale, jadi memo & STATE memegang memmap, bukan salinan dense.
+# Matriks hasil encode (dense) juga ditulis ke file dengan key stage encode:
+# memo hanya memegang referensi memmap-nya (ganti scaling tetap tanpa encode
+# ulang), dan scaling "none" memakai file itu langsung sebagai X akhir.
+# Memo dipakai bersama semua session → dibatasi jumlah entri (PREP_CACHE_MAX)
+# dan total byte di RAM (PREP_CACHE_MAX_BYTES; frame select/missing dihitung
+# memory_usage(deep=True), memmap tidak dihitung). Output yang sendirian
+# melebihi batas tidak di-memo.
+
+STAGES = ("select", "missing", "encode", "scale")
+_MEMO = OrderedDict()      # key stage → output stage
+_SIZES = {}                # key stage → byte RAM output stage
+_LOCK = threading.Lock()
+
+
+def _key(*parts):
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def _memo_get(key):
+    with _LOCK:
+        out = _MEMO.get(key)
+        if out is not None:
+            _MEMO.move_to_end(key)
+        return out
+
+
+def _nbytes(value):
+    """Byte RAM yang dipegang satu nilai output stage (memmap / file matriks = 0)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if sp.issparse(value):
+        return sum(_nbytes(getattr(value, a, None)) for a in ("data", "indices", "indptr"))
+    return 0
+
+
+def _memo_put(key, out):
+    size = sum(_nbytes(v) for v in out.values())
+    if size > PREP_CACHE_MAX_BYTES:
+        return
+    with _LOCK:
+        _MEMO[key] = out
+        _SIZES[key] = size
+        _MEMO.move_to_end(key)
+        total = sum(_SIZES.values())
+        while len(_MEMO) > PREP_CACHE_MAX or total > PREP_CACHE_MAX_BYTES:
+            old, _ = _MEMO.popitem(last=False)
+            total -= _SIZES.pop(old, 0)
+
+
+# ------------------------------
+#  Stage
+# ------------------------------
+def _stage_select(df_raw, cols):
+    return {"df": df_raw[cols]}
+
+
+def _stage_missing(df, how):
+    """
+    Imputasi + statistik imputasi (dipakai ulang saat scoring data baru).
+    "rows" = posisi baris df_raw yang dipertahankan (missing="drop" membuang
+    baris lalu reset index), None = semua baris.
+    """
+    num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    fill = {}
+    if how == "mean":
+        fill = df[num_cols].mean().to_dict()
+    elif how == "median":
+        fill = df[num_cols].median().to_dict()
+    rows = np.flatnonzero(df.notna().all(axis=1).to_numpy()) if how == "drop" else None
+    # apply_missing mengubah frame in-place → kerjakan di salinan agar output stage hulu utuh
+    out = apply_missing(df.copy(), how)
+    return {"df": out, "fill": {c: float(v) for c, v in fill.items()}, "rows": rows}
+
+
+def _stage_encode(df, mode, key):
+    if mode == "sparse":
+        X, feat_names, vocab = encode_sparse(df)
+        return {"X": X, "feature_names": feat_names, "vocab": vocab,
+                "source_columns": df.columns.tolist()}
+    df_enc, feat_names = encode_df(df, mode)
+    # vocabulary kategori (urutan = kode label / urutan kolom dummy get_dummies)
+    if mode == "label":
+        vocab = {
+            c: pd.Categorical(df[c]).categories.tolist()
+            for c in df.columns if df[c].dtype == "object"
+        }
+    else:
+        vocab = {c: pd.Categorical(df[c]).categories.tolist() for c in df.columns if _is_categorical(df[c])}
+    return {
+        "X": write_matrix(df_enc.to_numpy(dtype=float), feat_names, key, "float64"),
+        "feature_names": feat_names,
+        "vocab": vocab,
+        "source_columns": df.columns.tolist(),
+    }
+
+
+def _stage_scale(X, how, feature_names, key, dtype):
+    scaler = make_scaler(how, sparse=sp.issparse(X))
+    if scaler is not None:
+        X = scaler.fit_transform(X)
+    elif isinstance(X, np.memmap) and X.dtype == np.dtype(dtype):
+        return {"X": X, "scaler": None}     # matriks encode sudah berupa file dgn dtype ini
+    return {"X": write_matrix(X, feature_names, key, dtype), "scaler": scaler}
+
+
+def _run_stage(stage, df_raw, parent, opts, key):
+    if stage == "select":
+        return _stage_select(df_raw, opts["select"])
+    if stage == "missing":
+        return _stage_missing(parent["df"], opts["missing"])
+    if stage == "encode":
+        return _stage_encode(parent["df"], opts["encode"], key)
+    scaling, dtype = opts["scale"]
+    return _stage_scale(parent["X"], scaling, parent["feature_names"], key, dtype)
+
+
+def run_prep(df_raw, dataset_key, cols, prep):
+    """
+    Jalankan DAG preprocessing untuk `cols` dari `df_raw`.
+    `dataset_key` mengidentifikasi isi df_raw (hash dataset) supaya memo aman
+    dipakai lintas upload. Return dict berisi X, feature_names, df_used,
+    row_pos (posisi baris df_raw untuk tiap baris X; None = semua), scaler,
+    artifacts (kolom, statistik imputasi, vocabulary, scaler) dan `reused`
+    (daftar stage yang diambil dari memo).
+    """
+    missing = prep.get("missing", "none")
+    encoding = prep.get("encoding", "onehot")
+    scaling = prep.get("scaling", "none")
+    dtype = resolve_dtype(prep.get("dtype"))
+
+    opts = {"select": list(cols), "missing": missing, "encode": encoding, "scale": [scaling, dtype]}
+    reused, key, parent = [], dataset_key, None
+    outputs = {}
+    for stage in STAGES:
+        key = _key(key, stage, opts[stage])
+        out = _memo_get(key)
+        if out is not None:
+            reused.append(stage)
+        else:
+            with span(f"prep_{stage}"):
+                out = _run_stage(stage, df_raw, parent, opts, key)
+            _memo_put(key, out)
+        outputs[stage] = parent = out
+
+    enc, scl = outputs["encode"], outputs["scale"]
+    return {
+        "X": scl["X"],
+        "feature_names": enc["feature_names"],
+        "df_used": outputs["missing"]["df"],
+        "row_pos": outputs["missing"].get("rows"),
+        "scaler": scl["scaler"],
+        "artifacts": {
+            "columns": list(cols),
+            "prep": {"missing": missing, "encoding": encoding, "scaling": scaling, "dtype": dtype},
+            "numeric": outputs["missing"]["df"].select_dtypes(include=[np.number]).columns.tolist(),
+            "fill": outputs["missing"]["fill"],
+            "vocab": enc["vocab"],
+            "feature_names": enc["feature_names"],
+            "scaler": scl["scaler"],
+        },
+        "reused": reused,
+    }
+
+
+# ------------------------------
+#  Pipeline beku untuk data baru (scoring)
+# ------------------------------
+def apply_prep(df, artifacts):
+    """
+    Terapkan preprocessing hasil training (artifacts dari run_prep) ke baris
+    baru: kolom sama, statistik imputasi, vocabulary kategori & scaler yang
+    sudah di-fit — tanpa fit ulang apa pun. Kategori yang tidak dikenal →
+    tanpa dummy (sama dengan get_dummies). Return (X, valid) dengan `valid`
+    = mask baris yang bisa di-score (mis. NaN tanpa imputasi → False).
+    """
+    cols = artifacts["columns"]
+    absent = [c for c in cols if c not in df.columns]
+    if absent:
+        raise ValueError(f"Kolom tidak ada di data baru: {', '.join(map(str, absent))}")
+
+    prep = artifacts["prep"]
+    how, encoding = prep.get("missing", "none"), prep.get("encoding", "onehot")
+    names = artifacts["feature_names"]
+    index = {name: j for j, name in enumerate(names)}
+    vocab = artifacts.get("vocab") or {}
+    numeric = artifacts.get("numeric")
+    if numeric is None:     # artefak lama: kolom numerik = kolom yang jadi fitur apa adanya
+        numeric = [c for c in cols if c in index and c not in vocab]
+    numeric = set(numeric)
+    fill = artifacts.get("fill") or {}
+
+    n = len(df)
+    valid = np.ones(n, dtype=bool)
+    rows, cidx, vals = [], [], []   # triplet (baris, kolom fitur, nilai)
+    all_rows = np.arange(n)
+
+    for c in cols:
+        if c in numeric:
+            v = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            nan = np.isnan(v)
+            if how in ("mean", "median") and c in fill:
+                v = np.where(nan, fill[c], v)
+                nan = np.isnan(v)
+            valid &= ~nan
+            rows.append(all_rows); cidx.append(np.full(n, index[c])); vals.append(np.where(nan, 0.0, v))
+            continue
+
+        s = df[c]
+        if how in ("mean", "median"):
+            s = s.fillna("")
+        elif how == "drop":
+            valid &= s.notna().to_numpy()
+        cats = vocab.get(c)
+        if cats is None:        # artefak lama (onehot tanpa vocab) → dari nama fitur
+            cats = [name[len(str(c)) + 1:] for name in names if name.startswith(f"{c}_")]
+        codes = np.asarray(pd.Categorical(s, categories=cats).codes)
+        if encoding == "label":
+            rows.append(all_rows); cidx.append(np.full(n, index[c])); vals.append(codes.astype(float))
+            continue
+        hit = np.flatnonzero(codes >= 0)
+        pos = np.array([index[f"{c}_{v}"] for v in cats], dtype=np.int64)
+        rows.append(hit); cidx.append(pos[codes[hit]]); vals.append(np.ones(len(hit)))
+
+    r = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    j = np.concatenate(cidx) if cidx else np.empty(0, dtype=np.int64)
+    v = np.concatenate(vals) if vals else np.empty(0)
+    if encoding == "sparse":
+        X = sp.csr_matrix((v, (r, j)), shape=(n, len(names)))
+        X.eliminate_zeros()
+    else:
+        X = np.zeros((n, len(names)))
+        X[r, j] = v
+
+    scaler = artifacts.get("scaler")
+    if scaler is not None:
+        X = scaler.transform(X)
+    return X, valid
+
+
+def used_rows(df_raw, row_pos):
+    """Baris df_raw yang menjadi baris X (urutan sama), dari row_pos hasil run_prep."""
+    return df_raw if row_pos is None else df_raw.iloc[np.asarray(row_pos)]
+
+
+def clear_prep_cache():
+    with _LOCK:
+        _MEMO.clear()
+        _SIZES.clear()
@@ -0,0 +1,110 @@
+import io
+import numpy as np
+import pandas as pd
+from config import PREDICT_CHUNK_ROWS, SNIFF_BYTES
+from services.io_utils import sniff_bytes
+from services.pipeline_utils import apply_prep
+from services.model_utils import assign_clusters
+from services.profile_utils import traced
+
+# ==============================
+#  Scoring data baru terhadap model aktif
+# ==============================
+# Input (JSON baris / JSON kolumnar / CSV) dibaca per chunk PREDICT_CHUNK_ROWS,
+# tiap chunk lewat pipeline beku (apply_prep: imputasi, vocabulary, scaler
+# dari training) lalu di-assign ke centroid terdekat. Hasil kolumnar.
+
+
+def json_frames(body, chunk_rows=PREDICT_CHUNK_ROWS):
+    """
+    Body JSON → generator DataFrame per chunk. Bentuk yang diterima:
+      {"rows": [{kolom: nilai}, ...]}  /  [{kolom: nilai}, ...]
+      {"columns": [...], "data": [[...], ...]}   (kolumnar, lebih ringkas)
+    """
+    if isinstance(body, list):
+        body = {"rows": body}
+    if not isinstance(body, dict):
+        raise ValueError("Body JSON harus object/array.")
+    if "data" in body:
+        columns, data = body.get("columns"), body["data"]
+        if not isinstance(columns, list) or not isinstance(data, list):
+            raise ValueError('Format kolumnar butuh "columns" (list) & "data" (list baris).')
+        for start in range(0, len(data), chunk_rows):
+            yield pd.DataFrame(data[start:start + chunk_rows], columns=columns)
+        return
+    rows = body.get("rows")
+    if not isinstance(rows, list):
+        raise ValueError('Body JSON butuh "rows" (list object) atau "columns" + "data".')
+    for start in range(0, len(rows), chunk_rows):
+        yield pd.DataFrame.from_records(rows[start:start + chunk_rows])
+
+
+def csv_frames(stream, usecols, chunk_rows=PREDICT_CHUNK_ROWS):
+    """Stream CSV (file upload / body request) → generator DataFrame per chunk."""
+    head = stream.read(SNIFF_BYTES)
+    opts = sniff_bytes(head, SNIFF_BYTES)
+    wanted = {str(c) for c in usecols}
+    src = io.BufferedReader(_Prefixed(head, stream))
+    reader = pd.read_csv(src, chunksize=chunk_rows, usecols=lambda c: c in wanted, **opts)
+    yield from reader
+
+
+class _Prefixed(io.RawIOBase):
+    """File-like: `head` yang sudah dibaca untuk sniffing lalu sisa `stream`."""
+
+    def __init__(self, head, stream):
+        self._head = memoryview(head)
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        if self._head:
+            n = min(len(buf), len(self._head))
+            buf[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._stream.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+
+@traced("predict")
+def predict_frames(frames, artifacts, centroids, id_col=None, all_distances=False):
+    """
+    Score tiap chunk → dict kolumnar:
+      n, k, cluster (None = baris tidak valid), distance, id (bila kolom id ada),
+      distances (n × k, opsional), invalid (jumlah baris tidak ter-score).
+    """
+    C = np.asarray(centroids, dtype=float)
+    if C.shape[1] != len(artifacts["feature_names"]):
+        raise ValueError("Preprocessing berubah sejak model dilatih; latih ulang model.")
+    out = {"cluster": [], "distance": []}
+    ids, all_d, invalid = [], [], 0
+    for df in frames:
+        if not len(df):
+            continue
+        X, valid = apply_prep(df, artifacts)
+        labels, dist, dmat = assign_clusters(X, C, all_distances=all_distances)
+        invalid += int((~valid).sum())
+        # list python sekali per chunk; baris tidak valid → None
+        cl = labels.astype(object)
+        cl[~valid] = None
+        ds = dist.astype(object)
+        ds[~valid] = None
+        out["cluster"] += cl.tolist()
+        out["distance"] += ds.tolist()
+        if id_col is not None and id_col in df.columns:
+            ids += df[id_col].astype(object).where(df[id_col].notna(), None).tolist()
+        if all_distances:
+            rows = dmat.tolist()
+            for i in np.flatnonzero(~valid).tolist():
+                rows[i] = None
+            all_d += rows
+    res = {"n": len(out["cluster"]), "k": int(C.shape[0]), **out, "invalid": invalid}
+    if ids:
+        res["id"] = ids
+    if all_distances:
+        res["distances"] = all_d
+    return res
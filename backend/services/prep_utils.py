@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler, MinMaxScaler, MaxAbsScaler
 
 def apply_missing(df: pd.DataFrame, how: str) -> pd.DataFrame:
     if how == "none":
@@ -29,11 +30,54 @@ def encode_df(df: pd.DataFrame, mode: str):
     out = pd.get_dummies(df, drop_first=False, dtype=float)
     return out, out.columns.tolist()
 
-def scale_array(X, how: str):
-    if how == "none":
-        return X
+def _is_categorical(s: pd.Series) -> bool:
+    # kolom yang di-one-hot oleh pd.get_dummies
+    return (s.dtype == "object" or isinstance(s.dtype, pd.CategoricalDtype)
+            or pd.api.types.is_string_dtype(s.dtype))
+
+def encode_sparse(df: pd.DataFrame):
+    """
+    One-hot sebagai CSR (tanpa kolom dummy dense). Urutan & nama fitur sama
+    dengan pd.get_dummies: kolom numerik dulu, lalu <kolom>_<kategori>.
+    Return (X_csr, feature_names, vocab) dengan vocab = {kolom: [kategori...]}.
+    """
+    n = len(df)
+    cat_cols = [c for c in df.columns if _is_categorical(df[c])]
+    num_cols = [c for c in df.columns if c not in cat_cols]
+
+    blocks = [sp.csr_matrix(df[num_cols].to_numpy(dtype=float))] if num_cols else []
+    names, vocab = list(num_cols), {}
+    for c in cat_cols:
+        cat = pd.Categorical(df[c])
+        codes = np.asarray(cat.codes)
+        rows = np.flatnonzero(codes >= 0)      # NaN → baris tanpa dummy (sama dgn get_dummies)
+        cats = cat.categories.tolist()
+        blocks.append(sp.csr_matrix(
+            (np.ones(len(rows)), (rows, codes[rows])), shape=(n, len(cats))
+        ))
+        names += [f"{c}_{v}" for v in cats]
+        vocab[c] = cats
+    X = sp.hstack(blocks, format="csr") if blocks else sp.csr_matrix((n, 0))
+    X.sum_duplicates()
+    X.sort_indices()
+    return X, names, vocab
+
+def make_scaler(how: str, sparse: bool = False):
+    """
+    Scaler (belum di-fit) untuk mode scaling; None kalau tanpa scaling.
+    Input sparse tidak boleh di-center (merusak sparsity): standard → tanpa
+    mean, minmax → MaxAbsScaler (skala [-1, 1] tanpa geser).
+    """
     if how == "standard":
-        return StandardScaler().fit_transform(X)
+        return StandardScaler(with_mean=not sparse)
     if how == "minmax":
-        return MinMaxScaler().fit_transform(X)
-    return X
+        return MaxAbsScaler() if sparse else MinMaxScaler()
+    if how == "maxabs":
+        return MaxAbsScaler()
+    return None
+
+def scale_array(X, how: str):
+    scaler = make_scaler(how, sparse=sp.issparse(X))
+    if scaler is None:
+        return X
+    return scaler.fit_transform(X)
@@ -0,0 +1,318 @@
+import os, sys, time, uuid, zlib, threading, functools
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import PROFILE_DIR, PROFILE_ENABLED, PROFILE_INTERVAL_MS, PROFILE_KEEP
+
+# ==============================
+#  Profiling: span, histogram latency, sampling profiler
+# ==============================
+# - span("nama") / @traced("nama") mencatat durasi pemanggilan service selama
+#   request aktif; hasilnya dikirim di header Server-Timing.
+# - Latency tiap route (rule Flask + method) & tiap span per route masuk
+#   histogram bucket log → p50/p95/p99 di /api/metrics (per proses).
+# - Opt-in (header X-Profile: 1 atau ?_profile=1): stack thread request
+#   di-sampling tiap PROFILE_INTERVAL_MS → folded stacks (format flamegraph.pl /
+#   speedscope) + SVG flamegraph sederhana.
+
+_SPANS = ContextVar("profile_spans", default=None)
+
+# bucket histogram (ms): geometris ×1.25 dari 0.05 ms s/d ± 10 menit
+_BUCKETS = [0.05 * 1.25 ** i for i in range(74)]
+_HIST = {}              # route → {"total": hist, "spans": {nama: hist}}
+_LOCK = threading.Lock()
+_PRUNE_LOCK = threading.Lock()   # eviksi file profile (terpisah dari histogram)
+
+
+# ------------------------------
+#  Span
+# ------------------------------
+@contextmanager
+def span(name):
+    """Catat durasi blok sebagai span `name` (no-op di luar request yang diprofil)."""
+    spans = _SPANS.get()
+    if spans is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, (time.perf_counter() - t0) * 1000.0))
+
+
+def traced(name):
+    """Decorator: seluruh pemanggilan fungsi dicatat sebagai span `name`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _SPANS.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _merge_spans(spans):
+    """Gabungkan span bernama sama → {nama: (total ms, jumlah)} urut kemunculan pertama."""
+    out = {}
+    for name, ms in spans:
+        tot, cnt = out.get(name, (0.0, 0))
+        out[name] = (tot + ms, cnt + 1)
+    return out
+
+
+def server_timing_header(spans, total_ms):
+    parts = [f"{name.replace(' ', '_')};dur={tot:.2f};desc=\"x{cnt}\""
+             for name, (tot, cnt) in _merge_spans(spans).items()]
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+
+# ------------------------------
+#  Histogram
+# ------------------------------
+def _new_hist():
+    return {"counts": [0] * (len(_BUCKETS) + 1), "n": 0, "sum": 0.0, "max": 0.0}
+
+
+def _observe(hist, ms):
+    lo, hi = 0, len(_BUCKETS)
+    while lo < hi:                       # bucket pertama dengan batas atas >= ms
+        mid = (lo + hi) // 2
+        if _BUCKETS[mid] < ms:
+            lo = mid + 1
+        else:
+            hi = mid
+    hist["counts"][lo] += 1
+    hist["n"] += 1
+    hist["sum"] += ms
+    hist["max"] = max(hist["max"], ms)
+
+
+def _quantile(hist, q):
+    """Kuantil dari histogram (interpolasi linear dalam bucket)."""
+    if hist["n"] == 0:
+        return None
+    target = q * hist["n"]
+    seen = 0
+    for i, c in enumerate(hist["counts"]):
+        if c and seen + c >= target:
+            lo = _BUCKETS[i - 1] if i > 0 else 0.0
+            hi = _BUCKETS[i] if i < len(_BUCKETS) else hist["max"]
+            return min(hist["max"], lo + (hi - lo) * (target - seen) / c)
+        seen += c
+    return hist["max"]
+
+
+def _summary(hist):
+    return {
+        "count": hist["n"],
+        "mean_ms": round(hist["sum"] / hist["n"], 3) if hist["n"] else None,
+        "p50_ms": _round(_quantile(hist, 0.50)),
+        "p95_ms": _round(_quantile(hist, 0.95)),
+        "p99_ms": _round(_quantile(hist, 0.99)),
+        "max_ms": round(hist["max"], 3),
+    }
+
+
+def _round(v):
+    return None if v is None else round(v, 3)
+
+
+def record_request(route, total_ms, spans):
+    with _LOCK:
+        entry = _HIST.setdefault(route, {"total": _new_hist(), "spans": {}})
+        _observe(entry["total"], total_ms)
+        for name, (tot, _cnt) in _merge_spans(spans).items():
+            _observe(entry["spans"].setdefault(name, _new_hist()), tot)
+
+
+def metrics_snapshot():
+    with _LOCK:
+        return {
+            "pid": os.getpid(),
+            "routes": {
+                route: {**_summary(e["total"]),
+                        "spans": {n: _summary(h) for n, h in sorted(e["spans"].items())}}
+                for route, e in sorted(_HIST.items())
+            },
+        }
+
+
+def reset_metrics():
+    with _LOCK:
+        _HIST.clear()
+
+
+# ------------------------------
+#  Sampling profiler (opt-in per request)
+# ------------------------------
+class _Sampler:
+    """Ambil stack thread target tiap `interval` detik → Counter folded stack."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def start_sampler():
+    return _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000.0).start()
+
+
+def save_profile(stacks, route):
+    """Simpan folded stacks → profile_id (maksimal PROFILE_KEEP file, yang lama dibuang)."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    pid = uuid.uuid4().hex[:12]
+    with open(os.path.join(PROFILE_DIR, f"{pid}.folded"), "w", encoding="utf-8") as fh:
+        fh.write(f"# route: {route}\n")
+        for stack, n in stacks.most_common():
+            fh.write(f"{stack} {n}\n")
+    _prune()
+    return pid
+
+
+def _prune():
+    """Simpan maksimal PROFILE_KEEP file profile, buang yang paling lama."""
+    with _PRUNE_LOCK:
+        files = [f for f in os.listdir(PROFILE_DIR) if f.endswith(".folded")]
+        if len(files) <= PROFILE_KEEP:
+            return
+        def _mtime(name):
+            try:
+                return os.path.getmtime(os.path.join(PROFILE_DIR, name))
+            except OSError:
+                return 0.0
+        files.sort(key=_mtime)
+        for name in files[:len(files) - PROFILE_KEEP]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name))
+            except OSError:
+                pass
+
+
+def load_profile(profile_id):
+    """Folded stacks sebagai Counter; None kalau tidak ada."""
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+    if not os.path.exists(path):
+        return None
+    stacks = Counter()
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.startswith("#") or not line.strip():
+                continue
+            stack, _, n = line.rstrip("\n").rpartition(" ")
+            stacks[stack] += int(n)
+    return stacks
+
+
+def flamegraph_svg(stacks, width=1200, row=16):
+    """Render folded stacks jadi SVG flamegraph (akar di bawah, lebar ∝ jumlah sampel)."""
+    tree = {"n": 0, "kids": {}}
+    for stack, n in stacks.items():
+        node = tree
+        node["n"] += n
+        for name in stack.split(";"):
+            node = node["kids"].setdefault(name, {"n": 0, "kids": {}})
+            node["n"] += n
+    total = tree["n"] or 1
+
+    def depth(node):
+        return 1 + max((depth(k) for k in node["kids"].values()), default=0)
+    height = (depth(tree) + 1) * row
+    rects = []
+
+    def walk(node, x, level):
+        for name, kid in sorted(node["kids"].items()):
+            w = width * kid["n"] / total
+            if w >= 0.5:
+                y = height - (level + 1) * row
+                hue = 20 + zlib.crc32(name.encode()) % 40
+                label = name if w > 7 * len(name) * 0.6 else name[: max(0, int(w / 7) - 1)]
+                esc = lambda s: s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+                rects.append(
+                    f'<g><title>{esc(name)} ({kid["n"]} sampel, {100 * kid["n"] / total:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                    f'fill="hsl({hue},85%,60%)"/>'
+                    f'<text x="{x + 2:.1f}" y="{y + row - 4}" font-size="11">{esc(label)}</text></g>'
+                )
+                walk(kid, x, level + 1)
+            x += w
+
+    walk(tree, 0.0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace">{"".join(rects)}</svg>')
+
+
+# ------------------------------
+#  Hook Flask
+# ------------------------------
+def init_profiling(app):
+    """Pasang hook timing di app: span per request, Server-Timing, histogram, profiler opt-in."""
+    from flask import request, g
+    from flask.json.provider import DefaultJSONProvider
+
+    class _TimedJSON(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with span("json"):
+                return super().dumps(obj, **kwargs)
+
+    app.json = _TimedJSON(app)
+
+    @app.before_request
+    def _profile_start():
+        g.profile_token = _SPANS.set([])
+        g.profile_t0 = time.perf_counter()
+        wanted = request.headers.get("X-Profile") == "1" or request.args.get("_profile") == "1"
+        g.profile_sampler = start_sampler() if (PROFILE_ENABLED and wanted) else None
+
+    @app.after_request
+    def _profile_finish(resp):
+        spans = _SPANS.get()
+        if spans is None or "profile_t0" not in g:
+            return resp
+        total_ms = (time.perf_counter() - g.profile_t0) * 1000.0
+        route = f"{request.method} {request.url_rule.rule if request.url_rule else '<404>'}"
+        resp.headers["Server-Timing"] = server_timing_header(spans, total_ms)
+        record_request(route, total_ms, spans)
+        sampler = g.pop("profile_sampler", None)
+        if sampler is not None:
+            resp.headers["X-Profile-Id"] = save_profile(sampler.stop(), route)
+        resp.headers["Access-Control-Expose-Headers"] = "Server-Timing, X-Profile-Id"
+        return resp
+
+    @app.teardown_request
+    def _profile_teardown(exc=None):
+        sampler = g.pop("profile_sampler", None)
+        if sampler is not None:
+            sampler.stop()
+        token = g.pop("profile_token", None)
+        if token is not None:
+            _SPANS.reset(token)
@@ -0,0 +1,250 @@
+import os, json, time, shutil, pickle, threading
+import numpy as np
+from config import MODEL_DIR, MODEL_KEEP
+from services.matrix_utils import matrix_ref, open_ref
+from services.encode_utils import pack_labels
+
+# ==============================
+#  Model registry (disk, OUT_DIR/models)
+# ==============================
+# Tiap training disimpan sebagai versi baru m0001, m0002, ... :
+#   meta.json      → params, metrik, dataset, mapping/prep, nama fitur, referensi X
+#   centroids.npy  → k × p (ruang fitur ter-scale)
+#   labels.npy     → label per baris, dtype integer terkecil yang muat (uint8 utk k ≤ 255)
+#   transform.pkl  → artefak preprocessing beku (kolom, imputasi, vocabulary, scaler)
+#   profile.json   → profil cluster kolumnar (services/cluster_utils)
+#   rowkeys.npy    → kunci identitas baris (uint64) untuk retrain warm-start
+# Tidak ada versi "aktif" global: model aktif adalah STATE["model_id"] milik
+# session (ikut tersimpan bersama state session-nya). Versi lain dimuat ke
+# session hanya atas permintaan client (/api/models/<id>/activate), sekali
+# per proses lalu dari cache di memori.
+
+_LOCK = threading.Lock()
+_LOADED = {}               # model_id → nilai STATE hasil load (cache per proses)
+
+
+def _path(model_id, name=""):
+    if not (isinstance(model_id, str) and model_id.isalnum()):
+        raise ValueError(f"Model id tidak valid: {model_id!r}")
+    return os.path.join(MODEL_DIR, model_id, name)
+
+
+def _versions():
+    out = []
+    try:
+        names = os.listdir(MODEL_DIR)
+    except FileNotFoundError:          # folder registry dihapus (reset cache) → registry kosong
+        return out
+    for name in names:
+        if name.startswith("m") and name[1:].isdigit() and os.path.exists(os.path.join(MODEL_DIR, name, "meta.json")):
+            out.append(name)
+    return sorted(out, key=lambda m: int(m[1:]))
+
+
+def _write_json(path, obj):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(obj, fh, default=str)
+    os.replace(tmp, path)
+
+
+def register_model(*, centroids, labels, artifacts, params, metrics, X=None,
+                   dataset_name=None, dataset_hash=None, mapping=None,
+                   cluster_profile=None, row_keys=None, session=None):
+    """Simpan hasil training sebagai versi baru → meta (dict)."""
+    centroids = np.asarray(centroids, dtype=float)
+    k = int(centroids.shape[0])
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with _LOCK:
+        existing = _versions()
+        version = int(existing[-1][1:]) + 1 if existing else 1
+        while True:                       # mkdir eksklusif → aman antar worker
+            model_id = f"m{version:04d}"
+            try:
+                os.mkdir(_path(model_id))
+                break
+            except FileExistsError:
+                version += 1
+
+    np.save(_path(model_id, "centroids.npy"), centroids)
+    np.save(_path(model_id, "labels.npy"), pack_labels(labels, k))
+    with open(_path(model_id, "transform.pkl"), "wb") as fh:
+        pickle.dump(artifacts, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    if row_keys is not None:
+        np.save(_path(model_id, "rowkeys.npy"), np.asarray(row_keys, dtype=np.uint64))
+    meta = {
+        "id": model_id,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "session": session,
+        "dataset_name": dataset_name,
+        "dataset_hash": dataset_hash,
+        "mapping": mapping,
+        "params": params,
+        "metrics": metrics,
+        "k": k,
+        "n_samples": int(len(labels)),
+        "counts": np.bincount(np.asarray(labels, dtype=np.int64), minlength=k).tolist(),
+        "feature_names": (artifacts or {}).get("feature_names"),
+        "matrix": matrix_ref(X) if X is not None else None,   # X memmap (kalau file-nya masih ada)
+    }
+    _write_json(_path(model_id, "profile.json"), cluster_profile)
+    _write_json(_path(model_id, "meta.json"), meta)   # meta terakhir → versi dianggap lengkap
+    _prune(keep=model_id)
+    return meta
+
+
+def update_metrics(model_id, **metrics):
+    """Tambah metrik yang dihitung belakangan (mis. DBI) ke meta versi."""
+    if not model_id:
+        return
+    with _LOCK:
+        try:
+            with open(_path(model_id, "meta.json"), encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return
+        meta["metrics"] = {**(meta.get("metrics") or {}), **metrics}
+        _write_json(_path(model_id, "meta.json"), meta)
+        _LOADED.pop(model_id, None)
+
+
+def get_meta(model_id):
+    try:
+        with open(_path(model_id, "meta.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def load_row_keys(model_id):
+    """Kunci identitas baris versi `model_id` (None kalau tidak disimpan)."""
+    try:
+        return np.load(_path(model_id, "rowkeys.npy"))
+    except OSError:
+        return None
+
+
+def list_models(session=None, current=None):
+    """
+    Ringkasan versi (terbaru dulu) + penanda model aktif session (`current`).
+    session=None → semua versi; selain itu hanya versi hasil training session itu.
+    """
+    out = []
+    for model_id in reversed(_versions()):
+        meta = get_meta(model_id)
+        if meta is None or (session is not None and meta.get("session") != session):
+            continue
+        out.append({
+            key: meta.get(key)
+            for key in ("id", "version", "created_at", "dataset_name", "k", "n_samples", "params", "metrics")
+        } | {"active": model_id == current})
+    return out
+
+
+def load_model(model_id):
+    """
+    Nilai STATE untuk versi `model_id` (tanpa fit ulang): centroid, label,
+    artefak preprocessing, params & metrik; X ikut kalau file matriksnya masih ada.
+    """
+    with _LOCK:
+        cached = _LOADED.get(model_id)
+    if cached is not None:
+        return cached
+    meta = get_meta(model_id)
+    if meta is None:
+        raise KeyError(model_id)
+    centroids = np.load(_path(model_id, "centroids.npy"))
+    labels = np.load(_path(model_id, "labels.npy"))   # sudah ter-pack (uint8/uint16/...)
+    with open(_path(model_id, "transform.pkl"), "rb") as fh:
+        artifacts = pickle.load(fh)
+    scaler = (artifacts or {}).get("scaler")
+    try:
+        original = scaler.inverse_transform(centroids) if scaler is not None else centroids
+    except Exception:
+        original = centroids
+    try:
+        with open(_path(model_id, "profile.json"), encoding="utf-8") as fh:
+            profile = json.load(fh)
+    except (OSError, ValueError):
+        profile = None
+    X = None
+    ref = meta.get("matrix")
+    # file matriks bisa sudah dievict (MATRIX_MAX_BYTES) / dihapus → model tetap
+    # dimuat tanpa X (predict & export tanpa jarak tetap jalan)
+    if ref and os.path.exists(ref.get("path") or ""):
+        try:
+            X = open_ref(ref)
+        except (OSError, ValueError):
+            X = None
+        if X is not None and X.shape[0] != len(labels):
+            X = None
+    metrics = meta.get("metrics") or {}
+    values = {
+        "model_id": model_id,
+        "last_model": None,
+        "last_centroids": centroids,
+        "last_centroids_original": np.asarray(original, dtype=float),
+        "last_labels": labels,
+        "last_k": int(meta["k"]),
+        "last_inertia": metrics.get("inertia"),
+        "last_silhouette": metrics.get("silhouette"),
+        "last_dbi": metrics.get("dbi"),
+        "train_params": meta.get("params"),
+        "cluster_profile": profile,
+        "prep_artifacts": artifacts,
+        "scaler": scaler,
+        "feature_names": meta.get("feature_names"),
+        "mapping": meta.get("mapping"),
+        "prep": (artifacts or {}).get("prep"),
+        "dataset_name": meta.get("dataset_name"),
+        "dataset_hash": meta.get("dataset_hash"),
+        "X": X,
+    }
+    with _LOCK:
+        _LOADED[model_id] = values
+    return values
+
+
+def _prune(keep=None):
+    """Simpan maksimal MODEL_KEEP versi terbaru; versi `keep` tidak pernah dibuang."""
+    versions = _versions()
+    for model_id in versions[:max(0, len(versions) - MODEL_KEEP)]:
+        if model_id == keep:
+            continue
+        shutil.rmtree(_path(model_id), ignore_errors=True)
+        with _LOCK:
+            _LOADED.pop(model_id, None)
+
+
+def model_dataset(values):
+    """
+    Frame dataset milik versi model (hasil load_model) untuk STATE: df_raw,
+    df_used & row_pos dibangun ulang dari dataset cache (dataset_hash) dengan
+    mapping & preprocessing beku versi itu (DAG memoized). Sumber dataset tidak
+    ada lagi / jumlah baris tidak cocok → semuanya None, supaya export &
+    /preprocess tidak mencampur baris dataset session dengan label versi lain.
+    """
+    from services.cache_utils import load_dataset, dataset_source
+    from services.pipeline_utils import run_prep
+
+    empty = {"df_raw": None, "df_used": None, "row_pos": None}
+    digest = values.get("dataset_hash")
+    mapping = values.get("mapping") or {}
+    src = dataset_source(digest) if digest else None
+    if src is None or not mapping.get("features"):
+        return empty
+    feats = mapping.get("features") or []
+    keep = [c for c in dict.fromkeys([mapping.get("id"), *feats, mapping.get("label")]) if c]
+    try:
+        df = load_dataset(src, digest, usecols=keep)
+        used = [c for c in feats if c in df.columns]
+        res = run_prep(df, digest, used, values.get("prep") or {})
+    except (OSError, ValueError):
+        return empty
+    if len(res["df_used"]) != len(values["last_labels"]):
+        return empty
+    out = {"df_raw": df, "df_used": res["df_used"], "row_pos": res["row_pos"]}
+    if values.get("X") is None:
+        out["X"] = res["X"]        # file matriks versi ini sudah dievict → pakai hasil DAG
+    return out
@@ -1,6 +1,7 @@
 import os, datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from reportlab.lib.utils import simpleSplit
 from store.state import STATE
 import pandas as pd
 
@@ -54,24 +55,128 @@ def _smart_actions_for_cluster(cid: int, means_by_c: pd.DataFrame, global_mean:
     return actions[:3] or ["Pertahankan kualitas yang sudah baik dan lakukan monitoring berkala."]
 
 
-def build_simple_pdf(path_out, dataset_name, params, metrics, labels):
-    W, H = A4
-    c = canvas.Canvas(path_out, pagesize=A4)
-    y = H - 50
-    c.setFont("Helvetica-Bold", 14); c.drawString(50, y, "Laporan Clustering — KangJoe CarWash"); y -= 20
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y, f"Tanggal: {datetime.datetime.now():%Y-%m-%d %H:%M}"); y -= 14
-    c.drawString(50, y, f"Dataset: {dataset_name}"); y -= 14
+# =======================
+# PDF report
+# =======================
+_MARGIN = 50
+_LINE = 13
+
+
+def _fmt(v, d=3):
+    if v is None:
+        return "—"
+    if isinstance(v, float):
+        return f"{v:.{d}f}" if v == v else "—"
+    return str(v)
+
+
+class _Pages:
+    """Kursor tulis reportlab: baris teks ber-wrap, pindah halaman otomatis."""
+
+    def __init__(self, path_out, footer):
+        self.c = canvas.Canvas(path_out, pagesize=A4)
+        self.W, self.H = A4
+        self.footer = footer
+        self.page = 0
+        self.y = 0
+        self.new_page()
+
+    def new_page(self):
+        if self.page:
+            self.c.showPage()
+        self.page += 1
+        self.c.setFont("Helvetica", 8)
+        self.c.drawRightString(self.W - _MARGIN, 30, f"{self.footer} — hal. {self.page}")
+        self.y = self.H - _MARGIN
+
+    def need(self, height):
+        if self.y - height < _MARGIN:
+            self.new_page()
+
+    def text(self, s, font="Helvetica", size=10, indent=0, gap=0):
+        width = self.W - 2 * _MARGIN - indent
+        for line in simpleSplit(str(s), font, size, width) or [""]:
+            self.need(_LINE)
+            self.c.setFont(font, size)
+            self.c.drawString(_MARGIN + indent, self.y, line)
+            self.y -= size + 3
+        self.y -= gap
+
+    def row(self, cells, xs, font="Helvetica", size=9):
+        self.need(_LINE)
+        self.c.setFont(font, size)
+        for cell, x in zip(cells, xs):
+            self.c.drawString(_MARGIN + x, self.y, str(cell)[:48])
+        self.y -= _LINE
+
+    def save(self):
+        self.c.showPage()
+        self.c.save()
+
+
+def build_report_pdf(path_out, dataset_name, params, metrics, clusters, cluster_eval=None, profile=None):
+    """
+    Report lengkap: halaman ringkasan (params, metrik, distribusi cluster) lalu
+    halaman detail per cluster (ukuran, SSE, ciri utama, rekomendasi, profil
+    fitur mean/median/mode dari cluster_utils). Profil panjang lanjut ke
+    halaman berikutnya.
+    """
+    pg = _Pages(path_out, f"Laporan Clustering — {dataset_name}")
+    pg.text("Laporan Clustering — KangJoe CarWash", "Helvetica-Bold", 14, gap=6)
+    pg.text(f"Tanggal: {datetime.datetime.now():%Y-%m-%d %H:%M}")
+    pg.text(f"Dataset: {dataset_name}")
     if params:
-        c.drawString(50, y, f"Params: k={params.get('k')}, n_init={params.get('n_init')}, max_iter={params.get('max_iter')}"); y -= 14
+        pg.text(f"Params: k={params.get('k')}, init={params.get('init')}, "
+                f"n_init={params.get('n_init')}, max_iter={params.get('max_iter')}")
     if metrics:
-        c.drawString(50, y, f"Metrics: WCSS={metrics.get('wcss'):.2f}, Silhouette={metrics.get('silhouette')}, DBI={metrics.get('dbi')}"); y -= 18
-    # distribusi sederhana
-    from collections import Counter
-    cnt = Counter(labels) if labels is not None else {}
-    for k,v in sorted(cnt.items()):
-        c.drawString(50, y, f"Cluster C{k}: {v} data"); y -= 12
-    # tambahkan ringkasan singkat
-    c.drawString(50, y, "Ringkasan: lihat halaman Insights untuk ciri utama & rekomendasi."); y -= 16
-    c.showPage(); c.save()
+        pg.text(f"Metrics: WCSS={_fmt(metrics.get('wcss'), 2)}, Silhouette={_fmt(metrics.get('silhouette'))}, "
+                f"DBI={_fmt(metrics.get('dbi'))}, Calinski–Harabasz={_fmt(metrics.get('calinski_harabasz'), 1)}",
+                gap=8)
+
+    ev = cluster_eval or {}
+    pg.text("Distribusi cluster", "Helvetica-Bold", 11, gap=2)
+    xs = (0, 80, 160, 240, 340)
+    pg.row(("Cluster", "Ukuran", "Porsi", "SSE", "Jarak rata-rata"), xs, "Helvetica-Bold")
+    for cl in clusters:
+        cid = cl["id"]
+        pg.row((f"C{cid}", cl["size"], f"{cl['share'] * 100:.1f}%",
+                _fmt(ev["sse"][cid], 2) if ev else "—",
+                _fmt(ev["scatter"][cid]) if ev else "—"), xs)
+    pg.text("Detail tiap cluster ada di halaman berikutnya.", size=9, gap=0)
+
+    prof = profile or {}
+    feats = prof.get("features") or []
+    for cl in clusters:
+        cid = cl["id"]
+        pg.new_page()
+        pg.text(f"Cluster C{cid}", "Helvetica-Bold", 14, gap=4)
+        pg.text(f"Ukuran: {cl['size']} responden ({cl['share'] * 100:.1f}%)")
+        if ev:
+            closest = ev["closest"][cid]
+            pg.text(f"SSE: {_fmt(ev['sse'][cid], 2)} · jarak rata-rata ke centroid: {_fmt(ev['scatter'][cid])}"
+                    + (f" · paling mirip: C{closest} (suku DBI {_fmt(ev['dbi_terms'][cid])})" if closest is not None else ""))
+        pg.y -= 6
+        if cl.get("traits"):
+            pg.text("Ciri utama", "Helvetica-Bold", 11)
+            for t in cl["traits"]:
+                pg.text(f"• {t}", indent=8)
+            pg.y -= 6
+        if cl.get("actions"):
+            pg.text("Rekomendasi", "Helvetica-Bold", 11)
+            for a in cl["actions"]:
+                pg.text(f"• {a}", indent=8)
+            pg.y -= 6
+        if feats and cid < len(prof.get("mean") or []):
+            pg.text("Profil fitur", "Helvetica-Bold", 11)
+            xs = (0, 230, 290, 350, 410)
+            header = ("Fitur", "Mean", "Std", "Median", "Mode")
+            pg.row(header, xs, "Helvetica-Bold")
+            for j, f in enumerate(feats):
+                if pg.y - _LINE < _MARGIN:
+                    pg.new_page()
+                    pg.text(f"Cluster C{cid} (lanjutan)", "Helvetica-Bold", 11)
+                    pg.row(header, xs, "Helvetica-Bold")
+                pg.row((_feature_display_name(f), _fmt(prof["mean"][cid][j], 2), _fmt(prof["std"][cid][j], 2),
+                        _fmt(prof["median"][cid][j], 2), _fmt(prof["mode"][cid][j])), xs)
+    pg.save()
     return path_out
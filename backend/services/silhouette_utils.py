@@ -0,0 +1,132 @@
+from statistics import NormalDist
+import numpy as np
+from config import (
+    SILHOUETTE_EXACT_MAX_N, SILHOUETTE_SAMPLE_SIZE, SILHOUETTE_BLOCK_ROWS,
+    SILHOUETTE_CONFIDENCE,
+)
+from services.profile_utils import traced
+from services.distance_utils import row_norms, pairwise_dist
+
+# ==============================
+#  Silhouette: exact (chunked) & sampled (stratified)
+# ==============================
+# silhouette_score penuh butuh jarak semua pasangan (O(n²)). Di sini jarak
+# dihitung per blok baris sehingga memori dibatasi blok × blok, dan untuk n
+# besar silhouette diestimasi dari sampel per-cluster + interval kepercayaan.
+
+
+def _cluster_distance_sums(X, codes, k, rows, block=SILHOUETTE_BLOCK_ROWS):
+    """
+    Untuk setiap baris di `rows`: jumlah jarak euclid ke semua titik tiap cluster.
+    Return array (len(rows), k). Memori puncak ≈ block × block float64.
+    """
+    sums = np.zeros((len(rows), k), dtype=float)
+    n = X.shape[0]
+    eye = np.eye(k)
+    x_sq = row_norms(X, dtype=np.float64)      # ‖x‖² sekali, bukan per pasangan blok
+    for r0 in range(0, len(rows), block):
+        rr = rows[r0:r0 + block]
+        Xr = X[rr]
+        for c0 in range(0, n, block):
+            D = pairwise_dist(Xr, X[c0:c0 + block], x_sq[rr], x_sq[c0:c0 + block])
+            # jumlah per cluster sekaligus: D @ one-hot(label blok)
+            sums[r0:r0 + block] += D @ eye[codes[c0:c0 + block]]
+    return sums
+
+
+def _silhouette_values(sums, own, sizes):
+    """s(i) = (b - a) / max(a, b), konvensi sklearn: cluster berukuran 1 → 0."""
+    idx = np.arange(len(own))
+    n_own = sizes[own]
+    a = sums[idx, own] / np.maximum(n_own - 1, 1)
+    mean_other = sums / np.maximum(sizes, 1)[None, :]
+    mean_other[idx, own] = np.inf
+    mean_other[:, sizes == 0] = np.inf
+    b = mean_other.min(axis=1)
+    denom = np.maximum(a, b)
+    s = np.where(denom > 0, (b - a) / np.where(denom > 0, denom, 1.0), 0.0)
+    return np.where(n_own > 1, s, 0.0)
+
+
+def _encode(labels):
+    uniq, codes = np.unique(np.asarray(labels), return_inverse=True)
+    return codes.astype(np.intp), len(uniq)
+
+
+def silhouette_exact(X, labels, block=SILHOUETTE_BLOCK_ROWS):
+    """Silhouette exact (= sklearn.silhouette_score) dengan memori terbatas per blok."""
+    codes, k = _encode(labels)
+    sizes = np.bincount(codes, minlength=k)
+    rows = np.arange(X.shape[0])
+    s = _silhouette_values(_cluster_distance_sums(X, codes, k, rows, block), codes, sizes)
+    return float(s.mean())
+
+
+def silhouette_sampled(X, labels, sample_size=SILHOUETTE_SAMPLE_SIZE, *,
+                       random_state=42, confidence=SILHOUETTE_CONFIDENCE,
+                       block=SILHOUETTE_BLOCK_ROWS, min_per_cluster=20):
+    """
+    Estimasi silhouette dari sampel bertingkat per cluster.
+    s(i) untuk titik sampel dihitung exact (jarak ke seluruh X), lalu dirata-rata
+    dengan bobot n_c/n. Return dict {score, ci_low, ci_high, sample_size}.
+    """
+    codes, k = _encode(labels)
+    n = len(codes)
+    sizes = np.bincount(codes, minlength=k)
+    rng = np.random.default_rng(random_state)
+
+    picks = []
+    for c in range(k):
+        members = np.flatnonzero(codes == c)
+        m_c = int(round(sample_size * sizes[c] / n))
+        m_c = min(sizes[c], max(m_c, min_per_cluster))
+        picks.append(np.sort(rng.choice(members, size=m_c, replace=False)))
+    rows = np.concatenate(picks)
+
+    s = _silhouette_values(_cluster_distance_sums(X, codes, k, rows, block), codes[rows], sizes)
+
+    # estimator bertingkat + koreksi populasi hingga
+    est, var, off = 0.0, 0.0, 0
+    for c, p in enumerate(picks):
+        s_c = s[off:off + len(p)]; off += len(p)
+        w = sizes[c] / n
+        est += w * s_c.mean()
+        if len(p) > 1:
+            fpc = 1.0 - len(p) / sizes[c]
+            var += (w ** 2) * s_c.var(ddof=1) / len(p) * fpc
+    half = NormalDist().inv_cdf(0.5 + confidence / 2) * var ** 0.5
+    return {
+        "score": float(est),
+        "ci_low": float(est - half),
+        "ci_high": float(est + half),
+        "sample_size": int(len(rows)),
+    }
+
+
+@traced("silhouette")
+def silhouette_estimate(X, labels, mode="auto", *, sample_size=SILHOUETTE_SAMPLE_SIZE,
+                        random_state=42):
+    """
+    mode: "exact" | "sampled" | "auto" (exact bila n <= SILHOUETTE_EXACT_MAX_N).
+    Return {score, ci_low, ci_high, method, n, sample_size}; score NaN kalau
+    silhouette tidak terdefinisi (< 2 cluster atau panjang label tidak cocok).
+    """
+    nan = {"score": float("nan"), "ci_low": None, "ci_high": None,
+           "method": None, "n": 0, "sample_size": 0}
+    if X is None or labels is None:
+        return nan
+    labels = np.asarray(labels)
+    n = X.shape[0]
+    k = len(np.unique(labels))
+    if n != len(labels) or k < 2 or k >= n:
+        return dict(nan, n=int(n))
+
+    if mode == "auto":
+        mode = "exact" if n <= SILHOUETTE_EXACT_MAX_N else "sampled"
+    if mode == "sampled" and sample_size < n:
+        res = silhouette_sampled(X, labels, sample_size, random_state=random_state)
+        return dict(res, method="sampled", n=int(n))
+
+    score = silhouette_exact(X, labels)
+    return {"score": score, "ci_low": score, "ci_high": score,
+            "method": "exact", "n": int(n), "sample_size": int(n)}
@@ -0,0 +1,208 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+from config import (
+    SWEEP_START_METHOD, STABILITY_B, STABILITY_FRAC, STABILITY_REF_ROWS, STABILITY_PAIRS,
+)
+from services import sweep_utils
+from services.sweep_utils import resolve_workers, _blas_threads, _init_worker, _fit_one
+from services.matrix_utils import matrix_ref
+from services.distance_utils import nearest_centroid
+from services.silhouette_utils import silhouette_estimate
+from services.profile_utils import traced
+
+# ==============================
+#  Stabilitas segmen (bootstrap / subsample)
+# ==============================
+# Per k: model penuh dari train_kmeans (fit store → WCSS sama dengan Elbow),
+# lalu B fit pada resample baris X (subsample tanpa pengembalian / bootstrap)
+# dijalankan paralel di process pool sweep. Tiap fit resample hanya dipakai
+# untuk melabeli sampel referensi tetap (STABILITY_REF_ROWS baris X), jadi
+# semua fit bisa dibandingkan di baris yang sama:
+#   ARI    → rata-rata adjusted Rand antar pasangan fit (inkremental: fit baru
+#            dibandingkan dengan fit sebelumnya untuk k itu)
+#   co-assignment → tidak pernah n × n; hanya STABILITY_PAIRS pasangan baris
+#            acak dari sampel referensi, dihitung berapa kali satu cluster.
+#            consensus pasangan = hitungan / jumlah fit; PAC = porsi pasangan
+#            ambigu (0.1 < consensus < 0.9); stability = 1 − PAC.
+# Skor per k dikirim lewat on_partial setiap satu fit resample selesai.
+
+RESAMPLE_MODES = ("subsample", "bootstrap")
+_AMBIGUOUS = (0.1, 0.9)
+
+
+def resample_rows(n, frac, mode, seed):
+    """Indeks baris (terurut) untuk satu resample."""
+    rng = np.random.default_rng(seed)
+    m = max(2, int(round(n * float(frac))))
+    if mode == "bootstrap":
+        return np.sort(rng.integers(0, n, size=m))
+    return np.sort(rng.choice(n, size=min(m, n), replace=False))
+
+
+def _reference(n, ref_rows, max_pairs, seed):
+    """Sampel referensi (baris X) + pasangan (i, j) di dalamnya untuk co-assignment."""
+    rng = np.random.default_rng(seed)
+    ref = np.sort(rng.choice(n, size=min(n, int(ref_rows)), replace=False))
+    m = len(ref)
+    n_pairs = m * (m - 1) // 2
+    if n_pairs <= max_pairs:
+        pi, pj = np.triu_indices(m, k=1)
+    else:
+        pi = rng.integers(0, m, size=int(max_pairs))
+        pj = (pi + rng.integers(1, m, size=int(max_pairs))) % m   # j ≠ i
+    return ref, pi.astype(np.int32), pj.astype(np.int32)
+
+
+def _fit_resample(X, k, rows, ref, fit_kw):
+    """Fit KMeans di X[rows], label sampel referensi dengan centroid hasilnya."""
+    res = _fit_one(X[rows], k, **fit_kw)
+    labels, _, _ = nearest_centroid(X[ref], res["centroids"], n_jobs=1)
+    return labels, float(res["inertia"]) / len(rows)
+
+
+def _worker_resample(k, b, seed, ref, frac, mode, fit_kw):
+    X = sweep_utils._WORKER_X
+    rows = resample_rows(X.shape[0], frac, mode, seed)
+    labels, inertia = _fit_resample(X, k, rows, ref, fit_kw)
+    return k, b, labels, inertia
+
+
+class _KStability:
+    """Akumulator per k: label referensi tiap fit, ARI antar pasangan, hitungan co-assignment."""
+
+    def __init__(self, k, B, pi, pj, full_ref):
+        self.k, self.B = k, B
+        self.pi, self.pj = pi, pj
+        self.full_pair = full_ref[pi] == full_ref[pj]        # pasangan satu cluster di model penuh
+        self.full_cluster = full_ref[pi]
+        self.together = np.zeros(len(pi), dtype=np.uint16)
+        self.fits = []
+        self.ari_sum = self.ari_sq = 0.0
+        self.n_ari = 0
+        self.inertia = []
+
+    def add(self, labels, inertia):
+        for prev in self.fits:
+            a = adjusted_rand_score(prev, labels)
+            self.ari_sum += a
+            self.ari_sq += a * a
+            self.n_ari += 1
+        self.fits.append(labels)
+        self.inertia.append(inertia)
+        self.together += labels[self.pi] == labels[self.pj]
+
+    def summary(self):
+        done = len(self.fits)
+        out = {"k": self.k, "done": done, "B": self.B,
+               "ari_mean": None, "ari_std": None, "pac": None, "stability": None,
+               "cluster_consensus": None, "consensus_hist": None,
+               "resample_inertia_per_row": float(np.mean(self.inertia)) if self.inertia else None}
+        if self.n_ari:
+            mean = self.ari_sum / self.n_ari
+            out["ari_mean"] = float(mean)
+            out["ari_std"] = float(np.sqrt(max(self.ari_sq / self.n_ari - mean * mean, 0.0)))
+        if done >= 2:
+            cons = self.together / done
+            lo, hi = _AMBIGUOUS
+            pac = float(np.mean((cons > lo) & (cons < hi)))
+            out["pac"] = pac
+            out["stability"] = 1.0 - pac
+            out["consensus_hist"] = np.histogram(cons, bins=10, range=(0.0, 1.0))[0].tolist()
+            # consensus rata-rata pasangan yang satu cluster di model penuh, per cluster
+            same = self.full_pair
+            sums = np.bincount(self.full_cluster[same], weights=cons[same], minlength=self.k)
+            cnt = np.bincount(self.full_cluster[same], minlength=self.k)
+            out["cluster_consensus"] = [float(s / c) if c else None for s, c in zip(sums, cnt)]
+        return out
+
+
+@traced("stability")
+def stability_scan(
+    X, ks, *, B=STABILITY_B, frac=STABILITY_FRAC, mode="subsample",
+    ref_rows=STABILITY_REF_ROWS, max_pairs=STABILITY_PAIRS,
+    init="k-means++", n_init=3, max_iter=300, random_state=42,
+    n_jobs=None, engine="kmeans", batch_size=None, silhouette_mode="auto",
+    train_fn=None, on_progress=None, on_partial=None
+):
+    """
+    Skor stabilitas per k di samping WCSS & silhouette model penuh.
+    train_fn(X, k) → dict train_kmeans (labels, centroids, inertia).
+    on_partial(row) dipanggil tiap fit resample selesai (row = skor k itu
+    sejauh ini); exception dari callback (job dibatalkan) menghentikan pool.
+    Return {"ks", "rows", "B", "mode", "frac", "ref_rows", "pairs"}.
+    """
+    if mode not in RESAMPLE_MODES:
+        raise ValueError(f"Mode resample tidak dikenal: {mode} (pilih {', '.join(RESAMPLE_MODES)})")
+    frac = float(frac)
+    if not 0 < frac <= (2.0 if mode == "bootstrap" else 1.0):
+        raise ValueError(f"frac di luar rentang untuk {mode}: {frac}")
+    n = X.shape[0]
+    ks = [int(k) for k in ks if 2 <= int(k) < n]
+    B = max(2, int(B))
+    ref, pi, pj = _reference(n, ref_rows, max_pairs, random_state)
+    total = len(ks) * (B + 1)
+    done = 0
+
+    # 1) model penuh per k (fit store) → WCSS, silhouette, label referensi
+    acc, base = {}, {}
+    for k in ks:
+        fit = train_fn(X, k)
+        sil = silhouette_estimate(X, fit["labels"], silhouette_mode)["score"]
+        base[k] = {"wcss": float(fit["inertia"]),
+                   "silhouette": float(sil) if np.isfinite(sil) else None}
+        full_ref = np.asarray(fit["labels"])[ref]
+        acc[k] = _KStability(k, B, pi, pj, full_ref)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, total, k)
+
+    # 2) B fit resample per k, paralel; skor diperbarui begitu satu fit selesai
+    fit_kw = dict(init=init, n_init=int(n_init), max_iter=int(max_iter),
+                  engine=engine, batch_size=batch_size)
+    seeds = np.random.SeedSequence(random_state).generate_state(len(ks) * B, dtype=np.uint32)
+    tasks = [(k, b, int(seeds[i * B + b])) for i, k in enumerate(ks) for b in range(B)]
+
+    def _collect(k, labels, inertia):
+        nonlocal done
+        acc[k].add(np.asarray(labels, dtype=np.int32), inertia)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, total, k)
+        if on_partial is not None:
+            on_partial({**base[k], **acc[k].summary()})
+
+    workers = resolve_workers(n_jobs)
+    if workers > 1 and len(tasks) > 1:
+        ctx = mp.get_context(SWEEP_START_METHOD)
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx,
+                                   initializer=_init_worker,
+                                   initargs=(matrix_ref(X) or X, _blas_threads(workers)))
+        try:
+            futures = [pool.submit(_worker_resample, k, b, seed, ref, frac, mode,
+                                   dict(fit_kw, random_state=seed))
+                       for k, b, seed in tasks]
+            for fut in as_completed(futures):
+                k, _b, labels, inertia = fut.result()
+                _collect(k, labels, inertia)
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    else:
+        for k, b, seed in tasks:
+            rows = resample_rows(n, frac, mode, seed)
+            labels, inertia = _fit_resample(X, k, rows, ref, dict(fit_kw, random_state=seed))
+            _collect(k, labels, inertia)
+
+    rows = [{**base[k], **acc[k].summary()} for k in ks]
+    return {
+        "ks": ks,
+        "rows": rows,
+        "B": B,
+        "mode": mode,
+        "frac": frac,
+        "ref_rows": int(len(ref)),
+        "pairs": int(len(pi)),
+    }
@@ -0,0 +1,325 @@
+import os, hashlib, threading, weakref
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from config import (
+    FIT_CACHE_MAX, SWEEP_WORKERS, SWEEP_BLAS_THREADS, SWEEP_START_METHOD,
+    MINIBATCH_SIZE, ONLINE_MAX_EPOCHS,
+)
+from services.matrix_utils import matrix_ref, open_ref
+from services.profile_utils import traced
+
+# ==============================
+#  Sweep engine: fit tiap k sekali
+# ==============================
+# Elbow, kurva Silhouette dan Train memakai fit yang sama. Hasil fit disimpan
+# per (fingerprint dataset, k, init, n_init, max_iter, random_state) sehingga
+# satu sesi analisis tidak melatih KMeans yang sama berulang kali.
+#
+# Engine fit:
+#   "kmeans"    → KMeans full-batch (default)
+#   "minibatch" → MiniBatchKMeans.fit
+#   "online"    → MiniBatchKMeans.partial_fit per chunk baris X (streaming)
+
+ENGINES = ("kmeans", "minibatch", "online")
+
+_FITS = OrderedDict()      # key → {"labels", "centroids", "inertia", "model"}
+_FP_MEMO = {}              # id(X) → (weakref X, fingerprint)
+_LOCK = threading.Lock()
+
+
+def dataset_fingerprint(X) -> str:
+    """
+    Hash isi matriks X (shape + dtype + bytes). Di-memo per objek X selama
+    objeknya masih hidup; X dianggap read-only setelah preprocessing.
+    Memmap file matriks fitur (ditulis sekali, tidak pernah diubah) cukup
+    di-hash dari path + offset + shape + dtype, tanpa membaca isinya.
+    """
+    ref = matrix_ref(X)
+    if ref is not None:
+        raw = "|".join(f"{k}={ref[k]}" for k in sorted(ref) if k != "path")
+        raw += "|" + os.path.abspath(ref["path"])
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    key = id(X)
+    hit = _FP_MEMO.get(key)
+    if hit is not None and hit[0]() is X:
+        return hit[1]
+
+    h = hashlib.blake2b(digest_size=16)
+    if sp.issparse(X):
+        csr = X.tocsr()
+        h.update(f"csr|{csr.shape}|{csr.dtype.str}".encode())
+        for part in (csr.data, csr.indices, csr.indptr):
+            h.update(memoryview(np.ascontiguousarray(part)).cast("B"))
+    else:
+        arr = np.ascontiguousarray(X)
+        h.update(f"{arr.shape}|{arr.dtype.str}".encode())
+        h.update(memoryview(arr).cast("B"))
+    fp = h.hexdigest()
+
+    try:
+        ref = weakref.ref(X, lambda _r, k=key: _FP_MEMO.pop(k, None))
+        _FP_MEMO[key] = (ref, fp)
+    except TypeError:
+        pass  # objek tanpa dukungan weakref → tidak di-memo
+    return fp
+
+
+def _fit_key(fp, k, init, n_init, max_iter, random_state, split_restarts=False,
+             engine="kmeans", batch_size=None):
+    if not isinstance(init, str):
+        return None  # init berupa array centroid → tidak di-cache
+    key = (fp, int(k), init, int(n_init), int(max_iter), random_state)
+    if engine != "kmeans":
+        key += (engine, int(batch_size or MINIBATCH_SIZE))
+    # hasil restart yang dipecah per proses memakai seed turunan → beda entri
+    return key + ("split",) if split_restarts else key
+
+
+def _new_model(k, init, n_init, max_iter, random_state, engine="kmeans", batch_size=None):
+    if engine == "kmeans":
+        return KMeans(n_clusters=int(k), init=init, n_init=n_init,
+                      max_iter=max_iter, random_state=random_state)
+    return MiniBatchKMeans(n_clusters=int(k), init=init, n_init=n_init, max_iter=max_iter,
+                           batch_size=int(batch_size or MINIBATCH_SIZE),
+                           random_state=random_state)
+
+
+def _fit_online(km, X, max_iter, batch_size):
+    """
+    partial_fit per chunk baris X (X tidak pernah di-copy utuh), lalu labels &
+    inertia dihitung juga per chunk. Jumlah epoch = min(max_iter, ONLINE_MAX_EPOCHS).
+    """
+    n = X.shape[0]
+    bs = int(batch_size or MINIBATCH_SIZE)
+    for _ in range(max(1, min(int(max_iter), ONLINE_MAX_EPOCHS))):
+        for r0 in range(0, n, bs):
+            km.partial_fit(X[r0:r0 + bs])
+    labels = np.empty(n, dtype=int)
+    inertia = 0.0
+    for r0 in range(0, n, bs):
+        chunk = X[r0:r0 + bs]
+        labels[r0:r0 + bs] = km.predict(chunk)
+        inertia -= km.score(chunk)
+    km.labels_ = labels
+    km.inertia_ = inertia
+    return km
+
+
+@traced("kmeans_fit")
+def _fit_one(X, k, init, n_init, max_iter, random_state, engine="kmeans", batch_size=None):
+    km = _new_model(k, init, n_init, max_iter, random_state, engine, batch_size)
+    if engine == "online":
+        _fit_online(km, X, max_iter, batch_size)
+    else:
+        km.fit(X)
+    labels = km.labels_.astype(int, copy=False)
+    del km.labels_      # fit store cukup satu salinan label (res["labels"]); model untuk predict
+    return {
+        "labels": labels,
+        "centroids": km.cluster_centers_.astype(float),
+        "inertia": float(km.inertia_),
+        "n_iter": getattr(km, "n_iter_", 0),
+        "model": km,
+    }
+
+
+def get_fit(X, k, *, init="k-means++", n_init=10, max_iter=300, random_state=42,
+            split_restarts=False, engine="kmeans", batch_size=None):
+    """Ambil hasil fit dari store tanpa melatih; None kalau belum ada."""
+    key = _fit_key(dataset_fingerprint(X), k, init, n_init, max_iter, random_state,
+                   split_restarts, engine, batch_size)
+    if key is None:
+        return None
+    with _LOCK:
+        res = _FITS.get(key)
+        if res is not None:
+            _FITS.move_to_end(key)
+        return res
+
+
+def put_fit(X, k, res, *, init="k-means++", n_init=10, max_iter=300, random_state=42,
+            split_restarts=False, engine="kmeans", batch_size=None):
+    key = _fit_key(dataset_fingerprint(X), k, init, n_init, max_iter, random_state,
+                   split_restarts, engine, batch_size)
+    if key is None:
+        return
+    with _LOCK:
+        _FITS[key] = res
+        _FITS.move_to_end(key)
+        while len(_FITS) > FIT_CACHE_MAX:
+            _FITS.popitem(last=False)
+
+
+# ==============================
+#  Eksekusi paralel (process pool)
+# ==============================
+# Tiap k (dan opsional tiap restart n_init) independen → disebar ke beberapa
+# proses. X dikirim sekali per worker lewat initializer (memmap matriks fitur
+# cukup dikirim path-nya, worker membuka file yang sama), dan BLAS/OpenMP di
+# worker dibatasi supaya total thread tidak melebihi jumlah core.
+
+_WORKER_X = None
+
+
+def resolve_workers(n_jobs=None) -> int:
+    """n_jobs None → config.SWEEP_WORKERS; -1 → semua core; minimal 1."""
+    n = SWEEP_WORKERS if n_jobs is None else int(n_jobs)
+    cpu = os.cpu_count() or 1
+    if n < 0:
+        n = cpu + 1 + n
+    return max(1, min(n, cpu))
+
+
+def _blas_threads(workers: int) -> int:
+    if SWEEP_BLAS_THREADS > 0:
+        return SWEEP_BLAS_THREADS
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_worker(X, n_threads):
+    global _WORKER_X
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(n_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=n_threads)
+    except Exception:
+        pass
+    _WORKER_X = open_ref(X) if isinstance(X, dict) else X
+
+
+def _worker_fit(k, fit_kw):
+    res = _fit_one(_WORKER_X, k, **fit_kw)
+    res.pop("model")  # model dibangun ulang di parent (hemat pickling labels dobel)
+    res["n_iter"] = int(res["n_iter"])
+    return k, res
+
+
+def _restart_seeds(random_state, n_init):
+    """Seed per restart yang deterministik dari random_state."""
+    ss = np.random.SeedSequence(random_state)
+    return [int(s) for s in ss.generate_state(n_init, dtype=np.uint32)]
+
+
+def _rebuild_model(X, res, k, fit_kw):
+    """Bangun objek KMeans ter-fit dari hasil worker tanpa melatih ulang."""
+    km = _new_model(k, **fit_kw)
+    km.cluster_centers_ = res["centroids"]
+    km.inertia_ = res["inertia"]
+    km.n_iter_ = res["n_iter"]
+    km.n_features_in_ = X.shape[1]
+    km._n_threads = os.cpu_count() or 1
+    res["model"] = km
+    return res
+
+
+@traced("kmeans_fit_parallel")
+def _run_parallel(X, ks, *, init, n_init, max_iter, random_state, workers,
+                  split_restarts, engine="kmeans", batch_size=None, on_done=None):
+    """
+    Jalankan fit untuk `ks` di process pool. Return {k: hasil_fit}.
+    split_restarts=True → tiap restart n_init jadi task terpisah (n_init=1,
+    seed turunan), lalu dipilih inertia terkecil (seri → restart paling awal).
+    on_done(k, hasil_fit) dipanggil begitu semua task untuk k selesai;
+    exception dari callback (mis. job dibatalkan) membatalkan task sisanya.
+    """
+    ctx = mp.get_context(SWEEP_START_METHOD)
+    base = dict(init=init, n_init=n_init, max_iter=max_iter, random_state=random_state,
+                engine=engine, batch_size=batch_size)
+    tasks = []
+    for k in ks:
+        if split_restarts and n_init > 1:
+            for seed in _restart_seeds(random_state, n_init):
+                tasks.append((k, dict(base, n_init=1, random_state=seed)))
+        else:
+            tasks.append((k, base))
+
+    n_per_k = {k: sum(1 for t in tasks if t[0] == k) for k in ks}
+    done = {k: {} for k in ks}   # k → {indeks task: hasil}
+
+    out = {}
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx,
+                               initializer=_init_worker,
+                               initargs=(matrix_ref(X) or X, _blas_threads(workers)))
+    try:
+        futures = {pool.submit(_worker_fit, *t): i for i, t in enumerate(tasks)}
+        for fut in as_completed(futures):
+            k, res = fut.result()
+            done[k][futures[fut]] = res
+            if len(done[k]) < n_per_k[k]:
+                continue
+            # urutan task tetap → pemilihan restart terbaik deterministik
+            best = min((done[k][i] for i in sorted(done[k])), key=lambda r: r["inertia"])
+            out[k] = _rebuild_model(X, best, k, base)
+            if on_done is not None:
+                on_done(k, out[k])
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return out
+
+
+def fit_kmeans_cached(X, k, *, init="k-means++", n_init=10, max_iter=300, random_state=42,
+                      n_jobs=None, split_restarts=False, engine="kmeans", batch_size=None):
+    """Fit KMeans untuk satu k, atau ambil dari store bila kombinasi yang sama sudah pernah di-fit."""
+    return sweep_kmeans(
+        X, [k], init=init, n_init=n_init, max_iter=max_iter, random_state=random_state,
+        n_jobs=n_jobs, split_restarts=split_restarts, engine=engine, batch_size=batch_size,
+    )[int(k)]
+
+
+def sweep_kmeans(X, ks, *, init="k-means++", n_init=10, max_iter=300, random_state=42,
+                 n_jobs=None, split_restarts=False, on_progress=None,
+                 engine="kmeans", batch_size=None):
+    """
+    Fit KMeans untuk setiap k di `ks` (hanya yang belum ada di store).
+    n_jobs > 1 → k yang belum ada di-fit paralel di process pool.
+    on_progress(done, total, k) dipanggil setiap satu k selesai; kalau
+    callback raise (mis. job dibatalkan), sweep berhenti di antara k.
+    Return dict {k: hasil_fit}.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Engine tidak dikenal: {engine} (pilih {', '.join(ENGINES)})")
+    ks = [int(k) for k in ks]
+    workers = resolve_workers(n_jobs)
+    split_restarts = (bool(split_restarts) and workers > 1 and isinstance(init, str)
+                      and engine != "online")
+    opts = dict(init=init, n_init=int(n_init), max_iter=int(max_iter),
+                random_state=random_state, split_restarts=split_restarts,
+                engine=engine, batch_size=batch_size)
+
+    out = {}
+    for k in ks:
+        res = get_fit(X, k, **opts)
+        if res is not None:
+            out[k] = res
+    pending = [k for k in dict.fromkeys(ks) if k not in out]
+    total = len(out) + len(pending)
+    if on_progress is not None:
+        on_progress(len(out), total)
+
+    def _store(k, res):
+        put_fit(X, k, res, **opts)
+        out[k] = res
+        if on_progress is not None:
+            on_progress(len(out), total, k)
+
+    n_tasks = len(pending) * (int(n_init) if split_restarts else 1)
+    if workers > 1 and n_tasks > 1:
+        _run_parallel(X, pending, workers=workers, on_done=_store, **opts)
+    else:
+        fit_opts = {key: v for key, v in opts.items() if key != "split_restarts"}
+        for k in pending:
+            _store(k, _fit_one(X, k, **fit_opts))
+    return out
+
+
+def clear_fits():
+    with _LOCK:
+        _FITS.clear()
@@ -1,19 +1,58 @@
 import io, base64
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from collections import Counter
+import numpy as np
+from services.profile_utils import traced
 
-def _to_b64(fig, prefix=False):
+# pyplot baru di-import saat benar-benar ada gambar yang dirender
+# (start-up app & endpoint yang hanya mengembalikan series tidak membayar import-nya)
+_PLT = None
+
+def _plt():
+    global _PLT
+    if _PLT is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        _PLT = plt
+    return _PLT
+
+@traced("render_chart")
+def _to_bytes(fig, fmt="png", dpi=72):
+    plt = _plt()
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
     plt.close(fig)
-    b64 = base64.b64encode(buf.getvalue()).decode("ascii")
+    return buf.getvalue()
+
+def _to_b64(fig, prefix=False):
+    b64 = base64.b64encode(_to_bytes(fig, "png", 140)).decode("ascii")
     return (f"data:image/png;base64,{b64}" if prefix else b64)
 
+def draw_line(series, fmt="png", dpi=72):
+    """Line chart dari series {x, y, title, xlabel, ylabel, marker?} → bytes gambar."""
+    plt = _plt()
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.plot(series["x"], [float("nan") if v is None else v for v in series["y"]], marker="o")
+    ax.set_title(series.get("title") or "")
+    ax.set_xlabel(series.get("xlabel") or "")
+    ax.set_ylabel(series.get("ylabel") or "")
+    if series.get("marker") is not None:
+        ax.axvline(series["marker"], ls="--", color="r", label=f"k={series['marker']}")
+        ax.legend()
+    fig.tight_layout()
+    return _to_bytes(fig, fmt, dpi)
+
+def draw_pie(series, fmt="png", dpi=72):
+    """Pie chart dari series {labels, values, title} → bytes gambar."""
+    plt = _plt()
+    fig, ax = plt.subplots(figsize=(4, 4))
+    ax.pie(series["values"], labels=series["labels"], autopct="%1.0f%%")
+    ax.set_title(series.get("title") or "")
+    return _to_bytes(fig, fmt, dpi)
+
 def plot_elbow_b64(ks, wcss, with_prefix=False):
     if not ks or not wcss:
         return None
+    plt = _plt()
     fig, ax = plt.subplots(figsize=(6, 4), dpi=140)
     ax.plot(ks, wcss, marker="o")
     ax.set_xlabel("Number of clusters (k)")
@@ -22,14 +61,15 @@ def plot_elbow_b64(ks, wcss, with_prefix=False):
     fig.tight_layout()
     return _to_b64(fig, prefix=with_prefix)
 
+def distribution_series(labels):
+    """Series distribusi cluster {labels: ["C0", ...], values: [n, ...]}."""
+    counts = np.bincount(np.asarray(labels, dtype=np.int64))
+    present = np.flatnonzero(counts)
+    return {"labels": [f"C{c}" for c in present.tolist()], "values": counts[present].tolist(),
+            "title": "Cluster Distribution"}
+
 def pie_distribution_b64(labels, with_prefix=False):
     if labels is None or len(labels) == 0:
         return None
-    cnt = Counter(labels)
-    fig, ax = plt.subplots(figsize=(4, 4), dpi=140)
-    ordered = sorted(cnt.items())
-    ax.pie([n for _, n in ordered],
-           labels=[f"C{c}" for c, _ in ordered],
-           autopct="%1.0f%%")
-    ax.set_title("Cluster Distribution")
-    return _to_b64(fig, prefix=with_prefix)
\ No newline at end of file
+    b64 = base64.b64encode(draw_pie(distribution_series(labels), "png", 140)).decode("ascii")
+    return (f"data:image/png;base64,{b64}" if with_prefix else b64)
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from config import WARM_TOL
+from services.distance_utils import nearest_centroid, row_norms
+from services.profile_utils import traced
+from services.pipeline_utils import used_rows
+
+# ==============================
+#  Retrain warm-start (data survei yang di-append)
+# ==============================
+# Model baru di-seed dari centroid versi sebelumnya (satu init, tanpa
+# k-means++ / n_init), lalu iterasi Lloyd. Jumlah per cluster dipelihara
+# secara inkremental: tiap iterasi hanya baris yang pindah cluster yang
+# dibaca ulang, baris yang tetap di cluster-nya tidak disentuh. Identitas
+# baris (kolom id, atau hash nilai fitur mentah) dipakai untuk menghitung
+# berapa customer yang berpindah segmen dibanding model sebelumnya.
+
+
+def row_keys(df_raw, df_used, mapping, row_pos=None):
+    """
+    Kunci identitas per baris X (uint64): hash kolom id bila di-mapping,
+    kalau tidak hash nilai fitur mentah (sebelum imputasi → stabil walau
+    statistik imputasi bergeser setelah append). row_pos = posisi baris
+    df_raw yang dipertahankan preprocessing (run_prep).
+    """
+    if df_raw is None or df_used is None:
+        return None
+    rows = used_rows(df_raw, row_pos)
+    if len(rows) != len(df_used):
+        return None
+    id_col = (mapping or {}).get("id")
+    if id_col and id_col in rows.columns:
+        src = rows[[id_col]]
+    else:
+        src = rows[[c for c in df_used.columns if c in rows.columns]]
+    return pd.util.hash_pandas_object(src, index=False).to_numpy(dtype=np.uint64)
+
+
+def match_rows(base_keys, keys):
+    """Posisi tiap baris `keys` di data model sebelumnya (−1 = baris baru)."""
+    if base_keys is None or keys is None:
+        return np.full(0 if keys is None else len(keys), -1, dtype=np.int64)
+    base = pd.Index(base_keys)
+    if not base.is_unique:                       # id ganda → pakai kemunculan pertama
+        keep = ~base.duplicated()
+        pos = np.flatnonzero(keep)
+        base = base[keep]
+        idx = base.get_indexer(keys)
+        return np.where(idx >= 0, pos[np.maximum(idx, 0)], -1)
+    return base.get_indexer(keys).astype(np.int64)
+
+
+def seed_centroids(centroids, base_artifacts, artifacts):
+    """
+    Centroid model sebelumnya → ruang fitur preprocessing sekarang.
+    Fitur & scaler identik → dipakai apa adanya; selain itu lewat skala asli
+    (inverse scaler lama → selaraskan nama fitur → scaler baru). Fitur yang
+    tidak ada di model lama (mis. kategori baru) diisi 0.
+    """
+    C = np.asarray(centroids, dtype=float)
+    base_artifacts, artifacts = base_artifacts or {}, artifacts or {}
+    old_names = base_artifacts.get("feature_names") or []
+    new_names = artifacts.get("feature_names") or []
+    old_scaler, new_scaler = base_artifacts.get("scaler"), artifacts.get("scaler")
+    if old_names == new_names and _same_scaler(old_scaler, new_scaler):
+        return C.copy()
+    if old_scaler is not None:
+        C = old_scaler.inverse_transform(C)
+    pos = {name: j for j, name in enumerate(old_names)}
+    out = np.zeros((C.shape[0], len(new_names)))
+    for j, name in enumerate(new_names):
+        if name in pos:
+            out[:, j] = C[:, pos[name]]
+    if new_scaler is not None:
+        out = new_scaler.transform(out)
+    return np.asarray(out, dtype=float)
+
+
+def _same_scaler(a, b):
+    if a is None or b is None:
+        return a is b
+    if type(a) is not type(b):
+        return False
+    attrs = ("mean_", "scale_", "min_", "max_abs_")
+    return all(
+        np.array_equal(getattr(a, name), getattr(b, name))
+        for name in attrs if getattr(a, name, None) is not None or getattr(b, name, None) is not None
+    )
+
+
+def _mean_variance(X, x_sq):
+    """Rata-rata varians per fitur (skala toleransi konvergensi, sama dengan tol sklearn)."""
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    total = max(float(x_sq.sum()) / X.shape[0] - float(mean @ mean), 0.0)
+    return total / X.shape[1]
+
+
+def _move_rows(X, rows, src, dst, k):
+    """Selisih jumlah per cluster (k × p) untuk baris `rows` yang pindah src → dst."""
+    m = len(rows)
+    ar = np.arange(m)
+    M = sp.csr_matrix(
+        (np.r_[np.ones(m), -np.ones(m)], (np.r_[dst, src], np.r_[ar, ar])), shape=(k, m)
+    )
+    return _dense(M @ X[rows])
+
+
+def _dense(A):
+    return A.toarray() if sp.issparse(A) else np.asarray(A)
+
+
+@traced("warm_kmeans")
+def warm_kmeans(X, init_centroids, max_iter=300, tol=WARM_TOL):
+    """
+    Lloyd dari centroid awal `init_centroids` (satu init). Return dict seperti
+    train_kmeans + inertia_seed (inertia centroid awal di data ini), labels_seed,
+    n_iter, rows_moved (total baris yang dibaca ulang untuk update centroid).
+    """
+    C = np.asarray(init_centroids, dtype=float).copy()
+    k, n = C.shape[0], X.shape[0]
+    x_sq = row_norms(X)                         # ‖x‖² sekali, dipakai ulang tiap iterasi
+    labels, d2, _ = nearest_centroid(X, C, x_sq=x_sq)
+    labels_seed = labels.copy()
+    inertia_seed = float(d2.sum())
+
+    counts = np.bincount(labels, minlength=k)
+    sums = _dense(sp.csr_matrix((np.ones(n), (labels, np.arange(n))), shape=(k, n)) @ X)
+    eps = tol * _mean_variance(X, x_sq)
+    rows_moved, n_iter = 0, 0
+    for n_iter in range(1, int(max_iter) + 1):
+        prev = C
+        C = C.copy()
+        live = counts > 0                       # cluster kosong → centroid lama dipertahankan
+        C[live] = sums[live] / counts[live, None]
+        new_labels, d2, _ = nearest_centroid(X, C, x_sq=x_sq)
+        moved = np.flatnonzero(new_labels != labels)
+        if moved.size:
+            src, dst = labels[moved], new_labels[moved]
+            sums += _move_rows(X, moved, src, dst, k)
+            counts += np.bincount(dst, minlength=k) - np.bincount(src, minlength=k)
+            rows_moved += int(moved.size)
+            labels = new_labels
+        if not moved.size or float(((C - prev) ** 2).sum()) <= eps:
+            break
+
+    return {
+        "labels": labels,
+        "centroids": C,
+        "inertia": float(d2.sum()),
+        "k": int(k),
+        "model": None,
+        "labels_seed": labels_seed,
+        "inertia_seed": inertia_seed,
+        "n_iter": int(n_iter),
+        "rows_moved": rows_moved,
+    }
+
+
+def segment_changes(base_labels, base_pos, labels, k):
+    """
+    Perpindahan segmen vs model sebelumnya untuk baris yang cocok (base_pos ≥ 0):
+    jumlah pindah, matriks transisi k × k (baris = cluster lama), baris baru & hilang.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    matched = base_pos >= 0
+    out = {
+        "matched_rows": int(matched.sum()),
+        "new_rows": int((~matched).sum()),
+        "removed_rows": None,
+        "changed": None,
+        "transitions": None,
+    }
+    if base_labels is None or not matched.any():
+        return out
+    base_labels = np.asarray(base_labels, dtype=np.int64)
+    old = base_labels[base_pos[matched]]
+    new = labels[matched]
+    kk = max(int(k), int(old.max()) + 1)
+    out["removed_rows"] = int(len(base_labels) - len(np.unique(base_pos[matched])))
+    out["changed"] = int((old != new).sum())
+    out["transitions"] = np.bincount(old * kk + new, minlength=kk * kk).reshape(kk, kk).tolist()
+    return out
@@ -1,16 +1,343 @@
-# Single-user dev state (sederhana). Bisa diganti ke DB/cache kalau perlu.
-STATE = {
+import os, json, re, time, pickle, threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextvars import ContextVar
+import numpy as np
+import pandas as pd
+from config import SESSION_DIR, SESSION_HOT_MAX, SESSION_IDLE_SECONDS
+from services.matrix_utils import matrix_ref, open_ref
+
+# ==============================
+#  Session state store
+# ==============================
+# Dulu satu dict global (single-user). Sekarang STATE adalah proxy ke state
+# milik session aktif (header X-Session-Id / cookie / ?session=, default
+# "default"). Session yang sering dipakai disimpan di memori (LRU), session
+# idle di-spill ke disk. Tiap perubahan ditulis ke disk di akhir request
+# (write-through) supaya beberapa worker gunicorn melihat state yang sama:
+# manifest.json menyimpan nomor revisi, worker lain memuat ulang bila tertinggal.
+#
+# Format di disk per key:
+#   ndarray numerik → .npy (dibuka lagi sebagai memmap read-only)
+#   matriks fitur memory-mapped (dense / CSR, services/matrix_utils) → cukup referensi path
+#   DataFrame       → .parquet
+#   value kecil yang bisa JSON (nama file, mapping, params) → inline di manifest
+#   lainnya (model, scaler) → .pkl
+
+DEFAULT_SESSION = "default"
+DEFAULTS = {
     "dataset_name": None,
     "df_raw": None,        # DataFrame original
     "df_used": None,       # DataFrame setelah dipilih fitur + imputasi (sebelum encoding/scaling)
+    "row_pos": None,       # posisi baris df_raw per baris X (missing="drop"), None = semua baris
     "X": None,             # np.array siap modeling
     "feature_names": None,
     "mapping": None,       # {id, features[], label}
     "prep": None,          # {missing, scaling, encoding}
     "last_model": None,    # KMeans
-    "last_labels": None,
+    "last_labels": None,   # np.ndarray ter-pack (uint8 utk k ≤ 256; encode_utils.pack_labels)
     "last_params": None,
-    "last_metrics": None,
+    "last_metrics": None,  # metrik evaluasi (DBI, CH, SSE & ukuran per cluster)
     "generated_at": None,
-    
-}
\ No newline at end of file
+    "model_version": 0,    # naik tiap X / hasil model berubah (invalidasi cache turunan)
+}
+
+# hasil training; tidak berlaku lagi begitu X diganti (upload / preprocess ulang)
+MODEL_KEYS = (
+    "last_model", "last_labels", "last_k", "last_inertia", "last_centroids",
+    "last_centroids_original", "cluster_profile", "train_params", "k_suggest", "model_id",
+)
+# nilai turunan dari model aktif (metrik & ringkasan ter-memo)
+DERIVED_KEYS = ("last_dbi", "last_silhouette", "last_metrics", "summary_memo")
+
+_SID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_current = ContextVar("session_id", default=DEFAULT_SESSION)
+_HOT = OrderedDict()       # session_id → session dict (paling baru dipakai di belakang)
+_LOCK = threading.RLock()
+
+
+def clean_session_id(raw):
+    """Session id aman untuk nama folder; selain itu → session default."""
+    return raw if raw and _SID_RE.match(raw) else DEFAULT_SESSION
+
+
+def use_session(session_id):
+    """Set session aktif untuk konteks (request/job) saat ini; return token contextvar."""
+    return _current.set(clean_session_id(session_id))
+
+
+def reset_session(token):
+    _current.reset(token)
+
+
+def current_session():
+    return _current.get()
+
+
+# ------------------------------
+#  Disk
+# ------------------------------
+def _session_dir(sid):
+    return os.path.join(SESSION_DIR, sid)
+
+
+def _read_manifest(sid):
+    try:
+        with open(os.path.join(_session_dir(sid), "manifest.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {"rev": 0, "keys": {}}
+
+
+def _write_manifest(sid, manifest):
+    path = os.path.join(_session_dir(sid), "manifest.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp, path)
+
+
+_INLINE_MAX = 64 * 1024
+
+
+def _shared_ref(value):
+    """Referensi file matriks milik modul lain (bukan file session ini) → tidak perlu disalin."""
+    ref = matrix_ref(value)
+    if ref is None:
+        return None
+    if os.path.abspath(ref["path"]).startswith(os.path.abspath(SESSION_DIR)):
+        return None
+    return ref
+
+
+def _dump_value(sid, key, value, rev):
+    """Simpan satu value → entri manifest. Nama file memuat revisi supaya memmap lama tetap valid."""
+    if not isinstance(value, (np.ndarray, pd.DataFrame)):
+        try:
+            raw = json.dumps(value)
+            if len(raw) <= _INLINE_MAX and json.loads(raw) == value:
+                return {"kind": "json", "value": value}
+        except (TypeError, ValueError):
+            pass
+    ref = _shared_ref(value)
+    if ref is not None:
+        return {"kind": "matrix", "ref": ref}
+    base = os.path.join(_session_dir(sid), f"{key}.{rev}")
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        np.save(base + ".npy", np.ascontiguousarray(value))
+        return {"kind": "npy", "file": os.path.basename(base) + ".npy"}
+    if isinstance(value, pd.DataFrame):
+        try:
+            value.to_parquet(base + ".parquet")
+            return {"kind": "parquet", "file": os.path.basename(base) + ".parquet"}
+        except Exception:
+            pass   # kolom campuran yang tidak bisa ke Arrow → pickle
+    with open(base + ".pkl", "wb") as fh:
+        pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"kind": "pkl", "file": os.path.basename(base) + ".pkl"}
+
+
+def _load_value(sid, entry):
+    kind = entry["kind"]
+    if kind == "json":
+        return entry["value"]
+    if kind == "matrix":
+        if not os.path.exists(entry["ref"]["path"]):
+            return None   # file matriks sudah dievict → preprocessing perlu diulang
+        return open_ref(entry["ref"])
+    path = os.path.join(_session_dir(sid), entry["file"])
+    if kind == "npy":
+        return np.load(path, mmap_mode="r")
+    if kind == "parquet":
+        df = pd.read_parquet(path)
+        for c in df.columns:
+            if pd.api.types.is_string_dtype(df[c]) and df[c].dtype != object:
+                df[c] = df[c].astype(object)
+        return df
+    with open(path, "rb") as fh:
+        return pickle.load(fh)
+
+
+def _remove_files(sid, names):
+    for name in names:
+        try:
+            os.remove(os.path.join(_session_dir(sid), name))
+        except OSError:
+            pass   # masih dibuka (memmap di Windows) → dibersihkan saat flush berikutnya
+
+
+# ------------------------------
+#  Session di memori
+# ------------------------------
+def _new_session(sid):
+    manifest = _read_manifest(sid)
+    return {
+        "id": sid,
+        "values": {},                 # key → value yang sudah dimuat
+        "manifest": manifest,         # key → {kind, file} di disk
+        "rev": manifest.get("rev", 0),
+        "dirty": set(),
+        "deleted": set(),
+        "last_access": time.time(),
+        "lock": threading.RLock(),
+    }
+
+
+def _spill(sess):
+    """Tulis perubahan lalu buang session dari memori."""
+    flush_session(sess["id"], sess)
+    _HOT.pop(sess["id"], None)
+
+
+def _session(sid=None):
+    sid = sid or current_session()
+    now = time.time()
+    with _LOCK:
+        sess = _HOT.get(sid)
+        if sess is None:
+            sess = _new_session(sid)
+            _HOT[sid] = sess
+        _HOT.move_to_end(sid)
+        sess["last_access"] = now
+
+        # spill session idle & yang melebihi kapasitas LRU
+        for other in list(_HOT.values()):
+            if other is sess:
+                continue
+            if len(_HOT) > SESSION_HOT_MAX or now - other["last_access"] > SESSION_IDLE_SECONDS:
+                _spill(other)
+    return sess
+
+
+def sync_session(sid=None):
+    """
+    Dipanggil di awal request: bila worker lain sudah menulis revisi lebih baru,
+    buang value di memori supaya dimuat ulang dari disk.
+    """
+    sess = _session(sid)
+    with sess["lock"]:
+        manifest = _read_manifest(sess["id"])
+        if manifest.get("rev", 0) > sess["rev"] and not sess["dirty"] and not sess["deleted"]:
+            sess.update(values={}, manifest=manifest, rev=manifest.get("rev", 0))
+    return sess
+
+
+def flush_session(sid=None, sess=None):
+    """Write-through key yang berubah ke disk (dipanggil setelah request/job selesai)."""
+    sess = sess or _HOT.get(sid or current_session())
+    if sess is None:
+        return
+    with sess["lock"]:
+        if not sess["dirty"] and not sess["deleted"]:
+            return
+        sid = sess["id"]
+        os.makedirs(_session_dir(sid), exist_ok=True)
+        disk = _read_manifest(sid)
+        rev = max(sess["rev"], disk.get("rev", 0)) + 1
+        keys = dict(disk.get("keys", {}))
+        stale = []
+        for key in sess["deleted"]:
+            if "file" in keys.get(key, {}):
+                stale.append(keys[key]["file"])
+            keys.pop(key, None)
+        for key in sess["dirty"]:
+            value = sess["values"].get(key)
+            if "file" in keys.get(key, {}):
+                stale.append(keys[key]["file"])
+            if value is None:
+                keys.pop(key, None)
+                continue
+            keys[key] = _dump_value(sid, key, value, rev)
+        manifest = {"rev": rev, "keys": keys, "updated_at": time.time()}
+        _write_manifest(sid, manifest)
+        sess.update(manifest=manifest, rev=rev, dirty=set(), deleted=set())
+        _remove_files(sid, stale)
+
+
+def drop_session(sid):
+    """Hapus session dari memori & disk."""
+    import shutil
+    with _LOCK:
+        _HOT.pop(sid, None)
+    shutil.rmtree(_session_dir(sid), ignore_errors=True)
+
+
+def session_stats():
+    with _LOCK:
+        hot = list(_HOT.keys())
+    on_disk = sorted(os.listdir(SESSION_DIR)) if os.path.isdir(SESSION_DIR) else []
+    return {"hot": hot, "on_disk": on_disk, "hot_max": SESSION_HOT_MAX}
+
+
+# ------------------------------
+#  Proxy
+# ------------------------------
+class _StateProxy(MutableMapping):
+    """Dict-like: STATE["X"] membaca/menulis state session aktif."""
+
+    def __getitem__(self, key):
+        sess = _session()
+        with sess["lock"]:
+            if key in sess["values"]:
+                return sess["values"][key]
+            if key in sess["deleted"]:
+                raise KeyError(key)
+            entry = sess["manifest"].get("keys", {}).get(key)
+            if entry is not None:
+                value = _load_value(sess["id"], entry)
+                sess["values"][key] = value
+                return value
+        if key in DEFAULTS:
+            return DEFAULTS[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        sess = _session()
+        with sess["lock"]:
+            sess["values"][key] = value
+            sess["dirty"].add(key)
+            sess["deleted"].discard(key)
+
+    def __delitem__(self, key):
+        sess = _session()
+        with sess["lock"]:
+            known = key in sess["values"] or key in sess["manifest"].get("keys", {})
+            if not known:
+                raise KeyError(key)
+            sess["values"].pop(key, None)
+            sess["dirty"].discard(key)
+            sess["deleted"].add(key)
+
+    def _keys(self):
+        sess = _session()
+        with sess["lock"]:
+            keys = set(DEFAULTS) | set(sess["values"]) | set(sess["manifest"].get("keys", {}))
+            return keys - sess["deleted"]
+
+    def __iter__(self):
+        return iter(sorted(self._keys()))
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return f"<STATE session={current_session()!r}>"
+
+
+STATE = _StateProxy()
+
+
+def bump_model_version(reset_model=False):
+    """
+    Tandai state model session aktif berubah: model_version += 1 dan buang
+    nilai turunan (metrik, memo summary). reset_model=True (X baru) sekalian
+    membuang hasil training lama. Return versi baru.
+    """
+    for key in DERIVED_KEYS + (MODEL_KEYS if reset_model else ()):
+        try:
+            del STATE[key]
+        except KeyError:
+            pass
+    version = int(STATE.get("model_version") or 0) + 1
+    STATE["model_version"] = version
+    return version
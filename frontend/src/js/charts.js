@@ -0,0 +1,89 @@
+// ---------- chart SVG ringan ----------
+// Backend mengirim series mentah ({ kind, series, urls } di field "chart");
+// di sini dirender jadi SVG inline, jadi tidak perlu PNG dari server.
+// urls.svg / urls.png tetap tersedia untuk export / client tanpa JS.
+
+const W = 600, H = 400;
+const PAD = { top: 36, right: 20, bottom: 48, left: 64 };
+const COLORS = ["#2563eb", "#f97316", "#16a34a", "#dc2626", "#9333ea",
+  "#0891b2", "#ca8a04", "#db2777", "#4b5563", "#65a30d"];
+
+const esc = (s) => String(s ?? "").replace(/[&<>"]/g,
+  (c) => ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;" }[c]));
+
+function niceTicks(min, max, count = 5) {
+  if (min === max) { min -= 1; max += 1; }
+  const raw = (max - min) / count;
+  const mag = 10 ** Math.floor(Math.log10(raw));
+  const step = [1, 2, 5, 10].map((m) => m * mag).find((s) => s >= raw);
+  const ticks = [];
+  for (let v = Math.ceil(min / step) * step; v <= max + step * 1e-9; v += step) ticks.push(+v.toFixed(10));
+  return ticks;
+}
+
+const tickLabel = (v) => (Math.abs(v) >= 1e4 ? v.toExponential(1) : String(+v.toPrecision(4)));
+
+function frame(title, body) {
+  return `<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 ${W} ${H}" class="w-full h-auto" font-family="sans-serif" font-size="12">
+    <text x="${W / 2}" y="22" text-anchor="middle" font-size="14" font-weight="600">${esc(title)}</text>
+    ${body}
+  </svg>`;
+}
+
+export function lineChartSVG(s) {
+  const pts = s.x.map((x, i) => [x, s.y[i]]).filter(([, y]) => y != null && Number.isFinite(y));
+  if (!pts.length) return frame(s.title, "");
+  const xs = s.x, ys = pts.map((p) => p[1]);
+  const x0 = Math.min(...xs), x1 = Math.max(...xs);
+  const yt = niceTicks(Math.min(...ys), Math.max(...ys));
+  const y0 = yt[0], y1 = yt[yt.length - 1];
+  const iw = W - PAD.left - PAD.right, ih = H - PAD.top - PAD.bottom;
+  const sx = (v) => PAD.left + (x1 === x0 ? iw / 2 : ((v - x0) / (x1 - x0)) * iw);
+  const sy = (v) => PAD.top + ih - ((v - y0) / (y1 - y0 || 1)) * ih;
+
+  const grid = yt.map((v) => `
+    <line x1="${PAD.left}" x2="${W - PAD.right}" y1="${sy(v)}" y2="${sy(v)}" stroke="#e2e8f0"/>
+    <text x="${PAD.left - 6}" y="${sy(v) + 4}" text-anchor="end" fill="#475569">${tickLabel(v)}</text>`).join("");
+  const xticks = xs.map((v) => `
+    <text x="${sx(v)}" y="${H - PAD.bottom + 18}" text-anchor="middle" fill="#475569">${v}</text>`).join("");
+  const path = pts.map(([x, y], i) => `${i ? "L" : "M"}${sx(x).toFixed(1)},${sy(y).toFixed(1)}`).join(" ");
+  const dots = pts.map(([x, y]) => `<circle cx="${sx(x)}" cy="${sy(y)}" r="4" fill="${COLORS[0]}"><title>k=${x}: ${tickLabel(y)}</title></circle>`).join("");
+  const marker = s.marker == null ? "" : `
+    <line x1="${sx(s.marker)}" x2="${sx(s.marker)}" y1="${PAD.top}" y2="${H - PAD.bottom}" stroke="#dc2626" stroke-dasharray="6 4"/>
+    <text x="${sx(s.marker) + 6}" y="${PAD.top + 14}" fill="#dc2626">k=${s.marker}</text>`;
+
+  return frame(s.title, `
+    ${grid}${xticks}${marker}
+    <path d="${path}" fill="none" stroke="${COLORS[0]}" stroke-width="2"/>${dots}
+    <text x="${PAD.left + iw / 2}" y="${H - 10}" text-anchor="middle">${esc(s.xlabel)}</text>
+    <text transform="translate(16 ${PAD.top + ih / 2}) rotate(-90)" text-anchor="middle">${esc(s.ylabel)}</text>`);
+}
+
+export function pieChartSVG(s) {
+  const total = s.values.reduce((a, b) => a + b, 0);
+  if (!total) return frame(s.title, "");
+  const cx = W / 2, cy = H / 2 + 12, r = 140;
+  let angle = -Math.PI / 2;
+  const slices = s.values.map((v, i) => {
+    const a = (v / total) * Math.PI * 2;
+    const mid = angle + a / 2;
+    const [xa, ya] = [cx + r * Math.cos(angle), cy + r * Math.sin(angle)];
+    angle += a;
+    const [xb, yb] = [cx + r * Math.cos(angle), cy + r * Math.sin(angle)];
+    const shape = v === total
+      ? `<circle cx="${cx}" cy="${cy}" r="${r}" fill="${COLORS[i % COLORS.length]}"/>`
+      : `<path d="M${cx},${cy} L${xa},${ya} A${r},${r} 0 ${a > Math.PI ? 1 : 0} 1 ${xb},${yb} Z" fill="${COLORS[i % COLORS.length]}"/>`;
+    return `<g><title>${esc(s.labels[i])}: ${v}</title>${shape}
+      <text x="${cx + r * 0.6 * Math.cos(mid)}" y="${cy + r * 0.6 * Math.sin(mid) + 4}" text-anchor="middle" fill="#fff">${Math.round((v / total) * 100)}%</text>
+      <text x="${cx + (r + 18) * Math.cos(mid)}" y="${cy + (r + 18) * Math.sin(mid) + 4}" text-anchor="middle">${esc(s.labels[i])}</text></g>`;
+  }).join("");
+  return frame(s.title, slices);
+}
+
+// Render spec chart dari backend ke elemen container; false kalau spec kosong.
+export function renderChart(el, chart) {
+  if (!el || !chart?.series) return false;
+  el.innerHTML = chart.kind === "pie" ? pieChartSVG(chart.series) : lineChartSVG(chart.series);
+  el.classList.remove("hidden");
+  return true;
+}
@@ -1,3 +1,5 @@
+import { sessionHeaders } from "../session.js";
+
 /////////////////////////////
 // ---- App State -------- //
 /////////////////////////////
@@ -13,8 +15,8 @@ const DataState = {
   },
   preprocessing: {
     missing: "none", // none | drop | mean | median
-    scaling: "none", // none | standard | minmax
-    encoding: "onehot", // onehot | label
+    scaling: "none", // none | standard | minmax | maxabs
+    encoding: "onehot", // onehot | sparse | label
   },
   stats: { rows: 0, cols: 0, missing: 0 },
 };
@@ -501,6 +503,7 @@ function initPreprocessing() {
       // Pakai URL absolut agar tidak tergantung proxy Vite
       const res = await fetch("http://127.0.0.1:5000/api/upload", {
         method: "POST",
+        headers: sessionHeaders(),
         body: fd,
       });
       const json = await res.json();
@@ -683,13 +686,15 @@ const DataPage = {
               <div class="space-y-2 text-sm">
                 <label class="inline-flex items-center gap-2"><input type="radio" name="scaling" value="none" checked> None</label><br/>
                 <label class="inline-flex items-center gap-2"><input type="radio" name="scaling" value="standard"> StandardScaler</label><br/>
-                <label class="inline-flex items-center gap-2"><input type="radio" name="scaling" value="minmax"> MinMaxScaler</label>
+                <label class="inline-flex items-center gap-2"><input type="radio" name="scaling" value="minmax"> MinMaxScaler</label><br/>
+                <label class="inline-flex items-center gap-2"><input type="radio" name="scaling" value="maxabs"> MaxAbsScaler</label>
               </div>
             </div>
             <div>
               <div class="text-sm font-medium mb-2">Encoding kategorikal</div>
               <div class="space-y-2 text-sm">
                 <label class="inline-flex items-center gap-2"><input type="radio" name="encoding" value="onehot" checked> One-hot</label><br/>
+                <label class="inline-flex items-center gap-2"><input type="radio" name="encoding" value="sparse"> One-hot sparse (kategori banyak)</label><br/>
                 <label class="inline-flex items-center gap-2"><input type="radio" name="encoding" value="label"> Label encoding</label>
               </div>
             </div>
@@ -1,3 +1,6 @@
+import { sessionHeaders } from "../session.js";
+import { renderChart } from "../charts.js";
+
 const InsightState = {
   overview: {
     dataset: null,           // e.g., 'customers.csv'
@@ -18,7 +21,7 @@ const InsightState = {
     // optional: [{ feature:'Cleanliness', importance:0.42 }, ...]
   ],
   images: {
-    distribution_b64: null,  // optional: base64 image for cluster distribution
+    distribution: null,  // optional: spec chart pie { kind, series: { labels, values }, urls }
   },
 };
 
@@ -202,14 +205,12 @@ function renderTopFeatures() {
 }
 
 function renderDistributionImage() {
-  const img = $("#img-dist");
+  const el = $("#chart-dist");
   const ph  = $("#ph-dist");
-  if (InsightState.images.distribution_b64) {
-    img.src = `data:image/png;base64,${InsightState.images.distribution_b64}`;
-    img.classList.remove("hidden");
+  if (renderChart(el, InsightState.images.distribution)) {
     ph.classList.add("hidden");
   } else {
-    img.classList.add("hidden");
+    el.classList.add("hidden");
     ph.classList.remove("hidden");
   }
 }
@@ -217,7 +218,9 @@ function renderDistributionImage() {
 // ---------- Actions (download, refresh) ----------
 async function downloadReport(format="pdf") {
   try {
-    const res = await fetch(`/api/report/download?format=${encodeURIComponent(format)}`);
+    const res = await fetch(`/api/report/download?format=${encodeURIComponent(format)}`, {
+      headers: sessionHeaders(),
+    });
     if (!res.ok) throw new Error("Download failed");
     const blob = await res.blob();
     const url = URL.createObjectURL(blob);
@@ -237,7 +240,7 @@ async function downloadReport(format="pdf") {
 async function loadSummary() {
   // Opsional: panggil jika backend sudah siap
   try {
-    const res = await fetch("/api/report/summary");
+    const res = await fetch("/api/report/summary", { headers: sessionHeaders() });
     if (!res.ok) return; // biarkan placeholder
     const data = await res.json();
 
@@ -245,7 +248,7 @@ async function loadSummary() {
     InsightState.metrics  = data.metrics  || InsightState.metrics;
     InsightState.clusters = data.clusters || [];
     InsightState.top_features = data.top_features || [];
-    if (data.images?.distribution_b64) InsightState.images.distribution_b64 = data.images.distribution_b64;
+    if (data.images?.distribution) InsightState.images.distribution = data.images.distribution;
 
     renderOverview();
     renderMetrics();
@@ -313,7 +316,7 @@ const InsightPage = {
             <h2 class="font-semibold">Distribusi Cluster</h2>
             <button id="btn-refresh" class="h-9 px-3 rounded-lg border text-sm hover:bg-slate-50">Refresh</button>
           </div>
-          <img id="img-dist" class="rounded-md w-full hidden" alt="Cluster Distribution"/>
+          <div id="chart-dist" class="rounded-md w-full hidden" role="img" aria-label="Cluster Distribution"></div>
           <div id="ph-dist" class="aspect-[4/3] rounded-md bg-slate-100 grid place-content-center text-slate-400 text-sm">
             Chart here
           </div>
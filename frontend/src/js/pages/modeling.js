@@ -1,3 +1,6 @@
+import { sessionHeaders } from "../session.js";
+import { renderChart } from "../charts.js";
+
 // ---------- helpers ----------
 const $ = (s, r = document) => r.querySelector(s);
 const $all = (s, r = document) => Array.from(r.querySelectorAll(s));
@@ -11,12 +14,6 @@ function setLoading(btn, loading = true) {
   if (s) s.classList.toggle("hidden", !loading);
 }
 
-function showImageBase64(imgEl, b64) {
-  if (!imgEl || !b64) return;
-  imgEl.src = `data:image/png;base64,${b64}`;
-  imgEl.classList.remove("hidden");
-}
-
 function notify(el, text, ok = true) {
   if (!el) return;
   el.textContent = text || "";
@@ -148,7 +145,7 @@ function setDisabledFlow() {
 async function postJSON(url, body) {
   const res = await fetch(url, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: sessionHeaders({ "Content-Type": "application/json" }),
     body: JSON.stringify(body || {}),
   });
   if (!res.ok) {
@@ -163,15 +160,14 @@ async function postJSON(url, body) {
 // --- actions ---
 async function runElbow() {
   const btn = $("#btn-elbow"),
-    img = $("#img-elbow"),
+    chart = $("#chart-elbow"),
     note = $("#note-elbow");
   setLoading(btn, true);
   notify(note, "Menghitung Elbow (WCSS)…", true);
   try {
     const data = await postJSON("/api/model/elbow", { k_min: 2, k_max: 10 });
-    // tampilkan grafik
-    showImageBase64(img, data.image_base64);
-    $("#ph-elbow")?.classList.add("hidden");
+    // tampilkan grafik (SVG dari series ks/wcss)
+    if (renderChart(chart, data.chart)) $("#ph-elbow")?.classList.add("hidden");
 
     if (data.wcss_at_k != null) setMetrics({ wcss: data.wcss_at_k });
 
@@ -286,7 +282,8 @@ async function runDBI() {
     const data = await postJSON("/api/model/dbi", {});
 
     setMetrics({ dbi: data.dbi });
-    notify(note, ``);
+    // rincian per cluster (size, sse, dbi_term) ada di data.clusters
+    notify(note, data.calinski_harabasz != null ? `Calinski–Harabasz: ${fmt(data.calinski_harabasz)}` : ``);
   } catch (err) {
     console.error(err);
     notify(note, `Error: ${err.message}`, false);
@@ -297,7 +294,7 @@ async function runDBI() {
 
 async function runSilhouette() {
   const btn = $("#btn-sil"),
-    img = $("#img-sil"),
+    chart = $("#chart-sil"),
     note = $("#note-sil");
   setLoading(btn, true);
   notify(note, "Menghitung Silhouette…", true);
@@ -307,8 +304,7 @@ async function runSilhouette() {
       k_max: 10,
     });
     setMetrics({ silhouette: data.silhouette });
-    showImageBase64(img, data.image_base64);
-    $("#ph-sil")?.classList.add("hidden");
+    if (renderChart(chart, data.chart)) $("#ph-sil")?.classList.add("hidden");
     notify(note, ``);
   } catch (e) {
     notify(note, "Gagal menghitung Silhouette", false);
@@ -419,13 +415,13 @@ const ModelingPage = {
               Hitung
             </button>
           </div>
-          <img id="img-elbow" class="rounded-md w-full hidden" alt="Elbow Chart"/>
+          <div id="chart-elbow" class="rounded-md w-full hidden" role="img" aria-label="Elbow Chart"></div>
           <div id="ph-elbow" class="aspect-[4/3] rounded-md bg-slate-100 grid place-content-center text-slate-400 text-sm">Chart here</div>
         </div>
 
         <div class="rounded-2xl border bg-white p-5 shadow-sm">
           <div class="flex items-center justify-between mb-3"><h2 class="font-semibold">Silhouette</h2></div>
-          <img id="img-sil" class="rounded-md w-full hidden" alt="Silhouette Chart"/>
+          <div id="chart-sil" class="rounded-md w-full hidden" role="img" aria-label="Silhouette Chart"></div>
           <div id="ph-sil" class="aspect-[4/3] rounded-md bg-slate-100 grid place-content-center text-slate-400 text-sm">Chart here</div>
         </div>
       </div>
@@ -0,0 +1,18 @@
+// ---------- session backend ----------
+// Tiap tab/browser punya id session sendiri (disimpan di localStorage) supaya
+// dataset & model antar analis tidak saling menimpa di server.
+const KEY = "cw_session_id";
+
+export function sessionId() {
+  let id = localStorage.getItem(KEY);
+  if (!id) {
+    id = (crypto.randomUUID?.() || `${Date.now()}-${Math.random()}`)
+      .replace(/[^A-Za-z0-9_-]/g, "");
+    localStorage.setItem(KEY, id);
+  }
+  return id;
+}
+
+export function sessionHeaders(extra = {}) {
+  return { ...extra, "X-Session-Id": sessionId() };
+}
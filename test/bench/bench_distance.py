@@ -0,0 +1,138 @@
+"""
+Micro-benchmark kernel jarak (backend/services/distance_utils) vs panggilan sklearn.
+
+Per ukuran (n baris × p fitur × k centroid, data sintetis ber-cluster) diukur:
+  assign   → label + jarak centroid terdekat
+             sklearn pairwise_distances_argmin_min  vs  nearest_centroid
+             (float64, float32 native, ‖x‖² sudah dihitung, 1 thread vs DIST_WORKERS)
+  inertia  → Σ jarak² ke centroid terdekat
+             sklearn euclidean_distances(squared=True).min  vs  nearest_centroid
+  metrics  → DBI + Calinski–Harabasz + SSE per cluster
+             sklearn davies_bouldin_score + calinski_harabasz_score  vs  cluster_metrics
+Tiap kasus diulang --repeat kali (median). Kesesuaian label / selisih nilai
+dengan sklearn ikut dicatat supaya percepatan tidak menyembunyikan salah hitung.
+
+Contoh:
+    python test/bench/bench_distance.py --sizes 100k,1m --p 38 --k 4,8
+    python test/bench/bench_distance.py --sizes 200k --compare test/bench/results/<lama>.json
+"""
+import argparse, json, os, sys, time
+from datetime import datetime
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from bench_pipeline import BACKEND, RESULTS_DIR, parse_size, _meta, compare
+
+
+def _timed(fn, repeat):
+    fn()                                            # warm-up (alokasi, cache BLAS)
+    walls, out = [], None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        walls.append(time.perf_counter() - t)
+    return float(np.median(walls)), out
+
+
+def make_points(n, p, k, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 3, size=(k, p))
+    X = centers[rng.integers(0, k, n)] + rng.normal(size=(n, p))
+    C = centers + rng.normal(0, 0.1, size=(k, p))
+    return X, C
+
+
+def run_case(n, p, k, args):
+    from sklearn.metrics import (
+        pairwise_distances_argmin_min, davies_bouldin_score, calinski_harabasz_score,
+    )
+    from sklearn.metrics.pairwise import euclidean_distances
+    from services.distance_utils import nearest_centroid, row_norms
+    from services.eval_utils import cluster_metrics
+
+    X, C = make_points(n, p, k, args.seed)
+    X32 = X.astype(np.float32)
+    x_sq = row_norms(X)
+    rows = []
+
+    def add(stage, impl, wall, **extra):
+        rows.append({"rows": n, "p": p, "k": k, "stage": f"{stage}/{impl}", "wall_s": round(wall, 5), **extra})
+
+    # --- assign ---
+    t_ref, (ref_lab, ref_d) = _timed(lambda: pairwise_distances_argmin_min(X, C), args.repeat)
+    add("assign", "sklearn", t_ref)
+    cases = {
+        "kernel_f64_1t": lambda: nearest_centroid(X, C, n_jobs=1),
+        "kernel_f64": lambda: nearest_centroid(X, C),
+        "kernel_f64_norms": lambda: nearest_centroid(X, C, x_sq=x_sq),
+        "kernel_f32": lambda: nearest_centroid(X32, C),
+    }
+    for impl, fn in cases.items():
+        wall, (lab, best, _) = _timed(fn, args.repeat)
+        add("assign", impl, wall, speedup=round(t_ref / wall, 2),
+            label_agree=float((lab == ref_lab).mean()),
+            max_abs_diff=float(np.abs(np.sqrt(best) - ref_d).max()))
+
+    # --- inertia ---
+    t_ref, ref_in = _timed(lambda: float(euclidean_distances(X, C, squared=True).min(axis=1).sum()), args.repeat)
+    add("inertia", "sklearn", t_ref)
+    wall, got = _timed(lambda: float(nearest_centroid(X, C, x_sq=x_sq)[1].sum()), args.repeat)
+    add("inertia", "kernel", wall, speedup=round(t_ref / wall, 2), rel_diff=abs(got - ref_in) / ref_in)
+
+    # --- DBI + CH + SSE ---
+    def sk_metrics():
+        return davies_bouldin_score(X, ref_lab), calinski_harabasz_score(X, ref_lab)
+    t_ref, (ref_dbi, ref_ch) = _timed(sk_metrics, args.repeat)
+    add("metrics", "sklearn", t_ref)
+    wall, got = _timed(lambda: cluster_metrics(X, ref_lab, k=k), args.repeat)
+    add("metrics", "kernel", wall, speedup=round(t_ref / wall, 2),
+        dbi_diff=abs(got["dbi"] - ref_dbi), ch_rel_diff=abs(got["calinski_harabasz"] - ref_ch) / ref_ch)
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="100k,1m", help="daftar jumlah baris, mis. 10k,100k,1m")
+    ap.add_argument("--p", default="38", help="daftar jumlah fitur")
+    ap.add_argument("--k", default="4,8", help="daftar jumlah centroid")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="file JSON hasil (default test/bench/results/distance-<commit>-<waktu>.json)")
+    ap.add_argument("--compare", help="JSON hasil sebelumnya untuk dibandingkan")
+    ap.add_argument("--threshold", type=float, default=1.2, help="rasio waktu yang dianggap regresi")
+    args = ap.parse_args(argv)
+
+    os.environ.setdefault("DATA_DIR", os.path.join(RESULTS_DIR, ".data"))
+    sys.path.insert(0, BACKEND)
+
+    results = []
+    for n in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+        for p in [int(v) for v in args.p.split(",")]:
+            for k in [int(v) for v in args.k.split(",")]:
+                print(f"[n={n} p={p} k={k}]")
+                for row in run_case(n, p, k, args):
+                    # compare() mengindeks per (rows, stage) → sertakan p & k di nama stage
+                    row["stage"] = f"p{p}k{k}:{row['stage']}"
+                    results.append(row)
+                    extra = f"  x{row['speedup']:.2f}" if "speedup" in row else ""
+                    print(f"  {row['stage']:<28} {row['wall_s'] * 1000:>9.1f} ms{extra}")
+
+    doc = {"meta": _meta(args), "results": results}
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"distance-{doc['meta']['commit'] or 'nocommit'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(doc, fh, indent=2)
+    print(f"\nhasil → {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            n_reg = compare(doc, json.load(fh), args.threshold)
+        return 1 if n_reg else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
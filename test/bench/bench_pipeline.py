@@ -0,0 +1,312 @@
+"""
+Benchmark pipeline upload → elbow → silhouette-curve → train → report summary.
+
+Dataset survei carwash sintetis (kolom Likert 1–5, kolom kategori, missing
+value) dibangkitkan untuk tiap ukuran, lalu app Flask dijalankan lewat test
+client. Per stage dicatat: waktu wall, puncak RSS proses, dan alokasi Python
+(tracemalloc, pass terpisah supaya overhead-nya tidak mengotori waktu).
+Hasil ditulis ke JSON supaya bisa dibandingkan antar commit.
+
+Contoh:
+    python test/bench/bench_pipeline.py --sizes 1k,10k,100k
+    python test/bench/bench_pipeline.py --sizes 1m --engine minibatch --k-max 8
+    python test/bench/bench_pipeline.py --sizes 10k --compare test/bench/results/<lama>.json
+"""
+import argparse, json, os, platform, shutil, subprocess, sys, tempfile, threading, time, tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKEND = os.path.join(ROOT, "backend")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+LIKERT = ["frekuensi", "ketelitian", "kecepatan", "kebersihan", "keramahan",
+          "harga", "antrian", "fasilitas"]
+CATEGORICAL = {
+    "gender": ["L", "P"],
+    "tipe_kendaraan": ["mobil", "motor", "truk", "pickup"],
+    "cabang": [f"cabang_{i:02d}" for i in range(20)],
+    "metode_bayar": ["tunai", "qris", "debit", "ewallet"],
+}
+STAGES = ("upload", "elbow", "silhouette-curve", "train", "summary")
+
+
+class StageFailed(RuntimeError):
+    """Stage mengembalikan status non-2xx → pass dihentikan, hasil tidak disimpan."""
+
+
+# ==============================
+#  Dataset sintetis
+# ==============================
+def parse_size(text):
+    text = text.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if mult > 1 else text) * mult)
+
+
+def make_dataset(n, path, *, seed=0, missing_rate=0.03, n_segments=4):
+    """Survei sintetis dengan struktur segmen (supaya KMeans punya sinyal)."""
+    rng = np.random.default_rng(seed)
+    seg = rng.integers(0, n_segments, n)
+    centers = rng.uniform(1.5, 4.5, size=(n_segments, len(LIKERT)))
+    cols = {"id": np.arange(n)}
+    for j, c in enumerate(LIKERT):
+        vals = np.clip(np.rint(centers[seg, j] + rng.normal(0, 0.8, n)), 1, 5)
+        vals[rng.random(n) < missing_rate] = np.nan
+        cols[c] = vals
+    for c, cats in CATEGORICAL.items():
+        cols[c] = np.asarray(cats, dtype=object)[rng.integers(0, len(cats), n)]
+    pd.DataFrame(cols).to_csv(path, index=False)
+    return path
+
+
+# ==============================
+#  Pengukuran
+# ==============================
+def _rss_bytes():
+    """RSS proses saat ini (psutil → /proc → ru_maxrss sebagai pendekatan terakhir)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource   # puncak seumur proses (KB di Linux, byte di macOS)
+    except ImportError:
+        return 0          # Windows tanpa psutil
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _RssSampler:
+    """Sampling RSS di thread terpisah selama satu stage → puncak RSS stage itu."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = self.start = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def _mb(b):
+    return round(b / 1024 ** 2, 3)
+
+
+# ==============================
+#  Eksekusi
+# ==============================
+def _requests(client, csv_path, args, headers):
+    mapping = {"id": "id", "features": LIKERT + list(CATEGORICAL)}
+    prep = {"missing": "mean", "encoding": args.encoding, "scaling": "standard"}
+    sweep = {"k_min": 2, "k_max": args.k_max, "engine": args.engine}
+
+    def upload():
+        with open(csv_path, "rb") as fh:
+            return client.post("/api/upload", headers=headers, content_type="multipart/form-data", data={
+                "file": (fh, os.path.basename(csv_path)),
+                "mapping": json.dumps(mapping),
+                "preprocessing": json.dumps(prep),
+            })
+
+    return {
+        "upload": upload,
+        "elbow": lambda: client.post("/api/model/elbow", headers=headers, json=sweep),
+        "silhouette-curve": lambda: client.post("/api/model/silhouette-curve", headers=headers, json=sweep),
+        "train": lambda: client.post("/api/model/train", headers=headers,
+                                     json={"params": {"k": args.k, "engine": args.engine}}),
+        "summary": lambda: client.get("/api/report/summary", headers=headers),
+    }
+
+
+def _reset_caches(data_dir):
+    """Cold start per pass: kosongkan cache fit, memo preprocessing & folder data."""
+    import config
+    from services.sweep_utils import clear_fits
+    from services.pipeline_utils import clear_prep_cache
+    import store.state as state
+    clear_fits()
+    clear_prep_cache()
+    with state._LOCK:
+        state._HOT.clear()
+    for sub in os.listdir(data_dir):
+        shutil.rmtree(os.path.join(data_dir, sub), ignore_errors=True)
+    # buat ulang semua folder yang dibuat config saat import (uploads, outputs/charts, models, ...)
+    root = os.path.abspath(data_dir)
+    for name in dir(config):
+        path = getattr(config, name)
+        if name.endswith("_DIR") and isinstance(path, str) and os.path.abspath(path).startswith(root + os.sep):
+            os.makedirs(path, exist_ok=True)
+
+
+def run_pass(client, csv_path, args, data_dir, session, trace):
+    _reset_caches(data_dir)
+    headers = {"X-Session-Id": session}
+    out = {}
+    for stage, call in _requests(client, csv_path, args, headers).items():
+        if stage not in args.stages:
+            continue
+        if trace:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            cur0 = tracemalloc.get_traced_memory()[0]
+            resp = call()
+            cur1, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            out[stage] = {"alloc_peak_mb": _mb(peak - cur0), "alloc_net_mb": _mb(cur1 - cur0)}
+        else:
+            with _RssSampler() as rss:
+                t0 = time.perf_counter()
+                resp = call()
+                wall = time.perf_counter() - t0
+            out[stage] = {
+                "wall_s": round(wall, 4),
+                "rss_start_mb": _mb(rss.start),
+                "rss_peak_mb": _mb(rss.peak),
+                "rss_delta_mb": _mb(rss.peak - rss.start),
+            }
+        if not 200 <= resp.status_code < 300:
+            error = (resp.get_json(silent=True) or {}).get("error")
+            raise StageFailed(f"{stage}: HTTP {resp.status_code} {error}")
+        out[stage]["status"] = resp.status_code
+    return out
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _meta(args):
+    from importlib.metadata import version
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {pkg: version(pkg) for pkg in ("numpy", "pandas", "scikit-learn", "flask")},
+        "args": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+    }
+
+
+def compare(new, old, threshold):
+    """Cetak rasio waktu baru/lama per (rows, stage); return jumlah regresi > threshold."""
+    def index(doc):
+        return {(r["rows"], r["stage"]): r for r in doc["results"]}
+    a, b = index(new), index(old)
+    regressions = 0
+    print(f"\n{'rows':>9} {'stage':<17} {'lama s':>9} {'baru s':>9} {'rasio':>7}  {'RSS lama':>9} {'RSS baru':>9}")
+    for key in sorted(set(a) & set(b)):
+        ra, rb = a[key], b[key]
+        if "wall_s" not in ra or "wall_s" not in rb:
+            continue
+        ratio = ra["wall_s"] / rb["wall_s"] if rb["wall_s"] else float("inf")
+        flag = "  ← regresi" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{key[0]:>9} {key[1]:<17} {rb['wall_s']:>9.3f} {ra['wall_s']:>9.3f} {ratio:>7.2f}"
+              f"  {rb.get('rss_peak_mb', 0):>9.1f} {ra.get('rss_peak_mb', 0):>9.1f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1k,10k,100k", help="daftar ukuran baris, mis. 1k,10k,100k,1m")
+    ap.add_argument("--stages", default=",".join(STAGES), help="subset stage (dipisah koma)")
+    ap.add_argument("--k-max", type=int, default=8)
+    ap.add_argument("--k", type=int, default=4, help="k untuk stage train")
+    ap.add_argument("--engine", default="kmeans", choices=["kmeans", "minibatch", "online"])
+    ap.add_argument("--encoding", default="onehot", choices=["onehot", "sparse", "label"])
+    ap.add_argument("--repeat", type=int, default=1, help="jumlah pass waktu per ukuran (diambil median)")
+    ap.add_argument("--no-alloc", action="store_true", help="lewati pass tracemalloc")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="file JSON hasil (default test/bench/results/<commit>-<waktu>.json)")
+    ap.add_argument("--compare", help="JSON hasil sebelumnya untuk dibandingkan")
+    ap.add_argument("--threshold", type=float, default=1.2, help="rasio waktu yang dianggap regresi")
+    args = ap.parse_args(argv)
+    args.stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        ap.error(f"stage tidak dikenal: {', '.join(sorted(unknown))}")
+
+    # semua file app (upload, cache, session, output report) ke folder sementara
+    work = tempfile.mkdtemp(prefix="carwash-bench-")
+    data_dir = os.path.join(work, "data")
+    os.environ["DATA_DIR"] = data_dir
+    sys.path.insert(0, BACKEND)
+    os.chdir(work)
+    from app import create_app
+    client = create_app().test_client()
+
+    results = []
+    failed = None
+    try:
+        for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            csv_path = make_dataset(size, os.path.join(work, f"survey_{size}.csv"), seed=args.seed)
+            print(f"[{size} baris] {os.path.getsize(csv_path) / 1024 ** 2:.1f} MB CSV")
+            passes = [run_pass(client, csv_path, args, data_dir, f"bench{size}t{i}", trace=False)
+                      for i in range(args.repeat)]
+            alloc = {} if args.no_alloc else run_pass(client, csv_path, args, data_dir,
+                                                      f"bench{size}a", trace=True)
+            for stage in args.stages:
+                runs = [p[stage] for p in passes if stage in p]
+                if not runs:
+                    continue
+                walls = [r["wall_s"] for r in runs]
+                row = {"rows": size, "stage": stage, **runs[int(np.argsort(walls)[len(walls) // 2])],
+                       "wall_s": round(float(np.median(walls)), 4), "wall_runs": walls}
+                row.update({k: v for k, v in alloc.get(stage, {}).items() if k.startswith("alloc")})
+                results.append(row)
+                print(f"  {stage:<17} {row['wall_s']:>8.3f}s  RSS puncak {row['rss_peak_mb']:>8.1f} MB"
+                      + (f"  alloc puncak {row['alloc_peak_mb']:>8.1f} MB" if "alloc_peak_mb" in row else ""))
+    except StageFailed as e:
+        failed = e
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+    if failed is not None:
+        # waktu stage gagal tidak bermakna → tidak ada file hasil yang bisa dibandingkan
+        print(f"  ! {failed} — benchmark dihentikan, hasil tidak disimpan", file=sys.stderr)
+        return 2
+
+    doc = {"meta": _meta(args), "results": results}
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{doc['meta']['commit'] or 'nocommit'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(doc, fh, indent=2)
+    print(f"\nhasil → {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            n_reg = compare(doc, json.load(fh), args.threshold)
+        return 1 if n_reg else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
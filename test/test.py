@@ -0,0 +1,164 @@
+"""
+Test backend (pytest): metrik vs scikit-learn, fit store, dataset cache,
+upload gagal & export setelah aktivasi registry.
+
+    python -m pytest -q test/test.py
+
+Semua file app (upload, cache, matriks, registry) ke folder sementara.
+"""
+import io, os, sys, json, tempfile
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="carwash-test-")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "test", "bench"))
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
+
+from bench_pipeline import make_dataset, LIKERT, CATEGORICAL
+from services import sweep_utils, cache_utils
+from services.eval_utils import cluster_metrics
+from services.silhouette_utils import silhouette_estimate
+
+MAPPING = {"id": "id", "features": LIKERT + list(CATEGORICAL)}
+PREP = {"missing": "mean", "encoding": "onehot", "scaling": "standard"}
+
+
+# ==============================
+#  Fixture
+# ==============================
+@pytest.fixture(scope="module")
+def client():
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.fixture(scope="module")
+def datasets():
+    """Dua CSV survei: A (id 0..) dan B (id 10000.., jumlah baris sama)."""
+    d = os.environ["DATA_DIR"]
+    a = make_dataset(1500, os.path.join(d, "survey_a.csv"), seed=1)
+    b = os.path.join(d, "survey_b.csv")
+    pd.read_csv(make_dataset(1500, b, seed=2)).assign(id=lambda x: x.id + 10000).to_csv(b, index=False)
+    return a, b
+
+
+def _session(name):
+    return {"X-Session-Id": name}
+
+
+def _upload(client, headers, path, mapping=MAPPING, prep=PREP):
+    with open(path, "rb") as fh:
+        return client.post("/api/upload", headers=headers, content_type="multipart/form-data", data={
+            "file": (io.BytesIO(fh.read()), os.path.basename(path)),
+            "mapping": json.dumps(mapping),
+            "preprocessing": json.dumps(prep),
+        })
+
+
+def _train(client, headers, k=3):
+    r = client.post("/api/model/train", headers=headers, json={"params": {"k": k}})
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()
+
+
+def _export_csv(client, headers):
+    r = client.get("/api/report/download?format=csv", headers=headers)
+    assert r.status_code == 200
+    return pd.read_csv(io.BytesIO(r.get_data()))
+
+
+# ==============================
+#  Metrik vs scikit-learn
+# ==============================
+@pytest.mark.parametrize("model", [
+    KMeans(4, n_init=1, random_state=0),
+    MiniBatchKMeans(4, n_init=1, max_iter=2, batch_size=256, random_state=0),   # belum konvergen
+])
+def test_cluster_metrics_match_sklearn(model):
+    X = np.random.default_rng(0).normal(size=(3000, 5))
+    labels = model.fit(X).labels_
+    m = cluster_metrics(X, labels, model.cluster_centers_, k=4)
+    assert m["dbi"] == pytest.approx(davies_bouldin_score(X, labels), rel=1e-9)
+    assert m["calinski_harabasz"] == pytest.approx(calinski_harabasz_score(X, labels), rel=1e-9)
+    assert m["inertia"] == pytest.approx(((X - model.cluster_centers_[labels]) ** 2).sum(), rel=1e-9)
+
+
+def test_silhouette_exact_matches_sklearn():
+    X = np.random.default_rng(1).normal(size=(1200, 4))
+    labels = KMeans(3, n_init=1, random_state=0).fit(X).labels_
+    res = silhouette_estimate(X, labels, "exact")
+    assert res["score"] == pytest.approx(silhouette_score(X, labels), abs=1e-9)
+
+
+# ==============================
+#  Fit store: elbow → train tanpa fit ulang
+# ==============================
+def test_train_reuses_elbow_fit(client, datasets, monkeypatch):
+    h = _session("fitstore")
+    assert _upload(client, h, datasets[0]).status_code == 200
+    assert client.post("/api/model/elbow", headers=h, json={"k_min": 2, "k_max": 5}).status_code == 200
+
+    calls = []
+    fit_one = sweep_utils._fit_one
+    monkeypatch.setattr(sweep_utils, "_fit_one", lambda *a, **kw: calls.append(a[1]) or fit_one(*a, **kw))
+    _train(client, h, k=3)
+    assert calls == []
+
+
+# ==============================
+#  Dataset cache: hit vs parse baru
+# ==============================
+def test_dataset_cache_hit_matches_fresh_parse(datasets):
+    path = datasets[0]
+    digest = "testcachehit"
+    before = dict(cache_utils.cache_stats())
+    fresh = cache_utils.load_dataset(path, digest)
+    cached = cache_utils.load_dataset(path, digest)
+    after = cache_utils.cache_stats()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+    pd.testing.assert_frame_equal(cached, fresh)
+
+
+# ==============================
+#  Upload gagal → state session tidak berubah
+# ==============================
+def test_failed_upload_keeps_state(client, datasets):
+    h = _session("failed-upload")
+    a, b = datasets
+    assert _upload(client, h, a).status_code == 200
+    _train(client, h)
+    before = _export_csv(client, h)
+
+    r = _upload(client, h, b, mapping={"id": "id", "features": ["nonexistent"]})
+    assert r.status_code == 400
+    assert "nonexistent" in r.get_json()["error"]
+
+    after = _export_csv(client, h)
+    pd.testing.assert_frame_equal(after, before)
+    assert after["id"].max() < 10000
+
+
+# ==============================
+#  Export setelah aktivasi versi registry
+# ==============================
+def test_export_ids_after_activate(client, datasets):
+    h = _session("activate")
+    a, b = datasets
+    assert _upload(client, h, a, prep={**PREP, "missing": "drop"}).status_code == 200
+    model_a = _train(client, h)["model_id"]
+    export_a = _export_csv(client, h)
+
+    assert _upload(client, h, b).status_code == 200
+    _train(client, h)
+    assert _export_csv(client, h)["id"].min() >= 10000
+
+    r = client.post(f"/api/models/{model_a}/activate", headers=h)
+    assert r.status_code == 200
+    pd.testing.assert_frame_equal(_export_csv(client, h), export_a)
+    assert r.get_json()["has_rows"]